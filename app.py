@@ -1,14 +1,42 @@
 ﻿# -*- coding: utf-8 -*-
-import pandas as pd
+import atexit
+import click
+import datetime
 import json
 import random
 import os
-import google.generativeai as genai
 from dotenv import load_dotenv
-from flask import Flask, render_template, jsonify, request, session
+from flask import Flask, Response, render_template, jsonify, request, session, stream_with_context
 from collections import defaultdict
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import func # (NOVO) Para usar funções como AVG, SUM, COUNT
+from sqlalchemy import Numeric, case, cast, delete, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+import gzip
+import hashlib
+import hmac
+import secrets
+import numpy as np
+import threading
+import time
+from banco_questoes import (GerenciadorBanco, compilar_snapshot, carregar_banco, codificar_json, alocar_estratos,
+                            retirar_gabarito,
+                            sortear_estratificado, sortear_ids, sortear_nao_vistas, ARQUIVO_CSV, ARQUIVO_SNAPSHOT, HEADER_ESPERADO)
+from questoes_vistas import ConjuntoBits
+from validacao_questoes import DIFICULDADES_SINONIMOS
+from busca_questoes import IndiceBusca, CAMPOS_INDEXADOS, LOTE_INDEXACAO, termos
+from gravacao_respostas import FilaCheia, GravadorEmLote
+from fila_correcoes import FilaSaturada, PoolTrabalhos
+from cache_correcoes import CacheCorrecoes, LiderDesistiu, chave_correcao
+from fluxo_correcao import LeitorCompetencias, evento_sse
+from cliente_gemini import GeminiIndisponivel, obter_cliente
+import chaves_questoes
+import migracoes
+import revisao_espacada
+from chaves_questoes import QUESTAO_REMOVIDA
+from sessao_simulado import (Armazem, ArmazemArquivos, ArmazemMemoria, CacheLRU, DescritorSimulado, EstadoInvalido,
+                             EstadoSimulado, chave_valida, proporcoes_validas)
 
 load_dotenv() # Carrega variáveis do .env
 
@@ -20,6 +48,24 @@ app = Flask(__name__)
 # Lê as variáveis de ambiente (do Render ou do seu .env local)
 DATABASE_URL = os.environ.get('DATABASE_URL')
 SECRET_KEY = os.environ.get('SECRET_KEY', 'chave-padrao-local-para-testes-seguros')
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') # (NOVO) Protege as rotas /api/admin/*
+# (NOVO) Onde ficam as questões: 'arquivo' (snapshot/CSV em cada worker) ou 'sql' (tabela 'questoes')
+ARMAZENAMENTO_QUESTOES = os.environ.get('ARMAZENAMENTO_QUESTOES', 'arquivo').lower()
+INTERVALO_VERIFICACAO_BANCO = int(os.environ.get('INTERVALO_VERIFICACAO_BANCO', '30'))
+# (NOVO) Cache HTTP dos catálogos (áreas/bancas mudam com o banco; os temas, só com deploy)
+CACHE_CATALOGO_SEGUNDOS = int(os.environ.get('CACHE_CATALOGO_SEGUNDOS', '60'))
+CACHE_TEMAS_SEGUNDOS = int(os.environ.get('CACHE_TEMAS_SEGUNDOS', '3600'))
+# (NOVO) Onde fica o simulado em andamento: 'sql' (tabela 'sessoes_simulado'), 'arquivo' ou 'memoria'
+SESSAO_SIMULADO_ARMAZEM = os.environ.get('SESSAO_SIMULADO_ARMAZEM', 'sql').lower()
+SESSAO_SIMULADO_TTL = int(os.environ.get('SESSAO_SIMULADO_TTL', str(7 * 24 * 3600))) # 7 dias
+PASTA_SESSOES_SIMULADO = os.environ.get('PASTA_SESSOES_SIMULADO', os.path.join('data', 'sessoes'))
+# (NOVO) Simulados reproduzíveis: ids sorteados e pacotes de questões em cache por descritor (por worker)
+CACHE_DESCRITORES = int(os.environ.get('CACHE_DESCRITORES', '512'))
+CACHE_PACOTES_DESCRITOR = int(os.environ.get('CACHE_PACOTES_DESCRITOR', '128'))
+# (NOVO) Respostas: 'lote' (diário local + INSERT em lote numa thread) ou 'direta' (commit por resposta)
+GRAVACAO_RESPOSTAS = os.environ.get('GRAVACAO_RESPOSTAS', 'lote').lower()
+PASTA_DIARIO_RESPOSTAS = os.environ.get('PASTA_DIARIO_RESPOSTAS', os.path.join('data', 'diario'))
+DIARIO_RESPOSTAS_FSYNC = os.environ.get('DIARIO_RESPOSTAS_FSYNC', '1') != '0'
 
 if not DATABASE_URL:
     # Para testes locais, podemos apontar para um SQLite, mas o ideal é o Render
@@ -28,6 +74,7 @@ if not DATABASE_URL:
     
 # Configura o app
 app.secret_key = SECRET_KEY
+app.permanent_session_lifetime = SESSAO_SIMULADO_TTL # (NOVO) O cookie (só a chave do simulado) dura o mesmo que o estado
 app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
@@ -35,45 +82,100 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
 # ---
-# --- (CORRIGIDO) FONTE DE DADOS PRINCIPAL (PANDAS - Leitura Robusta) ---
+# --- (ALTERADO) FONTE DE DADOS PRINCIPAL (Snapshot binário + fallback CSV, com recarga a quente) ---
 # ---
-df_questoes = None
-try:
-    # (NOVA TENTATIVA) Usando 'engine' python, que é mais flexível com aspas e quebras de linha
-    df_questoes = pd.read_csv(
-        'questoes.csv', 
-        sep=';', 
-        encoding='utf-8', 
-        engine='python' # <--- ESTA É A CORREÇÃO PRINCIPAL
-    )
-    print(f"INFO: 'questoes.csv' carregado com 'utf-8' (engine python). Total: {len(df_questoes)} questões.")
-    
-except Exception as e:
-    print(f"ERRO 1: Falha ao ler com 'utf-8' (engine python). Erro: {e}")
-    print("TENTANDO FALLBACK com 'latin-1' (engine python)...")
-    try:
-        # (FALLBACK) Tentar com 'latin-1'
-        df_questoes = pd.read_csv(
-            'questoes.csv', 
-            sep=';', 
-            encoding='latin-1', # <--- Codificação alternativa
-            engine='python' # <--- Usando engine flexível
-        )
-        print(f"INFO: 'questoes.csv' carregado com 'latin-1' (engine python). Total: {len(df_questoes)} questões.")
-    except Exception as e2:
-        print(f"ERRO CRÍTICO: Falha ao ler 'questoes.csv' com ambos os métodos. Erro: {e2}")
-        df_questoes = pd.DataFrame() # Inicia vazio para não quebrar o resto
+# Carrega 'data/questoes.bank' (gerado por 'flask compile-bank') em milissegundos.
+# Se o snapshot não existir ou estiver desatualizado, lê o 'questoes.csv' como antes.
+# O gerenciador mantém o banco ativo (DataFrame + índices + cache de payloads) e troca
+# por uma versão nova quando o CSV/snapshot mudam, sem reiniciar os workers.
+# (NOVO) Com ARMAZENAMENTO_QUESTOES=sql o gerenciador é o GerenciadorBancoSQL, criado
+# depois dos modelos (ver "MODO SQL DO BANCO DE QUESTÕES").
+if ARMAZENAMENTO_QUESTOES == 'sql':
+    gerenciador_banco = None
+else:
+    gerenciador_banco = GerenciadorBanco(ARQUIVO_CSV, ARQUIVO_SNAPSHOT, intervalo_verificacao=INTERVALO_VERIFICACAO_BANCO)
+    if gerenciador_banco.atual().vazio:
+         print("AVISO: O DataFrame de questões está VAZIO. O app vai rodar, mas sem questões.")
+
+
+def banco_da_sessao(estado):
+    '''(NOVO) O banco na versão em que o simulado da sessão foi sorteado, ou None se
+    essa versão já saiu da memória (ver simulado_expirado()).
+
+    Assim os ids da sessão continuam apontando para as mesmas questões mesmo que
+    o banco seja recarregado no meio do simulado. Os ids são posições no banco: nunca
+    cair para a versão atual, que corrigiria a resposta com o gabarito de outra questão.'''
+    banco = gerenciador_banco.versao(estado.versao_banco)
+    if banco is None:
+        print(f"AVISO: Simulado da sessão sorteado na versão {estado.versao_banco}, que não está mais carregada.")
+    return banco
+
+
+def simulado_expirado():
+    '''(NOVO) Resposta para um simulado cuja versão do banco não está mais carregada.'''
+    return jsonify({"success": False, "error": "O banco de questões foi atualizado e este simulado expirou; "
+                                               "recomece o simulado."}), 410
+
+
+@app.before_request
+def verificar_banco_questoes():
+    # Barato: só olha mtime/tamanho dos arquivos a cada INTERVALO_VERIFICACAO_BANCO segundos
+    gerenciador_banco.verificar_mudancas()
+    if ARMAZENAMENTO_QUESTOES != 'sql':
+        sincronizar_ids_questoes() # (NOVO) Versão nova: remapeia os ids gravados (no modo SQL, o load-bank faz)
+# --- FIM DA ALTERAÇÃO ---
 
-# (Adicionado) Verificação de segurança
-if df_questoes is None:
-     df_questoes = pd.DataFrame() # Garante que não é None
 
-# Prepara o DataFrame final
-df_questoes = df_questoes.fillna('')
-df_questoes.index.name = 'id' # Usar o índice do DataFrame como 'id' universal
-if df_questoes.empty:
-     print("AVISO: O DataFrame de questões está VAZIO. O app vai rodar, mas sem questões.")
-# --- FIM DA CORREÇÃO ---
+# ---
+# --- (NOVO) Respostas JSON montadas com fragmentos pré-codificados ---
+# ---
+def resposta_json(dados, fragmentos=None, status=200):
+    '''Como jsonify(dados), mas cada chave de 'fragmentos' recebe bytes que já estão
+    em JSON (ex.: payloads do cache de questões), sem decodificar e recodificar.'''
+    corpo = codificar_json(dados)
+    if fragmentos:
+        extras = b','.join(codificar_json(chave) + b':' + valor for chave, valor in fragmentos.items())
+        corpo = corpo[:-1] + (b',' if dados else b'') + extras + b'}'
+    return app.response_class(corpo, status=status, mimetype='application/json')
+
+
+# ---
+# --- (NOVO) Respostas de catálogo pré-calculadas (ETag forte + gzip + 304) ---
+# ---
+class RespostaPronta:
+    '''Um corpo JSON codificado e comprimido uma única vez, com ETag forte derivado do
+    conteúdo. Cada requisição só compara o If-None-Match e devolve bytes prontos.'''
+
+    def __init__(self, corpo, max_age):
+        self.corpo = corpo
+        self.corpo_gzip = gzip.compress(corpo, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(corpo).hexdigest()[:24]
+        self.etag_gzip = self.etag + '-gz' # Representação diferente, ETag forte diferente
+        self.cache_control = f'public, max-age={max_age}'
+
+    def servir(self):
+        usar_gzip = request.accept_encodings['gzip'] > 0 and len(self.corpo_gzip) < len(self.corpo)
+        etag = self.etag_gzip if usar_gzip else self.etag
+        cabecalhos = {'ETag': f'"{etag}"', 'Cache-Control': self.cache_control, 'Vary': 'Accept-Encoding'}
+        if request.if_none_match.contains_weak(self.etag) or request.if_none_match.contains_weak(self.etag_gzip):
+            return app.response_class(status=304, headers=cabecalhos)
+        if usar_gzip:
+            cabecalhos['Content-Encoding'] = 'gzip'
+        return app.response_class(self.corpo_gzip if usar_gzip else self.corpo,
+                                  mimetype='application/json', headers=cabecalhos)
+
+
+_respostas_prontas = {} # {nome: (versão do banco, RespostaPronta)}
+
+
+def resposta_pronta(nome, versao, montar, max_age=CACHE_CATALOGO_SEGUNDOS):
+    '''Serve a resposta 'nome' da versão 'versao' do banco. montar() -> dict só roda
+    quando a versão muda (uma vez por versão e por worker).'''
+    pronta = _respostas_prontas.get(nome)
+    if pronta is None or pronta[0] != versao:
+        pronta = (versao, RespostaPronta(codificar_json(montar()), max_age))
+        _respostas_prontas[nome] = pronta # Troca atômica; corrida só custa montar duas vezes
+    return pronta[1].servir()
 
 
 # ---
@@ -103,6 +205,10 @@ class ResultadosSimulados(db.Model):
     total_acertos = db.Column(db.Integer, nullable=False)
     percentual_acerto = db.Column(db.Float, nullable=False)
     tipo_simulado = db.Column(db.String(50), default='normal')
+    # (NOVO) Índices criados pelas migrações (migracoes.py); declarados aqui também para o create_all
+    # Cobre o GROUP BY usuario_id do agregados_do_historico sem ler a tabela
+    __table_args__ = (db.Index('ix_resultados_simulados_usuario', 'usuario_id', 'data', 'percentual_acerto',
+                               'total_acertos', 'total_questoes'),)
 
 class RespostasUsuarios(db.Model):
     __tablename__ = 'respostas_usuarios'
@@ -112,6 +218,9 @@ class RespostasUsuarios(db.Model):
     acertou = db.Column(db.Boolean, nullable=False)
     data_resposta = db.Column(db.DateTime, server_default=func.now())
     disciplina = db.Column(db.String(100))
+    # (NOVO) Histórico na ordem do SM-2 (rebuild-review) e por usuário (rebuild-seen), só do índice
+    __table_args__ = (db.Index('ix_respostas_usuarios_historico', 'usuario_id', 'questao_id', 'data_resposta', 'id',
+                               'acertou'),)
 
 class MetasUsuarios(db.Model):
     __tablename__ = 'metas_usuarios'
@@ -121,6 +230,8 @@ class MetasUsuarios(db.Model):
     valor_meta = db.Column(db.Float, nullable=False)
     valor_atual = db.Column(db.Float, default=0)
     concluida = db.Column(db.Boolean, default=False)
+    # (NOVO) concluida antes de tipo_meta: serve ao dashboard (sem tipo) e ao UPDATE do finalizar (com tipo)
+    __table_args__ = (db.Index('ix_metas_usuarios_usuario_concluida_tipo', 'usuario_id', 'concluida', 'tipo_meta'),)
 
 class DesempenhoAreas(db.Model):
     __tablename__ = 'desempenho_areas'
@@ -131,7 +242,758 @@ class DesempenhoAreas(db.Model):
     total_acertos = db.Column(db.Integer, default=0)
     percentual_acerto = db.Column(db.Float, default=0)
     # Adiciona a restrição 'UNIQUE'
-    __table_args__ = (db.UniqueConstraint('usuario_id', 'area', name='_usuario_area_uc'),)
+    # (NOVO) e o índice das áreas de destaque (ORDER BY percentual_acerto DESC LIMIT 3)
+    __table_args__ = (db.UniqueConstraint('usuario_id', 'area', name='_usuario_area_uc'),
+                      db.Index('ix_desempenho_areas_usuario_percentual', 'usuario_id', 'percentual_acerto'))
+
+class QuestoesVistas(db.Model):
+    # (NOVO) Uma linha por usuário: bitset comprimido das questões já respondidas (ver questoes_vistas.py)
+    __tablename__ = 'questoes_vistas'
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    bits = db.Column(db.LargeBinary, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class EstatisticasUsuarios(db.Model):
+    # (NOVO) Agregados do usuário mantidos no finalizar_simulado: o dashboard lê uma linha
+    # em vez de COUNT/AVG/SUM sobre todo o histórico. 'flask rebuild-stats' recalcula.
+    __tablename__ = 'estatisticas_usuarios'
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    total_simulados = db.Column(db.Integer, nullable=False, default=0)
+    soma_percentuais = db.Column(db.Float, nullable=False, default=0) # média geral = soma / total_simulados
+    total_acertos = db.Column(db.Integer, nullable=False, default=0)
+    total_questoes = db.Column(db.Integer, nullable=False, default=0)
+    ultima_atividade = db.Column(db.DateTime)
+
+
+class EstadoRevisao(db.Model):
+    # (NOVO) Agenda da revisão espaçada (SM-2, ver revisao_espacada.py): uma linha por questão
+    # que o usuário já errou, atualizada a cada resposta. Datas em UTC.
+    __tablename__ = 'estado_revisao'
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    questao_id = db.Column(db.Integer, primary_key=True)
+    repeticoes = db.Column(db.Integer, nullable=False, default=0) # acertos seguidos
+    intervalo = db.Column(db.Float, nullable=False, default=0) # dias
+    facilidade = db.Column(db.Float, nullable=False, default=revisao_espacada.FACILIDADE_INICIAL)
+    revisar_em = db.Column(db.DateTime, nullable=False)
+    atualizado_em = db.Column(db.DateTime, nullable=False)
+    # "Iniciar revisão" é uma faixa deste índice (vencidas primeiro), sem ler a tabela
+    __table_args__ = (db.Index('ix_estado_revisao_usuario_revisar_em', 'usuario_id', 'revisar_em', 'questao_id'),)
+
+
+class ChavesQuestoes(db.Model):
+    # (NOVO) Uma linha: a versão do banco a que os questao_id gravados se referem e a chave
+    # estável de cada posição dela (ver chaves_questoes.py)
+    __tablename__ = 'chaves_questoes'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    versao = db.Column(db.String(64), nullable=False)
+    chaves = db.Column(db.LargeBinary, nullable=False) # TAMANHO_CHAVE bytes por posição
+    atualizado_em = db.Column(db.DateTime, nullable=False)
+
+
+def agregados_do_historico():
+    '''(NOVO) SELECT com os agregados de cada usuário recalculados de resultados_simulados.'''
+    return select(
+        ResultadosSimulados.usuario_id,
+        func.count().label('total_simulados'),
+        func.coalesce(func.sum(ResultadosSimulados.percentual_acerto), 0).label('soma_percentuais'),
+        func.coalesce(func.sum(ResultadosSimulados.total_acertos), 0).label('total_acertos'),
+        func.coalesce(func.sum(ResultadosSimulados.total_questoes), 0).label('total_questoes'),
+        func.max(ResultadosSimulados.data).label('ultima_atividade'),
+    ).group_by(ResultadosSimulados.usuario_id)
+
+
+# (NOVO) As consultas frequentes sobre o histórico do usuário, como funções: as rotas e o
+# 'flask db-check-indexes' (que confere no EXPLAIN o índice de cada uma) usam as mesmas.
+REVISAO_QUESTOES = 10 # Questões por revisão espaçada
+
+
+def consulta_revisoes_vencidas(usuario_id, agora, limite=REVISAO_QUESTOES):
+    '''Questões com revisão vencida, as mais atrasadas primeiro.'''
+    return (select(EstadoRevisao.questao_id)
+            .where(EstadoRevisao.usuario_id == usuario_id, EstadoRevisao.revisar_em <= agora)
+            .order_by(EstadoRevisao.revisar_em).limit(limite))
+
+
+def consulta_proxima_revisao(usuario_id):
+    return select(func.min(EstadoRevisao.revisar_em)).where(EstadoRevisao.usuario_id == usuario_id)
+
+
+def consulta_estados_revisao(usuario_id, questao_ids):
+    '''Estado SM-2 das questões recém-respondidas (pela chave primária).'''
+    return select(EstadoRevisao).where(EstadoRevisao.usuario_id == usuario_id,
+                                       EstadoRevisao.questao_id.in_(questao_ids))
+
+
+def consulta_respostas_por_usuario():
+    '''(usuario_id, questao_id) de todas as respostas, agrupadas por usuário (rebuild-seen).
+    As de questões que saíram do banco (QUESTAO_REMOVIDA) ficam de fora.'''
+    return (select(RespostasUsuarios.usuario_id, RespostasUsuarios.questao_id)
+            .where(RespostasUsuarios.questao_id >= 0)
+            .order_by(RespostasUsuarios.usuario_id, RespostasUsuarios.questao_id))
+
+
+def consulta_metas_abertas(usuario_id, limite=3):
+    return select(MetasUsuarios).where(MetasUsuarios.usuario_id == usuario_id,
+                                       MetasUsuarios.concluida == False).limit(limite)
+
+
+def consulta_areas_destaque(usuario_id, limite=3):
+    return (select(DesempenhoAreas).where(DesempenhoAreas.usuario_id == usuario_id)
+            .order_by(DesempenhoAreas.percentual_acerto.desc()).limit(limite))
+
+
+def comando_atualizar_metas(usuario_id, total_questoes):
+    '''UPDATE das metas abertas ao finalizar um simulado (a média sai da linha de agregados,
+    que já inclui este simulado: sem AVG sobre o histórico).'''
+    media_geral = (select(func.round(cast(EstatisticasUsuarios.soma_percentuais / EstatisticasUsuarios.total_simulados,
+                                          Numeric), 1))
+                   .where(EstatisticasUsuarios.usuario_id == usuario_id).scalar_subquery())
+    return (update(MetasUsuarios)
+            .where(MetasUsuarios.usuario_id == usuario_id, MetasUsuarios.concluida == False,
+                   MetasUsuarios.tipo_meta.in_(('simulados_realizados', 'questoes_resolvidas', 'percentual_acerto')))
+            .values(valor_atual=case(
+                (MetasUsuarios.tipo_meta == 'simulados_realizados', MetasUsuarios.valor_atual + 1),
+                (MetasUsuarios.tipo_meta == 'questoes_resolvidas', MetasUsuarios.valor_atual + total_questoes),
+                else_=func.coalesce(media_geral, 0)))
+            .execution_options(synchronize_session=False))
+
+
+def recalcular_estatisticas():
+    '''(NOVO) Apaga e remonta todas as linhas de estatisticas_usuarios (INSERT ... SELECT).'''
+    db.session.query(EstatisticasUsuarios).delete()
+    consulta = agregados_do_historico()
+    db.session.execute(db.insert(EstatisticasUsuarios).from_select(
+        [coluna.name for coluna in consulta.selected_columns], consulta))
+
+
+_estatisticas_prontas = False
+
+def garantir_estatisticas():
+    '''(NOVO) Na primeira vez (por processo), cria a tabela se faltar e a preenche com o histórico.'''
+    global _estatisticas_prontas
+    if _estatisticas_prontas:
+        return
+    if not inspect(db.engine).has_table(EstatisticasUsuarios.__tablename__):
+        try:
+            EstatisticasUsuarios.__table__.create(db.engine)
+            recalcular_estatisticas()
+            db.session.commit()
+            print("INFO: Tabela 'estatisticas_usuarios' criada a partir do histórico.")
+        except Exception as e:
+            db.session.rollback() # Outro worker pode ter criado ao mesmo tempo
+            if not inspect(db.engine).has_table(EstatisticasUsuarios.__tablename__):
+                raise
+            print(f"AVISO: Tabela 'estatisticas_usuarios' criada por outro processo ({e}).")
+    _estatisticas_prontas = True
+
+
+_agenda_revisao_pronta = False
+
+def garantir_agenda_revisao():
+    '''(NOVO) Como garantir_estatisticas, para estado_revisao (bancos que não rodaram o db-upgrade).'''
+    global _agenda_revisao_pronta
+    if _agenda_revisao_pronta:
+        return
+    if not inspect(db.engine).has_table(EstadoRevisao.__tablename__):
+        try:
+            EstadoRevisao.__table__.create(db.engine)
+            total = recalcular_agenda_revisao()
+            db.session.commit()
+            print(f"INFO: Tabela 'estado_revisao' criada a partir do histórico ({total} questões na agenda).")
+        except Exception as e:
+            db.session.rollback()
+            if not inspect(db.engine).has_table(EstadoRevisao.__tablename__):
+                raise
+            print(f"AVISO: Tabela 'estado_revisao' criada por outro processo ({e}).")
+    _agenda_revisao_pronta = True
+
+
+def recalcular_agenda_revisao():
+    '''(NOVO) Remonta estado_revisao repassando todas as respostas pelo SM-2.'''
+    return revisao_espacada.recalcular(db.session.connection(), RespostasUsuarios.__table__, EstadoRevisao.__table__)
+
+
+def recalcular_vistas():
+    '''(NOVO) Remonta o bitset de cada usuário a partir das respostas. Retorna quantos usuários.'''
+    por_usuario = defaultdict(list)
+    for usuario_id, questao_id in db.session.execute(consulta_respostas_por_usuario()):
+        por_usuario[usuario_id].append(questao_id)
+    db.session.query(QuestoesVistas).delete()
+    for usuario_id, ids in por_usuario.items():
+        vistas = ConjuntoBits.de_ids(ids)
+        db.session.add(QuestoesVistas(usuario_id=usuario_id, bits=vistas.para_bytes(), total=len(vistas)))
+    return len(por_usuario)
+
+
+def carregar_vistas(usuario_id):
+    '''(NOVO) ConjuntoBits das questões já respondidas pelo usuário (vazio se nenhuma).
+    Uma leitura por chave primária; None se a tabela não existir (rode 'flask rebuild-seen').'''
+    try:
+        linha = db.session.get(QuestoesVistas, usuario_id)
+    except Exception as e:
+        db.session.rollback()
+        print(f"AVISO: Questões vistas indisponíveis, sorteando sem elas. Erro: {e}")
+        return None
+    return ConjuntoBits.de_bytes(linha.bits) if linha else ConjuntoBits()
+
+
+def marcar_vistas(usuario_id, questao_ids):
+    '''(NOVO) Liga os bits das questões no bitset do usuário (a linha fica travada até o commit).'''
+    linha = db.session.get(QuestoesVistas, usuario_id, with_for_update=True)
+    vistas = ConjuntoBits.de_bytes(linha.bits) if linha else ConjuntoBits()
+    novas = [vistas.adicionar(questao_id) for questao_id in questao_ids]
+    if not any(novas):
+        return
+    if linha is None:
+        db.session.add(QuestoesVistas(usuario_id=usuario_id, bits=vistas.para_bytes(), total=len(vistas)))
+    else:
+        linha.bits = vistas.para_bytes()
+        linha.total = len(vistas)
+
+
+# ---
+# --- (NOVO) Gravação das respostas (ver gravacao_respostas.py) ---
+# ---
+# Cada resposta vira um registro {"u": usuario_id, "q": questao_id, "a": acertou,
+# "d": disciplina, "t": epoch da resposta, "v": versão do banco do simulado}. No modo 'lote' o POST só anota o registro no
+# diário; a thread do gravador chama gravar_lote_respostas com vários de uma vez.
+def gravar_lote_respostas(registros):
+    '''Um INSERT com todas as linhas + um commit; depois os bitsets de vistas e a agenda
+    de revisão (commit separado: se falharem, as respostas já estão salvas).'''
+    with app.app_context():
+        try:
+            registros = ids_na_versao_gravada(registros)
+            db.session.execute(db.insert(RespostasUsuarios), [{
+                "usuario_id": r["u"],
+                "questao_id": r["q"],
+                "acertou": r["a"],
+                "disciplina": r["d"],
+                "data_resposta": datetime.datetime.fromtimestamp(r["t"], datetime.timezone.utc).replace(tzinfo=None),
+            } for r in registros])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        por_usuario = defaultdict(list)
+        for r in registros:
+            if r["q"] != QUESTAO_REMOVIDA:
+                por_usuario[r["u"]].append(r)
+        try:
+            for usuario_id, registros_usuario in por_usuario.items():
+                marcar_vistas(usuario_id, [r["q"] for r in registros_usuario])
+                atualizar_agenda_revisao(usuario_id, registros_usuario)
+            db.session.commit()
+        except Exception as e_db:
+            db.session.rollback()
+            print(f"Erro ao marcar questões vistas / agenda de revisão no BD: {e_db}")
+
+
+def atualizar_agenda_revisao(usuario_id, registros):
+    '''(NOVO) Passa as respostas (em ordem) pelo SM-2: um SELECT dos estados dessas questões
+    e um INSERT ... ON CONFLICT com os que mudaram. Se falhar, 'flask rebuild-review' refaz.'''
+    garantir_agenda_revisao()
+    questao_ids = {r["q"] for r in registros}
+    estados = {linha.questao_id: {"repeticoes": linha.repeticoes, "intervalo": linha.intervalo,
+                                  "facilidade": linha.facilidade}
+               for linha in db.session.execute(consulta_estados_revisao(usuario_id, questao_ids)).scalars()}
+    novos = {}
+    for r in registros:
+        quando = datetime.datetime.fromtimestamp(r["t"], datetime.timezone.utc).replace(tzinfo=None)
+        estado = revisao_espacada.agendar(estados.get(r["q"]), r["a"], quando)
+        if estado is not None:
+            estados[r["q"]] = novos[r["q"]] = estado
+    if not novos:
+        return
+    linhas = insert_upsert(EstadoRevisao).values([dict(estado, usuario_id=usuario_id, questao_id=questao_id)
+                                                  for questao_id, estado in novos.items()])
+    db.session.execute(linhas.on_conflict_do_update(
+        index_elements=[EstadoRevisao.usuario_id, EstadoRevisao.questao_id],
+        set_={coluna: linhas.excluded[coluna]
+              for coluna in ("repeticoes", "intervalo", "facilidade", "revisar_em", "atualizado_em")}))
+
+
+# ---
+# --- (NOVO) Ids das questões entre versões do banco (ver chaves_questoes.py) ---
+# ---
+_versao_ids = None # Versão do banco cujos ids este processo já conferiu em 'chaves_questoes'
+_proxima_sincronizacao = 0
+_lock_sincronizacao = threading.Lock()
+_chaves_por_versao = CacheLRU(4) # versão -> (chaves, {chave: posição})
+
+
+def chaves_da_versao(versao):
+    '''(chaves, {chave: posição}) de uma versão do banco em memória (modo arquivo) ou da
+    gravada em 'chaves_questoes'; None se não houver nenhuma das duas.'''
+    valor = _chaves_por_versao.obter(versao)
+    if valor is not None:
+        return valor
+    banco = gerenciador_banco.versao(versao)
+    if getattr(banco, 'snapshot', None) is not None:
+        chaves = chaves_questoes.chaves_do_snapshot(banco.snapshot)
+    else:
+        chaves = db.session.scalar(chaves_questoes.consulta_chaves(ChavesQuestoes.__table__, versao))
+        if chaves is None:
+            return None
+    valor = (chaves, chaves_questoes.posicoes(chaves))
+    _chaves_por_versao.guardar(versao, valor)
+    return valor
+
+
+def remapear_ids_questoes(versao, chaves):
+    '''Põe respostas, agenda de revisão e bitsets nos ids da 'versao', na transação atual
+    (sem commit). Retorna o mapa aplicado, ou None se os ids já estavam nessa versão.'''
+    mapa = chaves_questoes.remapear(db.session.connection(), ChavesQuestoes.__table__,
+                                    RespostasUsuarios.__table__, versao, chaves)
+    if mapa:
+        recalcular_agenda_revisao()
+        recalcular_vistas()
+        removidas = sum(1 for nova in mapa.values() if nova == QUESTAO_REMOVIDA)
+        print(f"INFO: Banco versão {versao}: {len(mapa)} questões mudaram de posição ({removidas} saíram); "
+              f"respostas, agenda de revisão e questões vistas remapeadas.")
+    return mapa
+
+
+def sincronizar_ids_questoes():
+    '''Modo arquivo, a cada requisição (só compara a versão): na primeira vez que o processo
+    vê uma versão do banco, confere os ids gravados e remapeia se for preciso. Se falhar,
+    tenta de novo depois de INTERVALO_VERIFICACAO_BANCO segundos.'''
+    global _versao_ids, _proxima_sincronizacao
+    banco = gerenciador_banco.atual()
+    if banco.versao == _versao_ids or banco.vazio or time.monotonic() < _proxima_sincronizacao:
+        return
+    if not _lock_sincronizacao.acquire(blocking=False):
+        return # Outra thread deste processo já está conferindo
+    try:
+        remapear_ids_questoes(banco.versao, chaves_da_versao(banco.versao)[0])
+        db.session.commit()
+        _versao_ids = banco.versao
+    except Exception as e:
+        db.session.rollback()
+        _proxima_sincronizacao = time.monotonic() + INTERVALO_VERIFICACAO_BANCO
+        print(f"AVISO: Ids das questões não conferidos com a versão {banco.versao} (rode 'flask db-upgrade'). Erro: {e}")
+    finally:
+        _lock_sincronizacao.release()
+
+
+def ids_na_versao_gravada(registros):
+    '''Respostas de um simulado sorteado noutra versão do banco (ou gravadas por um processo
+    que ainda não recarregou): o questao_id passa para a versão de 'chaves_questoes'. A leitura
+    trava a linha até o commit, então um remapeamento em andamento espera este INSERT.'''
+    if _versao_ids is None:
+        return registros # Modo SQL (sessões de outra versão recebem 410) ou ids ainda não conferidos
+    gravada = db.session.scalar(chaves_questoes.consulta_versao(ChavesQuestoes.__table__).with_for_update(read=True))
+    if gravada is None or all(r.get("v", gravada) == gravada for r in registros):
+        return registros
+    destino = chaves_da_versao(gravada)[1]
+    traduzidos = []
+    for r in registros:
+        if r.get("v", gravada) != gravada:
+            origem = chaves_da_versao(r["v"])
+            chave = chaves_questoes.chave_da_posicao(origem[0], r["q"]) if origem else None
+            r = dict(r, q=destino.get(chave, QUESTAO_REMOVIDA))
+        traduzidos.append(r)
+    return traduzidos
+
+
+def erro_permanente_resposta(e):
+    '''(NOVO) O banco recusou os próprios registros (constraint, dado inválido) ou o registro
+    está malformado: repetir o lote não adianta. Conexão, trava, tabela faltando etc. não.'''
+    return isinstance(e, (IntegrityError, DataError)) or not isinstance(e, SQLAlchemyError)
+
+
+if GRAVACAO_RESPOSTAS == 'lote':
+    gravador_respostas = GravadorEmLote(gravar_lote_respostas, PASTA_DIARIO_RESPOSTAS, fsync=DIARIO_RESPOSTAS_FSYNC,
+                                        erro_permanente=erro_permanente_resposta)
+    atexit.register(gravador_respostas.encerrar) # 'flask run' / python app.py; no gunicorn, ver worker_exit
+else:
+    gravador_respostas = None
+
+
+def registrar_resposta(registro):
+    '''(NOVO) Anota a resposta no diário (modo 'lote') ou grava na hora (modo 'direta',
+    ou se a fila do gravador estiver cheia). Erros de banco são só logados, como antes.'''
+    if gravador_respostas is not None:
+        try:
+            gravador_respostas.registrar(registro)
+            return
+        except FilaCheia as e:
+            print(f"AVISO: Fila de respostas cheia ({e}); gravando direto no banco.")
+    try:
+        gravar_lote_respostas([registro])
+    except Exception as e_db:
+        print(f"Erro ao salvar resposta no BD: {e_db}")
+
+
+# ---
+# --- (NOVO) Simulado em andamento guardado no servidor (ver sessao_simulado.py) ---
+# ---
+# O cookie da sessão leva só 'simulado_chave'; ids, respostas e versão do banco ficam
+# no armazém escolhido por SESSAO_SIMULADO_ARMAZEM, com validade SESSAO_SIMULADO_TTL
+# renovada a cada gravação.
+class SessoesSimulado(db.Model):
+    __tablename__ = 'sessoes_simulado'
+    chave = db.Column(db.String(32), primary_key=True)
+    dados = db.Column(db.LargeBinary, nullable=False) # EstadoSimulado.codificar()
+    expira_em = db.Column(db.Float, nullable=False, index=True) # time.time()
+
+
+def comando_limpar_sessoes(agora):
+    return delete(SessoesSimulado).where(SessoesSimulado.expira_em < agora)
+
+
+def comando_remover_sessao(chave):
+    return delete(SessoesSimulado).where(SessoesSimulado.chave == chave)
+
+
+class ArmazemSQL(Armazem):
+    '''Armazém na tabela 'sessoes_simulado' (criada no primeiro uso, se não existir).'''
+
+    def __init__(self):
+        super().__init__()
+        self._tabela_pronta = False
+
+    def _preparar(self):
+        if not self._tabela_pronta:
+            SessoesSimulado.__table__.create(db.engine, checkfirst=True)
+            self._tabela_pronta = True
+
+    def obter(self, chave):
+        self._preparar()
+        linha = db.session.get(SessoesSimulado, chave)
+        if linha is None or linha.expira_em < time.time():
+            return None
+        return linha.dados
+
+    def gravar(self, chave, dados, ttl):
+        self._preparar()
+        db.session.merge(SessoesSimulado(chave=chave, dados=dados, expira_em=time.time() + ttl))
+        db.session.commit()
+
+    def remover(self, chave):
+        self._preparar()
+        db.session.execute(comando_remover_sessao(chave))
+        db.session.commit()
+
+    def limpar_expiradas(self):
+        self._preparar()
+        removidas = db.session.execute(comando_limpar_sessoes(time.time())).rowcount
+        db.session.commit()
+        return removidas
+
+
+if SESSAO_SIMULADO_ARMAZEM == 'memoria':
+    armazem_simulados = ArmazemMemoria()
+elif SESSAO_SIMULADO_ARMAZEM == 'arquivo':
+    armazem_simulados = ArmazemArquivos(PASTA_SESSOES_SIMULADO)
+else:
+    armazem_simulados = ArmazemSQL()
+
+
+ids_por_descritor = CacheLRU(CACHE_DESCRITORES)
+pacotes_por_descritor = CacheLRU(CACHE_PACOTES_DESCRITOR)
+
+
+def ids_do_descritor(descritor):
+    '''(NOVO) Os ids do simulado descrito (sorteio sem histórico), ou None se a versão do
+    banco em que ele foi sorteado não está mais disponível.'''
+    ids = ids_por_descritor.obter(descritor.chave)
+    if ids is None:
+        banco = gerenciador_banco.versao(descritor.versao_banco)
+        if banco is None:
+            return None
+        ids = tuple(descritor.sortear(banco))
+        ids_por_descritor.guardar(descritor.chave, ids)
+    return ids
+
+
+def carregar_simulado():
+    '''(NOVO) O EstadoSimulado da sessão, ou None (sem simulado, vencido ou ilegível).'''
+    chave = session.get('simulado_chave')
+    if not chave_valida(chave):
+        return None
+    try:
+        dados = armazem_simulados.obter(chave)
+        estado = EstadoSimulado.decodificar(dados) if dados else None
+        if estado and estado.descritor:
+            ids = ids_do_descritor(estado.descritor)
+            if ids is None:
+                print(f"AVISO: Simulado da sessão sorteado na versão {estado.versao_banco}, que não está mais carregada.")
+                return None
+            estado.ids = list(ids)
+        return estado
+    except Exception as e:
+        db.session.rollback()
+        print(f"AVISO: Simulado da sessão ilegível, descartando. Erro: {e}")
+        return None
+
+
+def salvar_simulado(estado, novo=False):
+    '''(NOVO) Grava o estado no armazém. novo=True troca a chave (um simulado novo nunca
+    reaproveita a chave do anterior) e apaga o estado antigo.'''
+    chave = session.get('simulado_chave')
+    if novo or not chave_valida(chave):
+        if chave_valida(chave):
+            armazem_simulados.remover(chave)
+        chave = secrets.token_hex(16)
+        session['simulado_chave'] = chave
+        session.permanent = True
+    armazem_simulados.gravar(chave, estado.codificar(), SESSAO_SIMULADO_TTL)
+    armazem_simulados.talvez_limpar()
+
+
+def encerrar_simulado():
+    '''(NOVO) Apaga o simulado do armazém e a chave do cookie.'''
+    chave = session.pop('simulado_chave', None)
+    if chave_valida(chave):
+        armazem_simulados.remover(chave)
+
+
+# ---
+# --- (NOVO) MODO SQL DO BANCO DE QUESTÕES (ARMAZENAMENTO_QUESTOES=sql) ---
+# ---
+# As questões ficam na tabela 'questoes', populada por 'flask load-bank' a partir do
+# snapshot/CSV. O id de cada linha é o mesmo id do modo arquivo (posição no CSV), então
+# RespostasUsuarios.questao_id continua valendo nos dois modos. Os workers não guardam
+# o banco em memória: filtros e sorteio rodam no banco de dados, e cada questão já
+# vem pronta em JSON na coluna 'payload'. Só as questões aprovadas na validação entram.
+class Questoes(db.Model):
+    __tablename__ = 'questoes'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False) # Mesmo id do modo arquivo
+    disciplina = db.Column(db.String(200), nullable=False)
+    materia = db.Column(db.String(200), nullable=False, default='')
+    banca = db.Column(db.String(100), nullable=False)
+    dificuldade = db.Column(db.String(50), nullable=False)
+    enunciado = db.Column(db.Text, nullable=False)
+    alternativa_a = db.Column(db.Text, nullable=False, default='')
+    alternativa_b = db.Column(db.Text, nullable=False, default='')
+    alternativa_c = db.Column(db.Text, nullable=False, default='')
+    alternativa_d = db.Column(db.Text, nullable=False, default='')
+    alternativa_e = db.Column(db.Text, nullable=False, default='')
+    resposta_correta = db.Column(db.String(10), nullable=False)
+    justificativa = db.Column(db.Text, nullable=False, default='')
+    dica = db.Column(db.Text, nullable=False, default='')
+    formula = db.Column(db.Text, nullable=False, default='')
+    payload = db.Column(db.Text, nullable=False) # A questão já em JSON, como o front-end recebe
+    # (ALTERADO) 'materia' no fim: a contagem dos estratos (GROUP BY dificuldade, materia) sai só do índice
+    __table_args__ = (db.Index('ix_questoes_estratos', 'disciplina', 'banca', 'dificuldade', 'materia'),
+                      db.Index('ix_questoes_banca', 'banca'))
+
+class InfoBancoQuestoes(db.Model):
+    __tablename__ = 'info_banco_questoes'
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.String(64), nullable=False)
+    total_questoes = db.Column(db.Integer, nullable=False)
+    total_invalidas = db.Column(db.Integer, nullable=False, default=0)
+    carregado_em = db.Column(db.DateTime, server_default=func.now())
+
+
+class IndiceQuestoesSQL:
+    '''Mesma interface do IndiceQuestoes, respondida com GROUP BY / WHERE no banco.'''
+
+    def consulta_contagem(self, campo):
+        coluna = getattr(Questoes, campo)
+        return db.session.query(coluna, func.count()).group_by(coluna).order_by(func.count().desc())
+
+    def contagem(self, campo):
+        return {valor: total for valor, total in self.consulta_contagem(campo).all()}
+
+    def consulta(self, **filtros):
+        consulta = db.session.query(Questoes.id)
+        for campo, valores in filtros.items():
+            if valores is None:
+                continue
+            if isinstance(valores, str):
+                valores = [valores]
+            consulta = consulta.filter(getattr(Questoes, campo).in_(valores))
+        return consulta
+
+    def filtrar(self, **filtros):
+        return [questao_id for questao_id, in self.consulta(**filtros).order_by(Questoes.id).all()]
+
+    def contagem_estratos(self, **filtros):
+        '''(NOVO) Total por (dificuldade, materia) entre as questões dos filtros.'''
+        return (self.consulta(**filtros).with_entities(Questoes.dificuldade, Questoes.materia, func.count())
+                .group_by(Questoes.dificuldade, Questoes.materia))
+
+
+class CachePayloadsSQL:
+    def payload(self, questao_id):
+        '''Bytes JSON da questão. Levanta KeyError se o id não existe.'''
+        payload = db.session.query(Questoes.payload).filter_by(id=questao_id).scalar()
+        if payload is None:
+            raise KeyError(questao_id)
+        return payload.encode('utf-8')
+
+    def consulta_lista(self, ids):
+        return db.session.query(Questoes.id, Questoes.payload).filter(Questoes.id.in_(ids))
+
+    def lista(self, ids, ocultar_gabarito=()):
+        payloads = {i: p.encode('utf-8') for i, p in self.consulta_lista(ids).all()}
+        return b'[' + b','.join(retirar_gabarito(payloads[i]) if i in ocultar_gabarito else payloads[i]
+                                for i in ids) + b']'
+
+
+class BancoQuestoesSQL:
+    '''Uma versão do banco na tabela 'questoes' (mesma interface do BancoQuestoes).'''
+
+    fonte = 'sql'
+    validacao = None # A validação roda no 'flask load-bank'; só as questões válidas são gravadas
+
+    def __init__(self, info):
+        self.versao = info.versao if info else 'vazio'
+        self.total = info.total_questoes if info else 0
+        self.total_invalidas = info.total_invalidas if info else 0
+        self.carregado_em = info.carregado_em.timestamp() if info and info.carregado_em else time.time()
+        self.indice = IndiceQuestoesSQL()
+        self.payloads = CachePayloadsSQL()
+        self._busca = None
+
+    @property
+    def busca(self):
+        # (NOVO) Montado na primeira busca deste worker, lendo só as colunas de texto em lotes
+        if self._busca is None:
+            self._busca = IndiceBusca.das_linhas(self.consulta_textos().yield_per(LOTE_INDEXACAO))
+        return self._busca
+
+    @staticmethod
+    def consulta_textos():
+        colunas = [getattr(Questoes, campo) for campo, _ in CAMPOS_INDEXADOS]
+        return db.session.query(Questoes.id, *colunas).order_by(Questoes.id)
+
+    @staticmethod
+    def consulta_info():
+        return InfoBancoQuestoes.query.order_by(InfoBancoQuestoes.id.desc()).limit(1)
+
+    @classmethod
+    def do_banco_de_dados(cls):
+        try:
+            return cls(cls.consulta_info().first())
+        except Exception as e:
+            db.session.rollback()
+            print(f"AVISO: Tabela de questões indisponível (rode 'flask load-bank'). Erro: {e}")
+            return cls(None)
+
+    def __len__(self):
+        return self.total
+
+    @property
+    def vazio(self):
+        return self.total == 0
+
+    def linha(self, questao_id):
+        '''A questão como dicionário {coluna: valor}. Levanta KeyError se o id não existe.'''
+        questao = db.session.get(Questoes, questao_id)
+        if questao is None:
+            raise KeyError(questao_id)
+        return {coluna: getattr(questao, coluna) for coluna in HEADER_ESPERADO}
+
+    def sortear(self, quantidade, vistas=None, excluir_vistas=False, rng=None, **filtros):
+        '''Sorteio dentro do banco de dados (o índice composto reduz o conjunto antes do random()).
+        (NOVO) Com 'rng' (sorteio reproduzível), o sorteio é feito aqui sobre os ids em ordem.'''
+        if vistas is not None or rng is not None:
+            candidatos = self.indice.filtrar(**filtros)
+            if vistas is None:
+                return sortear_ids(candidatos, quantidade, rng)
+            return sortear_nao_vistas(candidatos, quantidade, vistas, excluir_vistas, rng or random)
+        consulta = self.indice.consulta(**filtros).order_by(func.random()).limit(quantidade)
+        return [questao_id for questao_id, in consulta.all()]
+
+    def sortear_estratificado(self, quantidade, proporcoes_dificuldade=None, proporcoes_materia=None,
+                              disciplina=None, banca=None, vistas=None, excluir_vistas=False, rng=None):
+        '''(NOVO) Um GROUP BY conta os estratos, a alocação é a mesma do modo arquivo e
+        cada estrato sorteado vira um ORDER BY random() LIMIT n (no máximo 'quantidade' consultas).'''
+        filtros = dict(disciplina=disciplina, banca=banca)
+        if vistas is not None or rng is not None:
+            return sortear_estratificado(self._estratos(**filtros), quantidade, proporcoes_dificuldade,
+                                         proporcoes_materia, rng=rng or random,
+                                         vistas=vistas, excluir_vistas=excluir_vistas)
+        contagem = self.indice.contagem_estratos(**filtros).all()
+        disponiveis, variantes = defaultdict(int), defaultdict(list)
+        for dificuldade, materia, total in contagem:
+            chave = (DIFICULDADES_SINONIMOS.get(dificuldade, dificuldade), materia)
+            disponiveis[chave] += total
+            variantes[chave].append(dificuldade)
+
+        sorteados = []
+        for (dificuldade, materia), n in alocar_estratos(disponiveis, quantidade, proporcoes_dificuldade,
+                                                         proporcoes_materia).items():
+            consulta = self.consulta_sorteio_estrato(variantes[(dificuldade, materia)], materia, n, **filtros)
+            sorteados.extend(questao_id for questao_id, in consulta.all())
+        random.shuffle(sorteados)
+        return sorteados
+
+    def consulta_sorteio_estrato(self, dificuldades, materia, quantidade, **filtros):
+        return (self.indice.consulta(**filtros)
+                .filter(Questoes.dificuldade.in_(dificuldades), Questoes.materia == materia)
+                .order_by(func.random()).limit(quantidade))
+
+    def consulta_estratos(self, **filtros):
+        # Com 'vistas' o teste de bit é feito aqui, sobre os ids candidatos (consulta só no índice).
+        # Em ordem de id: com a mesma semente, o sorteio reproduzível dá sempre os mesmos ids
+        return (self.indice.consulta(**filtros).with_entities(Questoes.id, Questoes.dificuldade, Questoes.materia)
+                .order_by(Questoes.id))
+
+    def _estratos(self, **filtros):
+        estratos = defaultdict(list)
+        for questao_id, dificuldade, materia in self.consulta_estratos(**filtros).all():
+            estratos[(DIFICULDADES_SINONIMOS.get(dificuldade, dificuldade), materia)].append(questao_id)
+        return {chave: [np.asarray(ids, dtype=np.int64)] for chave, ids in estratos.items()}
+
+
+class GerenciadorBancoSQL:
+    '''Mesma interface do GerenciadorBanco. A cada 'intervalo_verificacao' segundos
+    relê só a linha de info_banco_questoes; se a versão mudou (novo 'flask load-bank'),
+    troca o banco ativo.'''
+
+    def __init__(self, intervalo_verificacao=30):
+        self.intervalo_verificacao = intervalo_verificacao
+        self._atual = None
+        self._proxima_verificacao = 0
+        self.total_recargas = 0
+
+    def atual(self):
+        if self._atual is None:
+            self.recarregar()
+        return self._atual
+
+    def versao(self, versao):
+        atual = self.atual()
+        return atual if atual.versao == versao else None
+
+    def verificar_mudancas(self):
+        agora = time.monotonic()
+        if self._atual is not None and (not self.intervalo_verificacao or agora < self._proxima_verificacao):
+            return False
+        self._proxima_verificacao = agora + self.intervalo_verificacao
+        return self.recarregar()
+
+    def recarregar(self):
+        novo = BancoQuestoesSQL.do_banco_de_dados()
+        trocou = self._atual is None or novo.versao != self._atual.versao
+        if trocou:
+            self._atual = novo
+            self.total_recargas += 1
+            print(f"INFO: Banco de questões versão {novo.versao} ativo ({len(novo)} questões, fonte: sql).")
+        return trocou
+
+    def metricas(self):
+        atual = self.atual()
+        return {
+            "versao_ativa": atual.versao,
+            "fonte": atual.fonte,
+            "total_questoes": len(atual),
+            "questoes_invalidas": atual.total_invalidas,
+            "carregado_em": atual.carregado_em,
+            "versoes_em_memoria": [atual.versao],
+            "total_recargas": self.total_recargas,
+        }
+
+
+if ARMAZENAMENTO_QUESTOES == 'sql':
+    gerenciador_banco = GerenciadorBancoSQL(intervalo_verificacao=INTERVALO_VERIFICACAO_BANCO)
 
 
 # ---
@@ -148,13 +1010,304 @@ def init_db_command():
     try:
         print('Limpando tabelas existentes (se houver)...')
         db.drop_all()
+        migracoes.apagar_tabela_versao(db.engine)
+        # (ALTERADO) As tabelas saem das migrações: o banco já nasce na última versão
         print('Criando novas tabelas...')
-        db.create_all()
+        for versao, descricao in migracoes.aplicar(db.engine):
+            print(f"  Migração {versao}: {descricao}")
         print('Banco de dados inicializado com as novas tabelas.')
     except Exception as e:
         print(f"Erro ao inicializar o banco: {e}")
         print("Certifique-se que a DATABASE_URL está correta e o banco acessível.")
 
+# ---
+# --- (NOVO) Comando db-upgrade: aplica as migrações pendentes (ver migracoes.py) ---
+# ---
+# Ao contrário do init-db, não apaga nada: use para atualizar um banco com dados.
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Aplica as migrações de esquema que faltam, sem apagar dados."""
+    print(f"Versão atual do esquema: {migracoes.versao_atual(db.engine)}")
+    try:
+        aplicadas = migracoes.aplicar(db.engine)
+    except Exception as e:
+        print(f"ERRO: Migração falhou (desfeita; o esquema ficou em {migracoes.versao_atual(db.engine)}): {e}")
+        raise SystemExit(1)
+    for versao, descricao in aplicadas:
+        print(f"  Migração {versao}: {descricao}")
+    print(f"Esquema na versão {migracoes.versao_atual(db.engine)}" + ("" if aplicadas else " (nada a fazer)."))
+
+# ---
+# --- (NOVO) Comando db-check-indexes: confere no EXPLAIN que as consultas frequentes usam índice ---
+# ---
+def consultas_quentes():
+    '''(descrição, comando SQLAlchemy, índice esperado no plano) para cada SELECT, UPDATE e
+    DELETE do app.py. O índice pode ser o nome dele, um modelo (a chave primária da tabela,
+    como nos db.session.get/merge e nas alterações de objetos do ORM) ou None: comandos de
+    manutenção que leem ou apagam a tabela inteira de propósito. Os INSERTs ficam de fora
+    (não leem tabela; o ON CONFLICT usa a chave primária ou a restrição UNIQUE).'''
+    indice_questoes = IndiceQuestoesSQL()
+    banco_sql = BancoQuestoesSQL(None)
+    agora = time.time()
+    return [
+        # Simulado e respostas
+        ("Simulado: questões vistas do usuário (get / marcar_vistas)",
+         select(QuestoesVistas).where(QuestoesVistas.usuario_id == 1), QuestoesVistas),
+        ("Sessões: estado do simulado (get / merge)",
+         select(SessoesSimulado).where(SessoesSimulado.chave == 'x' * 32), SessoesSimulado),
+        ("Sessões: remover o simulado encerrado", comando_remover_sessao('x' * 32), SessoesSimulado),
+        ("Sessões: limpeza das expiradas", comando_limpar_sessoes(agora), 'ix_sessoes_simulado_expira_em'),
+        ("Respostas: estados SM-2 das questões respondidas", consulta_estados_revisao(1, [1, 2, 3]), EstadoRevisao),
+        # Revisão espaçada
+        ("Revisão: questões vencidas", consulta_revisoes_vencidas(1, datetime.datetime(2030, 1, 1)),
+         'ix_estado_revisao_usuario_revisar_em'),
+        ("Revisão: próxima a vencer", consulta_proxima_revisao(1), 'ix_estado_revisao_usuario_revisar_em'),
+        ("rebuild-review: histórico na ordem do SM-2", revisao_espacada.consulta_historico(RespostasUsuarios.__table__),
+         'ix_respostas_usuarios_historico'),
+        ("rebuild-review: apaga a agenda", delete(EstadoRevisao), None),
+        ("rebuild-seen: respostas por usuário", consulta_respostas_por_usuario(), 'ix_respostas_usuarios_historico'),
+        ("rebuild-seen: apaga os bitsets", delete(QuestoesVistas), None),
+        # Dashboard e finalizar
+        ("Dashboard: agregados do usuário", select(EstatisticasUsuarios).where(EstatisticasUsuarios.usuario_id == 1),
+         EstatisticasUsuarios),
+        ("Dashboard: metas abertas", consulta_metas_abertas(1), 'ix_metas_usuarios_usuario_concluida_tipo'),
+        ("Dashboard: áreas de destaque", consulta_areas_destaque(1), 'ix_desempenho_areas_usuario_percentual'),
+        ("Finalizar: UPDATE das metas", comando_atualizar_metas(1, 10), 'ix_metas_usuarios_usuario_concluida_tipo'),
+        ("rebuild-stats: agregados do histórico", agregados_do_historico(), 'ix_resultados_simulados_usuario'),
+        ("rebuild-stats: agregados gravados", select(EstatisticasUsuarios), None),
+        ("rebuild-stats: apaga os agregados", delete(EstatisticasUsuarios), None),
+        # Modo SQL do banco de questões
+        ("Modo SQL: versão carregada", BancoQuestoesSQL.consulta_info().statement, InfoBancoQuestoes),
+        ("Modo SQL: catálogo de disciplinas", indice_questoes.consulta_contagem('disciplina').statement,
+         'ix_questoes_estratos'),
+        ("Modo SQL: catálogo de bancas", indice_questoes.consulta_contagem('banca').statement, 'ix_questoes_banca'),
+        ("Modo SQL: estratos por disciplina e banca",
+         indice_questoes.contagem_estratos(disciplina=['Matemática'], banca=['FCC']).statement, 'ix_questoes_estratos'),
+        ("Modo SQL: questões por disciplina", indice_questoes.consulta(disciplina=['Matemática']).statement,
+         'ix_questoes_estratos'),
+        ("Modo SQL: questões por banca", indice_questoes.consulta(banca=['FCC']).statement, 'ix_questoes_banca'),
+        ("Modo SQL: sorteio de um estrato",
+         banco_sql.consulta_sorteio_estrato(['Fácil'], 'Álgebra', 3, disciplina=['Matemática']).statement,
+         'ix_questoes_estratos'),
+        ("Modo SQL: estratos com ids (sorteio reproduzível)",
+         banco_sql.consulta_estratos(disciplina=['Matemática'], banca=None).statement, 'ix_questoes_estratos'),
+        ("Modo SQL: questão por id (linha / payload)", select(Questoes).where(Questoes.id == 1), Questoes),
+        ("Modo SQL: pacote de questões", CachePayloadsSQL().consulta_lista([1, 2, 3]).statement, Questoes),
+        ("Modo SQL: textos para o índice de busca", BancoQuestoesSQL.consulta_textos().statement, Questoes),
+        ("load-bank: apaga as questões", delete(Questoes), None),
+        # Ids das questões entre versões do banco
+        ("Ids: versão gravada (a cada lote de respostas)", chaves_questoes.consulta_versao(ChavesQuestoes.__table__),
+         ChavesQuestoes),
+        ("Ids: chaves de uma versão", chaves_questoes.consulta_chaves(ChavesQuestoes.__table__, 'x'), ChavesQuestoes),
+        ("Ids: troca da versão (compare-and-set)",
+         chaves_questoes.comando_trocar_versao(ChavesQuestoes.__table__, 'x', 'y', b'', datetime.datetime(2030, 1, 1)),
+         ChavesQuestoes),
+        # Redação
+        ("Redação: trabalho por id (get / conclusão)", select(TrabalhosRedacao).where(TrabalhosRedacao.id == 'x' * 32),
+         TrabalhosRedacao),
+        ("Redação: trabalho pendente da mesma redação", consulta_trabalho_pendente('x' * 64, agora),
+         'ix_trabalhos_redacao_chave'),
+        ("Redação: trabalhos interrompidos no encerramento", comando_interromper_trabalhos(['x' * 32]),
+         TrabalhosRedacao),
+        ("Redação: limpeza dos trabalhos antigos", comando_limpar_trabalhos(agora), 'ix_trabalhos_redacao_criado_em'),
+        ("Redação: correção em cache (get / merge)", select(CorrecoesCache).where(CorrecoesCache.chave == 'x' * 64),
+         CorrecoesCache),
+        ("Redação: limpeza do cache de correções", comando_limpar_correcoes_cache(agora),
+         'ix_correcoes_cache_criado_em'),
+    ]
+
+
+def usa_indice(plano, indice):
+    '''Se o plano usa o índice esperado (ver consultas_quentes()).'''
+    if indice is None:
+        return True
+    if isinstance(indice, str):
+        return indice in plano
+    tabela = indice.__tablename__
+    if db.engine.dialect.name == 'postgresql':
+        return f"{tabela}_pkey" in plano
+    # SQLite: chave INTEGER é o próprio rowid (busca "INTEGER PRIMARY KEY" ou varredura na
+    # ordem dele, sem ordenar); as outras chaves primárias viram sqlite_autoindex_<tabela>_1
+    return (f"sqlite_autoindex_{tabela}_1" in plano or "INTEGER PRIMARY KEY" in plano
+            or (plano.startswith(f"SCAN {tabela}") and "USING" not in plano and "TEMP B-TREE" not in plano))
+
+
+def rotulo_indice(indice):
+    if indice is None:
+        return "tabela inteira (manutenção)"
+    return indice if isinstance(indice, str) else f"chave primária de {indice.__tablename__}"
+
+
+def plano_de_execucao(comando):
+    '''Texto do plano da consulta no banco atual. No PostgreSQL, com enable_seqscan desligado
+    (tabelas pequenas ou sem ANALYZE levariam o planejador a ler a tabela inteira de qualquer
+    jeito; a pergunta aqui é se existe um índice que sirva à consulta).'''
+    sql = str(comando.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as conexao:
+        if db.engine.dialect.name == 'postgresql':
+            conexao.execute(text("SET LOCAL enable_seqscan = off"))
+            linhas = conexao.execute(text("EXPLAIN " + sql)).all()
+            plano = "\n".join(linha[0] for linha in linhas)
+        else:
+            linhas = conexao.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+            plano = "\n".join(linha[-1] for linha in linhas)
+        conexao.rollback() # EXPLAIN não executa; o rollback só encerra a transação do SET LOCAL
+    return plano
+
+
+@app.cli.command('db-check-indexes')
+@click.option('--mostrar-planos', is_flag=True, help="Imprime o plano completo de cada consulta.")
+def db_check_indexes_command(mostrar_planos):
+    """Falha (código 1) se alguma consulta do app não usar o índice esperado."""
+    pendentes = migracoes.pendentes(db.engine)
+    if pendentes:
+        print(f"AVISO: {len(pendentes)} migração(ões) pendente(s); rode 'flask db-upgrade' antes.")
+    falhas = 0
+    for descricao, comando, indice in consultas_quentes():
+        plano = plano_de_execucao(comando)
+        usa = usa_indice(plano, indice)
+        falhas += not usa
+        print(f"{'OK   ' if usa else 'FALHA'} {descricao}: {rotulo_indice(indice)}")
+        if mostrar_planos or not usa:
+            print("      " + plano.replace("\n", "\n      "))
+    if falhas:
+        print(f"ERRO: {falhas} consulta(s) sem o índice esperado ({db.engine.dialect.name}).")
+        raise SystemExit(1)
+    print(f"Todas as consultas usam os índices esperados ({db.engine.dialect.name}).")
+
+# ---
+# --- (NOVO) Comando compile-bank: valida o CSV e gera o snapshot binário ---
+# ---
+@app.cli.command('compile-bank')
+def compile_bank_command():
+    """Valida o 'questoes.csv' e grava o snapshot binário carregado na inicialização."""
+    try:
+        cabecalho = compilar_snapshot(ARQUIVO_CSV, ARQUIVO_SNAPSHOT)
+        print(f"Snapshot '{ARQUIVO_SNAPSHOT}' gerado (formato v{cabecalho['versao_formato']}).")
+        print(f"Total de questões: {cabecalho['n_questoes']} | sha256 do CSV: {cabecalho['origem']['sha256'][:12]}...")
+    except Exception as e:
+        print(f"Erro ao compilar o banco de questões: {e}")
+        raise SystemExit(1)
+
+# ---
+# --- (NOVO) Comando rebuild-seen: remonta os bitsets de questões vistas a partir das respostas ---
+# ---
+@app.cli.command('rebuild-seen')
+def rebuild_seen_command():
+    """Cria a tabela 'questoes_vistas' (se faltar) e remonta o bitset de cada usuário."""
+    try:
+        QuestoesVistas.__table__.create(db.engine, checkfirst=True)
+        total = recalcular_vistas()
+        db.session.commit()
+        print(f"Questões vistas remontadas para {total} usuário(s).")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao remontar as questões vistas: {e}")
+        raise SystemExit(1)
+
+# ---
+# --- (NOVO) Comando rebuild-stats: recalcula os agregados do dashboard a partir do histórico ---
+# ---
+@app.cli.command('rebuild-stats')
+@click.option('--verificar', is_flag=True, help="Só compara com o histórico, sem gravar.")
+def rebuild_stats_command(verificar):
+    """Recalcula 'estatisticas_usuarios' a partir de 'resultados_simulados'."""
+    try:
+        EstatisticasUsuarios.__table__.create(db.engine, checkfirst=True)
+        atuais = {linha.usuario_id: linha for linha in EstatisticasUsuarios.query}
+        divergentes = 0
+        for esperado in db.session.execute(agregados_do_historico()):
+            atual = atuais.pop(esperado.usuario_id, None)
+            campos = ('total_simulados', 'soma_percentuais', 'total_acertos', 'total_questoes')
+            if atual is None or any(abs(getattr(atual, c) - getattr(esperado, c)) > 1e-6 for c in campos):
+                divergentes += 1
+                print(f"Usuário {esperado.usuario_id}: tabela {atual and [getattr(atual, c) for c in campos]}"
+                      f" x histórico {[getattr(esperado, c) for c in campos]}")
+        for usuario_id in atuais:
+            divergentes += 1
+            print(f"Usuário {usuario_id}: tem agregados mas nenhum resultado no histórico")
+        if verificar:
+            print(f"{divergentes} usuário(s) com agregados diferentes do histórico.")
+            raise SystemExit(1 if divergentes else 0)
+        recalcular_estatisticas()
+        db.session.commit()
+        print(f"Estatísticas recalculadas ({divergentes} usuário(s) estavam diferentes do histórico).")
+    except SystemExit:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao recalcular as estatísticas: {e}")
+        raise SystemExit(1)
+
+# ---
+# --- (NOVO) Comando rebuild-review: refaz a agenda da revisão espaçada a partir das respostas ---
+# ---
+@app.cli.command('rebuild-review')
+def rebuild_review_command():
+    """Recalcula 'estado_revisao' repassando 'respostas_usuarios' pelo SM-2."""
+    try:
+        EstadoRevisao.__table__.create(db.engine, checkfirst=True)
+        total = recalcular_agenda_revisao()
+        db.session.commit()
+        print(f"Agenda de revisão recalculada: {total} questões.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao recalcular a agenda de revisão: {e}")
+        raise SystemExit(1)
+
+# ---
+# --- (NOVO) Comando flush-answers: grava as respostas que sobraram nos diários ---
+# ---
+@app.cli.command('flush-answers')
+def flush_answers_command():
+    """Grava no banco as respostas que ficaram nos diários (rode com o app parado)."""
+    gravador = gravador_respostas or GravadorEmLote(gravar_lote_respostas, PASTA_DIARIO_RESPOSTAS,
+                                                    erro_permanente=erro_permanente_resposta)
+    try:
+        total = gravador.recuperar_todos()
+        print(f"{total} respostas pendentes gravadas a partir de '{PASTA_DIARIO_RESPOSTAS}'.")
+    except Exception as e:
+        print(f"Erro ao gravar os diários de respostas: {e}")
+
+# ---
+# --- (NOVO) Comando load-bank: copia o banco de questões para a tabela 'questoes' ---
+# ---
+LOTE_INSERCAO_QUESTOES = 1000
+
+@app.cli.command('load-bank')
+def load_bank_command():
+    """Copia as questões válidas do snapshot/CSV para a tabela 'questoes' (modo SQL)."""
+    try:
+        inicio = time.perf_counter()
+        banco = carregar_banco(ARQUIVO_CSV, ARQUIVO_SNAPSHOT)
+        if banco.vazio:
+            raise ValueError("o banco de questões está vazio")
+        snapshot = banco.snapshot
+        ids = banco.indice.todos.tolist() # Só as aprovadas na validação
+        colunas = {c: snapshot.coluna(c) for c in HEADER_ESPERADO}
+
+        Questoes.__table__.create(db.engine, checkfirst=True)
+        InfoBancoQuestoes.__table__.create(db.engine, checkfirst=True)
+        ChavesQuestoes.__table__.create(db.engine, checkfirst=True)
+        db.session.query(Questoes).delete()
+        for i in range(0, len(ids), LOTE_INSERCAO_QUESTOES):
+            lote = ids[i:i + LOTE_INSERCAO_QUESTOES]
+            db.session.execute(db.insert(Questoes), [
+                dict({c: colunas[c][q] for c in HEADER_ESPERADO}, id=q, payload=snapshot.payload(q).decode('utf-8'))
+                for q in lote
+            ])
+        db.session.add(InfoBancoQuestoes(versao=banco.versao, total_questoes=len(ids),
+                                         total_invalidas=banco.validacao.total_invalidas))
+        # (NOVO) Na mesma transação: respostas, agenda e bitsets passam para os ids desta versão
+        remapear_ids_questoes(banco.versao, chaves_questoes.chaves_do_snapshot(snapshot))
+        db.session.commit()
+        print(f"Tabela 'questoes' carregada: {len(ids)} questões (versão {banco.versao}, "
+              f"{banco.validacao.total_invalidas} inválidas ignoradas) em {time.perf_counter() - inicio:.1f} s.")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao carregar o banco de questões no SQL: {e}")
+        raise SystemExit(1)
+
 # ---
 # --- Rota Principal (Inalterada) ---
 # ---
@@ -165,33 +1318,37 @@ def index():
 # ---
 # --- API (Backend) para o JavaScript ---
 # ---
+def montar_catalogo_areas(banco):
+    contagem_disciplinas = banco.indice.contagem('disciplina')
+    areas_agrupadas = []
+
+    for area_principal, sub_materias in MAPA_AREAS.items():
+        total_questoes_area = 0
+        sub_materias_existentes = []
+
+        for sub_materia in sub_materias:
+            if sub_materia in contagem_disciplinas:
+                total_questoes_area += contagem_disciplinas[sub_materia]
+                sub_materias_existentes.append(sub_materia)
+
+        if total_questoes_area > 0 and sub_materias_existentes:
+            areas_agrupadas.append({
+                "area_principal": area_principal,
+                "sub_materias": sub_materias_existentes,
+                "total_questoes": int(total_questoes_area)
+            })
+
+    return {"success": True, "areas": areas_agrupadas}
+
 @app.route('/api/areas')
 def get_areas():
-    # Esta rota não usa o banco de dados, inalterada
+    # (ALTERADO) Montada uma vez por versão do banco e servida com ETag/gzip
     try:
-        if df_questoes.empty:
+        banco = gerenciador_banco.atual()
+        if banco.vazio:
             return jsonify({"success": False, "error": "Banco de questões não carregado"}), 500
         
-        contagem_disciplinas = df_questoes['disciplina'].value_counts().to_dict()
-        areas_agrupadas = []
-        
-        for area_principal, sub_materias in MAPA_AREAS.items():
-            total_questoes_area = 0
-            sub_materias_existentes = []
-            
-            for sub_materia in sub_materias:
-                if sub_materia in contagem_disciplinas:
-                    total_questoes_area += contagem_disciplinas[sub_materia]
-                    sub_materias_existentes.append(sub_materia)
-            
-            if total_questoes_area > 0 and sub_materias_existentes:
-                areas_agrupadas.append({
-                    "area_principal": area_principal,
-                    "sub_materias": sub_materias_existentes,
-                    "total_questoes": int(total_questoes_area)
-                })
-        
-        return jsonify({"success": True, "areas": areas_agrupadas})
+        return resposta_pronta('areas', banco.versao, lambda: montar_catalogo_areas(banco))
         
     except Exception as e:
         print(f"ERRO em /api/areas: {e}")
@@ -200,28 +1357,33 @@ def get_areas():
 # ---
 # --- (MUDANÇA) Rota /api/bancas REATIVADA ---
 # ---
+def montar_catalogo_bancas(banco):
+    # (REATIVADO) Lê a coluna 'banca'
+    contagem_bancas = banco.indice.contagem('banca')
+    bancas_reais = []
+
+    # (REATIVADO) Adiciona a "Banca Padrão" primeiro, se ela existir
+    if "Banca Padrão" in contagem_bancas:
+         bancas_reais.append({"banca": "Banca Padrão", "total_questoes": contagem_bancas["Banca Padrão"]})
+         del contagem_bancas["Banca Padrão"] # Remove para não duplicar
+
+    # (REATIVADO) Adiciona as outras bancas (FGV, Cebraspe, etc.)
+    for banca, total in contagem_bancas.items():
+        if banca: # Ignora bancas vazias
+            bancas_reais.append({"banca": banca, "total_questoes": total})
+
+    return {"success": True, "bancas": bancas_reais}
+
 @app.route('/api/bancas')
 def get_bancas():
     # Esta rota agora lê a coluna 'banca' do 'questoes.csv' unificado.
+    # (ALTERADO) Montada uma vez por versão do banco e servida com ETag/gzip
     try:
-        if df_questoes.empty:
+        banco = gerenciador_banco.atual()
+        if banco.vazio:
              return jsonify({"success": False, "error": "Banco de questões não carregado"}), 500
-        
-        # (REATIVADO) Lê a coluna 'banca'
-        contagem_bancas = df_questoes['banca'].value_counts().to_dict()
-        bancas_reais = []
-        
-        # (REATIVADO) Adiciona a "Banca Padrão" primeiro, se ela existir
-        if "Banca Padrão" in contagem_bancas:
-             bancas_reais.append({"banca": "Banca Padrão", "total_questoes": contagem_bancas["Banca Padrão"]})
-             del contagem_bancas["Banca Padrão"] # Remove para não duplicar
-        
-        # (REATIVADO) Adiciona as outras bancas (FGV, Cebraspe, etc.)
-        for banca, total in contagem_bancas.items():
-            if banca: # Ignora bancas vazias
-                bancas_reais.append({"banca": banca, "total_questoes": total})
 
-        return jsonify({"success": True, "bancas": bancas_reais})
+        return resposta_pronta('bancas', banco.versao, lambda: montar_catalogo_bancas(banco))
     except KeyError:
         # Erro caso a coluna 'banca' ainda esteja faltando no CSV
         print("ERRO em /api/bancas: A coluna 'banca' não foi encontrada no 'questoes.csv'.")
@@ -241,128 +1403,129 @@ def iniciar_simulado():
     # Esta rota usa Pandas + Sessão
     try:
         data = request.json
+        # (NOVO) Simulado compartilhado: o descritor (link) define filtros, semente e versão do banco
+        if data.get('descritor'):
+            return iniciar_simulado_descrito(data['descritor'])
         areas_selecionadas = data.get('areas', [])
         banca_selecionada = data.get('banca')
         quantidade_str = data.get('quantidade', '10')
+        # (NOVO) Sorteio estratificado: proporções alvo opcionais, ex.: {"Fácil": 0.2, "Médio": 0.5, "Difícil": 0.3}
+        estratificar = data.get('estratificar', True)
+        # (NOVO) Questões já respondidas: 'priorizar' (novas primeiro), 'excluir' ou 'ignorar'
+        modo_vistas = data.get('questoes_vistas', 'priorizar')
+        if modo_vistas not in ('priorizar', 'excluir', 'ignorar'):
+            return jsonify({"success": False, "error": "questoes_vistas deve ser 'priorizar', 'excluir' ou 'ignorar'."}), 400
+        proporcoes_dificuldade = data.get('proporcoes_dificuldade')
+        proporcoes_materia = data.get('proporcoes_materia')
+        if not (proporcoes_validas(proporcoes_dificuldade) and proporcoes_validas(proporcoes_materia)):
+            return jsonify({"success": False, "error": "Proporções inválidas: use {valor: peso >= 0}."}), 400
+        # (NOVO) Semente opcional: mesmos filtros + mesma semente = mesmo simulado
+        semente = data.get('semente')
+        if semente is not None and not (type(semente) is int and 0 <= semente < 2 ** 53):
+            return jsonify({"success": False, "error": "Semente inválida: use um inteiro entre 0 e 2^53."}), 400
 
         if not areas_selecionadas:
             return jsonify({"success": False, "error": "Nenhuma área selecionada."}), 400
         
-        if df_questoes.empty:
+        banco = gerenciador_banco.atual()
+        if banco.vazio:
             return jsonify({"success": False, "error": "Nenhuma questão disponível no banco de dados."}), 500
 
-        questoes_filtradas = df_questoes[df_questoes['disciplina'].isin(areas_selecionadas)]
-        
-        # --- (MUDANÇA) Filtro de Banca REATIVADO ---
-        # Agora que o CSV está corrigido, este filtro volta a funcionar.
-        if banca_selecionada and banca_selecionada != "(Banca Padrão)":
-            questoes_filtradas = questoes_filtradas[questoes_filtradas['banca'] == banca_selecionada]
-        # --- FIM DA MUDANÇA ---
+        # --- (ALTERADO) Filtros via índices invertidos (sem máscara sobre o DataFrame) ---
+        # "(Banca Padrão)" na tela significa "qualquer banca".
+        if not banca_selecionada or banca_selecionada == "(Banca Padrão)":
+            banca_selecionada = None
+        # (ALTERADO) O sorteio sai de um descritor (versão do banco, filtros, semente), semeado
+        descritor = DescritorSimulado(banco.versao, areas_selecionadas, banca_selecionada, int(quantidade_str),
+                                      bool(estratificar), proporcoes_dificuldade, proporcoes_materia, semente)
+        vistas = carregar_vistas(1) if modo_vistas != 'ignorar' else None
+        # Se o histórico toca os candidatos, o simulado não sai só do descritor e a sessão
+        # guarda os ids; senão o sorteio com e sem histórico é o mesmo (um sorteio só)
+        if descritor.depende_do_historico(banco, vistas):
+            ids_na_sessao = descritor.sortear(banco, vistas=vistas, excluir_vistas=modo_vistas == 'excluir')
+            descritor = None
+        else:
+            ids_na_sessao = descritor.sortear(banco)
+        # --- FIM DA ALTERAÇÃO ---
 
-        if questoes_filtradas.empty:
+        if not ids_na_sessao:
             return jsonify({"success": False, "error": "Nenhuma questão encontrada para os filtros selecionados."}), 404
-
-        total_encontrado = len(questoes_filtradas)
-        quantidade = int(quantidade_str)
-        if quantidade > total_encontrado:
-            quantidade = total_encontrado
-        
-        questoes_selecionadas_df = questoes_filtradas.sample(n=quantidade)
-        
-        questoes_prontas = []
-        ids_na_sessao = []
-        
-        for index, row in questoes_selecionadas_df.iterrows():
-            alternativas_obj = {
-                'a': row.get('alternativa_a'),
-                'b': row.get('alternativa_b'),
-                'c': row.get('alternativa_c'),
-                'd': row.get('alternativa_d'),
-                'e': row.get('alternativa_e')
-            }
-            
-            questao_formatada = {
-                "id": int(index),
-                "disciplina": row.get('disciplina'),
-                "materia": row.get('materia'),
-                "dificuldade": row.get('dificuldade'),
-                "enunciado": row.get('enunciado'),
-                "alternativas": alternativas_obj, 
-                "resposta_correta": row.get('resposta_correta'),
-                "justificativa": row.get('justificativa'),
-                "dica": row.get('dica'),
-                "formula": row.get('formula')
-            }
-            questoes_prontas.append(questao_formatada)
-            ids_na_sessao.append(int(index))
-
-        session['simulado_ids'] = ids_na_sessao
-        session['simulado_respostas'] = {}
-        session['indice_atual'] = 0
-        session['tipo_simulado'] = 'normal'
-        
-        primeira_questao = questoes_prontas[0]
-        
-        return jsonify({
-            "success": True,
-            "total_questoes": len(questoes_prontas),
-            "indice_atual": 0,
-            "questao": primeira_questao,
-            "resposta_anterior": None
-        })
+        if descritor:
+            ids_por_descritor.guardar(descritor.chave, tuple(ids_na_sessao))
+        return responder_simulado_iniciado(banco, ids_na_sessao, descritor)
 
     except Exception as e:
         print(f"ERRO 500 em /api/simulado/iniciar: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+
+def iniciar_simulado_descrito(token):
+    '''(NOVO) Refaz o simulado de um descritor, sem olhar o histórico do usuário.'''
+    try:
+        descritor = DescritorSimulado.de_token(token)
+    except EstadoInvalido as e:
+        return jsonify({"success": False, "error": f"Link de simulado inválido ({e})."}), 400
+    banco = gerenciador_banco.versao(descritor.versao_banco)
+    if banco is None:
+        return jsonify({"success": False, "error": "O banco de questões foi atualizado desde que este simulado "
+                                                   "foi criado; ele não pode mais ser refeito."}), 410
+    ids_na_sessao = ids_do_descritor(descritor)
+    if not ids_na_sessao:
+        return jsonify({"success": False, "error": "Nenhuma questão encontrada para os filtros selecionados."}), 404
+    return responder_simulado_iniciado(banco, list(ids_na_sessao), descritor)
+
+
+def responder_simulado_iniciado(banco, ids_na_sessao, descritor):
+    salvar_simulado(EstadoSimulado(ids_na_sessao, 'normal', banco.versao, descritor=descritor), novo=True)
+
+    # (ALTERADO) Só a primeira questão vai na resposta, direto do cache de payloads
+    return resposta_json({
+        "success": True,
+        "total_questoes": len(ids_na_sessao),
+        "indice_atual": 0,
+        "resposta_anterior": None,
+        **dados_compartilhamento(descritor)
+    }, {"questao": banco.payloads.payload(ids_na_sessao[0])})
+
+
+def dados_compartilhamento(descritor):
+    '''(NOVO) Descritor e link do simulado (None se ele depende do histórico do usuário).'''
+    if descritor is None:
+        return {"descritor": None, "link_compartilhamento": None}
+    token = descritor.token()
+    return {"descritor": token, "link_compartilhamento": f"{request.host_url}?simulado={token}"}
+
 @app.route('/api/simulado/questao/<int:indice>')
 def get_questao(indice):
-    # Esta rota usa Pandas + Sessão, inalterada
-    questoes_ids = session.get('simulado_ids')
-    if not questoes_ids:
+    estado = carregar_simulado()
+    if not estado or not estado.ids:
         return jsonify({"success": False, "error": "Simulado não encontrado na sessão."}), 404
+    questoes_ids = estado.ids
         
     total_questoes = len(questoes_ids)
     
     if 0 <= indice < total_questoes:
-        session['indice_atual'] = indice
         questao_id = questoes_ids[indice]
         try:
-            if df_questoes.empty:
+            # (ALTERADO) GET não grava: indice_atual só muda no responder (a retomada volta
+            # para a última questão respondida), sem uma escrita no armazém a cada clique
+            banco = banco_da_sessao(estado)
+            if banco is None:
+                return simulado_expirado()
+            if banco.vazio:
                 return jsonify({"success": False, "error": "Banco de questões não carregado no servidor."}), 500
                 
-            row = df_questoes.loc[questao_id]
-            
-            alternativas_obj = {
-                'a': row.get('alternativa_a'),
-                'b': row.get('alternativa_b'),
-                'c': row.get('alternativa_c'),
-                'd': row.get('alternativa_d'),
-                'e': row.get('alternativa_e')
-            }
-            
-            questao_atual = {
-                "id": int(questao_id),
-                "disciplina": row.get('disciplina'),
-                "materia": row.get('materia'),
-                "dificuldade": row.get('dificuldade'),
-                "enunciado": row.get('enunciado'),
-                "alternativas": alternativas_obj,
-                "resposta_correta": row.get('resposta_correta'),
-                "justificativa": row.get('justificativa'),
-                "dica": row.get('dica'),
-                "formula": row.get('formula')
-            }
+            # (ALTERADO) Payload pré-codificado, sem iterrows/row.get a cada clique
+            questao_atual = banco.payloads.payload(questao_id)
             
-            resposta_anterior = session.get('simulado_respostas', {}).get(str(questao_atual['id']))
+            resposta_anterior = estado.respostas.get(str(questao_id))
             
-            return jsonify({
+            return resposta_json({
                 "success": True,
                 "total_questoes": total_questoes,
                 "indice_atual": indice,
-                "questao": questao_atual,
                 "resposta_anterior": resposta_anterior
-            })
+            }, {"questao": questao_atual})
         except KeyError:
             return jsonify({"success": False, "error": f"Erro: Questão ID {questao_id} não encontrada no CSV."}), 500
         except Exception as e:
@@ -370,6 +1533,135 @@ def get_questao(indice):
     else:
         return jsonify({"success": False, "error": "Índice da questão fora dos limites."}), 404
 
+@app.route('/api/simulado/atual')
+def get_simulado_atual():
+    '''(NOVO) Retoma o simulado em andamento (ex.: depois de fechar o navegador) na
+    questão em que o aluno parou.'''
+    estado = carregar_simulado()
+    if not estado or not estado.ids:
+        return jsonify({"success": False, "error": "Nenhum simulado em andamento."}), 404
+    indice = min(estado.indice_atual, len(estado.ids) - 1)
+    questao_id = estado.ids[indice]
+    try:
+        banco = banco_da_sessao(estado)
+        if banco is None:
+            return simulado_expirado()
+        if banco.vazio:
+            return jsonify({"success": False, "error": "Banco de questões não carregado no servidor."}), 500
+        questao = banco.payloads.payload(questao_id)
+        resposta_anterior = estado.respostas.get(str(questao_id))
+        return resposta_json({
+            "success": True,
+            "tipo_simulado": estado.tipo,
+            "total_questoes": len(estado.ids),
+            "total_respondidas": len(estado.respostas),
+            "indice_atual": indice,
+            "resposta_anterior": resposta_anterior,
+            **dados_compartilhamento(estado.descritor)
+        }, {"questao": questao if resposta_anterior else retirar_gabarito(questao)})
+    except KeyError:
+        return jsonify({"success": False, "error": f"Erro: Questão ID {questao_id} não encontrada no CSV."}), 500
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Erro ao retomar simulado: {e}"}), 500
+
+# ---
+# --- (NOVO) Busca textual nas questões (BM25) ---
+# ---
+# GET /api/questoes/busca?q=regência verbal&pagina=1&por_pagina=20&disciplina=...&banca=...
+# 'disciplina' pode se repetir. As questões vêm no mesmo formato do simulado.
+BUSCA_POR_PAGINA = 20
+BUSCA_MAX_POR_PAGINA = 50
+
+@app.route('/api/questoes/busca')
+def buscar_questoes():
+    consulta = request.args.get('q', '').strip()
+    if not consulta:
+        return jsonify({"success": False, "error": "Informe o texto da busca (parâmetro 'q')."}), 400
+    pagina = max(request.args.get('pagina', 1, type=int), 1)
+    por_pagina = min(max(request.args.get('por_pagina', BUSCA_POR_PAGINA, type=int), 1), BUSCA_MAX_POR_PAGINA)
+    disciplinas = request.args.getlist('disciplina') or None
+    banca = request.args.get('banca')
+    if not banca or banca == "(Banca Padrão)":
+        banca = None
+
+    try:
+        banco = gerenciador_banco.atual()
+        if banco.vazio:
+            return jsonify({"success": False, "error": "Banco de questões não carregado"}), 500
+
+        candidatos = None
+        if disciplinas or banca:
+            candidatos = banco.indice.filtrar(disciplina=disciplinas, banca=banca)
+        ids, scores, total = banco.busca.buscar(consulta, candidatos, limite=pagina * por_pagina)
+        inicio = (pagina - 1) * por_pagina
+        ids, scores = ids[inicio:].tolist(), scores[inicio:].tolist()
+
+        return resposta_json({
+            "success": True,
+            "termos": termos(consulta),
+            "total": total,
+            "pagina": pagina,
+            "por_pagina": por_pagina,
+            "total_paginas": -(-total // por_pagina),
+            "resultados": [{"id": i, "score": round(s, 4)} for i, s in zip(ids, scores)],
+        }, {"questoes": banco.payloads.lista(ids)})
+    except Exception as e:
+        print(f"ERRO 500 em /api/questoes/busca: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ---
+# --- (NOVO) Pacote de questões do simulado (janela ou prova inteira) ---
+# ---
+# GET /api/simulado/questoes?inicio=0&quantidade=25 (sem 'quantidade': até JANELA_MAX_QUESTOES)
+# O front-end guarda as questões e navega localmente, buscando a próxima janela
+# antes de chegar ao fim da atual: um 'Próxima' não custa mais uma requisição.
+# Questões ainda não respondidas vão SEM gabarito (resposta_correta/justificativa);
+# as já respondidas vão completas, com a resposta anterior ao lado.
+JANELA_MAX_QUESTOES = 100
+
+@app.route('/api/simulado/questoes')
+def get_questoes_simulado():
+    estado = carregar_simulado()
+    if not estado or not estado.ids:
+        return jsonify({"success": False, "error": "Simulado não encontrado na sessão."}), 404
+    questoes_ids = estado.ids
+
+    total_questoes = len(questoes_ids)
+    inicio = request.args.get('inicio', 0, type=int)
+    quantidade = min(request.args.get('quantidade', JANELA_MAX_QUESTOES, type=int), JANELA_MAX_QUESTOES)
+    if not 0 <= inicio < total_questoes or quantidade < 1:
+        return jsonify({"success": False, "error": "Janela fora dos limites do simulado."}), 404
+    ids = questoes_ids[inicio:inicio + quantidade]
+
+    try:
+        banco = banco_da_sessao(estado)
+        if banco is None:
+            return simulado_expirado()
+        if banco.vazio:
+            return jsonify({"success": False, "error": "Banco de questões não carregado no servidor."}), 500
+        respostas = estado.respostas
+        nao_respondidas = {i for i in ids if str(i) not in respostas}
+        if estado.descritor and len(nao_respondidas) == len(ids):
+            # (NOVO) Janela ainda sem respostas de um simulado reproduzível: é igual para todos
+            # que fazem o mesmo simulado (link compartilhado), então sai do cache por descritor
+            chave = (estado.descritor.chave, inicio, len(ids))
+            questoes = pacotes_por_descritor.obter(chave)
+            if questoes is None:
+                questoes = banco.payloads.lista(ids, ocultar_gabarito=nao_respondidas)
+                pacotes_por_descritor.guardar(chave, questoes)
+        else:
+            questoes = banco.payloads.lista(ids, ocultar_gabarito=nao_respondidas)
+        return resposta_json({
+            "success": True,
+            "total_questoes": total_questoes,
+            "inicio": inicio,
+            "respostas_anteriores": [respostas.get(str(i)) for i in ids],
+        }, {"questoes": questoes})
+    except KeyError as e:
+        return jsonify({"success": False, "error": f"Erro: Questão ID {e} não encontrada no CSV."}), 500
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Erro ao buscar questões: {e}"}), 500
+
 # ---
 # --- (ALTERADO) API DO SIMULADO (Rotas com Banco de Dados) ---
 # ---
@@ -379,16 +1671,25 @@ def responder_questao():
     questao_id = str(data.get('questao_id'))
     alternativa_escolhida = data.get('alternativa', '').lower()
     
-    respostas = session.get('simulado_respostas', {})
+    estado = carregar_simulado()
+    if not estado:
+        return jsonify({"success": False, "error": "Simulado não encontrado na sessão."}), 404
+    respostas = estado.respostas
 
     if questao_id in respostas:
         return jsonify({"success": False, "error": "Esta questão já foi respondida."}), 400
+    posicao = estado.posicao(questao_id) if questao_id.isdigit() else -1
+    if posicao < 0:
+        return jsonify({"success": False, "error": "Esta questão não faz parte do simulado."}), 400
 
     try:
-        if df_questoes.empty:
+        banco = banco_da_sessao(estado)
+        if banco is None:
+            return simulado_expirado()
+        if banco.vazio:
             return jsonify({"success": False, "error": "Banco de questões não carregado no servidor."}), 500
             
-        row = df_questoes.loc[int(questao_id)]
+        row = banco.linha(int(questao_id))
              
         resposta_certa = row.get('resposta_correta', '').lower()
         acertou = (alternativa_escolhida == resposta_certa)
@@ -398,22 +1699,18 @@ def responder_questao():
             "acertou": acertou,
             "disciplina": row.get('disciplina') # (NOVO) Salva a disciplina
         }
-        session['simulado_respostas'] = respostas
+        estado.indice_atual = posicao
+        salvar_simulado(estado)
         
-        # (ALTERADO) Salva no banco de dados com SQLAlchemy
-        try:
-            nova_resposta = RespostasUsuarios(
-                usuario_id=1, # Fixo por enquanto
-                questao_id=int(questao_id),
-                acertou=acertou,
-                disciplina=row.get('disciplina')
-            )
-            db.session.add(nova_resposta)
-            db.session.commit()
-        except Exception as e_db:
-            db.session.rollback() # Desfaz em caso de erro
-            print(f"Erro ao salvar resposta no BD: {e_db}")
-            # Não falha a requisição, mas loga o erro
+        # (ALTERADO) Resposta + questão vista vão para o gravador em lote (ver registrar_resposta)
+        registrar_resposta({
+            "u": 1, # Fixo por enquanto
+            "q": int(questao_id),
+            "a": acertou,
+            "d": row.get('disciplina'),
+            "t": time.time(),
+            "v": estado.versao_banco,
+        })
 
         return jsonify({
             "success": True,
@@ -426,11 +1723,27 @@ def responder_questao():
     except Exception as e:
         return jsonify({"success": False, "error": f"Erro ao verificar resposta: {e}"}), 500
 
+def insert_upsert(modelo):
+    '''(NOVO) INSERT com .on_conflict_do_update() no dialeto do banco em uso (PostgreSQL ou SQLite).'''
+    dialetos = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+    if db.engine.dialect.name not in dialetos:
+        raise NotImplementedError(f"Upsert não suportado no banco '{db.engine.dialect.name}'.")
+    return dialetos[db.engine.dialect.name](modelo)
+
+
+def percentual_sql(acertos, total):
+    # round(numeric, 1): no PostgreSQL o round com casas decimais não existe para float
+    return func.round(cast(acertos * 100.0 / total, Numeric), 1)
+
+
 @app.route('/api/simulado/finalizar', methods=['POST'])
 def finalizar_simulado():
-    questoes_ids = session.get('simulado_ids')
-    respostas = session.get('simulado_respostas', {})
-    tipo_simulado = session.get('tipo_simulado', 'normal')
+    estado = carregar_simulado()
+    if not estado or not estado.ids:
+        return jsonify({"success": False, "error": "Nenhum simulado ativo para finalizar."}), 404
+    questoes_ids = estado.ids
+    respostas = estado.respostas
+    tipo_simulado = estado.tipo
     
     if not questoes_ids:
         return jsonify({"success": False, "error": "Nenhum simulado ativo para finalizar."}), 404
@@ -444,7 +1757,7 @@ def finalizar_simulado():
         for questao_id in questoes_ids:
             resposta = respostas.get(str(questao_id))
             if resposta:
-                disciplina = resposta.get('disciplina', 'Indefinida')
+                disciplina = resposta.get('disciplina') or 'Indefinida' # (ALTERADO) NULL nunca conflita no upsert
                 desempenho_disciplina[disciplina]['total'] += 1
                 if resposta['acertou']:
                     total_acertos += 1
@@ -452,55 +1765,55 @@ def finalizar_simulado():
         
         percentual_acerto = round((total_acertos / total_questoes) * 100, 1) if total_questoes > 0 else 0
         
-        # (ALTERADO) Salva o resultado no banco com SQLAlchemy
+        # (ALTERADO) Salva o resultado no banco com até 4 comandos SQL, qualquer que seja
+        # o número de disciplinas do simulado
         try:
+            garantir_estatisticas()
             # 2. Salva o resultado geral
-            novo_resultado = ResultadosSimulados(
+            db.session.execute(db.insert(ResultadosSimulados).values(
                 usuario_id=1,
                 total_questoes=total_questoes,
                 total_acertos=total_acertos,
                 percentual_acerto=percentual_acerto,
                 tipo_simulado=tipo_simulado
-            )
-            db.session.add(novo_resultado)
+            ))
             
-            # 3. Atualiza o desempenho por área
-            for disciplina, stats in desempenho_disciplina.items():
-                area_existente = DesempenhoAreas.query.filter_by(usuario_id=1, area=disciplina).first()
-                
-                if area_existente:
-                    area_existente.total_questoes += stats['total']
-                    area_existente.total_acertos += stats['acertos']
-                else:
-                    area_existente = DesempenhoAreas(
-                        usuario_id=1,
-                        area=disciplina,
-                        total_questoes=stats['total'],
-                        total_acertos=stats['acertos']
-                    )
-                    db.session.add(area_existente)
-                
-                # Recalcula percentual da área
-                if area_existente.total_questoes > 0:
-                    area_existente.percentual_acerto = round((area_existente.total_acertos / area_existente.total_questoes) * 100, 1)
-            
-            # 4. Atualiza metas (simples)
-            # (Otimizado: faz updates diretos sem SELECT primeiro)
-            db.session.query(MetasUsuarios).filter_by(
-                usuario_id=1, tipo_meta='simulados_realizados', concluida=False
-            ).update({'valor_atual': MetasUsuarios.valor_atual + 1})
+            # 3. Desempenho por área: um INSERT ... ON CONFLICT DO UPDATE com todas as
+            # disciplinas; nas áreas que já existem, soma e recalcula o percentual no SQL
+            if desempenho_disciplina:
+                novas_linhas = insert_upsert(DesempenhoAreas).values([{
+                    "usuario_id": 1,
+                    "area": disciplina,
+                    "total_questoes": stats['total'],
+                    "total_acertos": stats['acertos'],
+                    "percentual_acerto": round(stats['acertos'] / stats['total'] * 100, 1),
+                } for disciplina, stats in desempenho_disciplina.items()])
+                total_questoes_area = DesempenhoAreas.total_questoes + novas_linhas.excluded.total_questoes
+                total_acertos_area = DesempenhoAreas.total_acertos + novas_linhas.excluded.total_acertos
+                db.session.execute(novas_linhas.on_conflict_do_update(
+                    index_elements=[DesempenhoAreas.usuario_id, DesempenhoAreas.area],
+                    set_={
+                        "total_questoes": total_questoes_area,
+                        "total_acertos": total_acertos_area,
+                        "percentual_acerto": percentual_sql(total_acertos_area, total_questoes_area),
+                    }))
             
-            db.session.query(MetasUsuarios).filter_by(
-                usuario_id=1, tipo_meta='questoes_resolvidas', concluida=False
-            ).update({'valor_atual': MetasUsuarios.valor_atual + total_questoes})
-
-            # Para a média, precisamos calcular primeiro
-            media_geral_query = db.session.query(func.avg(ResultadosSimulados.percentual_acerto)).filter_by(usuario_id=1).scalar()
-            media_geral = round(media_geral_query or 0, 1)
-            
-            db.session.query(MetasUsuarios).filter_by(
-                usuario_id=1, tipo_meta='percentual_acerto', concluida=False
-            ).update({'valor_atual': media_geral})
+            # 4. (NOVO) Agregados do usuário (lidos pelo dashboard), na mesma transação
+            estatisticas = insert_upsert(EstatisticasUsuarios).values(
+                usuario_id=1, total_simulados=1, soma_percentuais=percentual_acerto,
+                total_acertos=total_acertos, total_questoes=total_questoes, ultima_atividade=func.now())
+            db.session.execute(estatisticas.on_conflict_do_update(
+                index_elements=[EstatisticasUsuarios.usuario_id],
+                set_={
+                    "total_simulados": EstatisticasUsuarios.total_simulados + 1,
+                    "soma_percentuais": EstatisticasUsuarios.soma_percentuais + estatisticas.excluded.soma_percentuais,
+                    "total_acertos": EstatisticasUsuarios.total_acertos + estatisticas.excluded.total_acertos,
+                    "total_questoes": EstatisticasUsuarios.total_questoes + estatisticas.excluded.total_questoes,
+                    "ultima_atividade": estatisticas.excluded.ultima_atividade,
+                }))
+
+            # 5. Atualiza as metas abertas num UPDATE só
+            db.session.execute(comando_atualizar_metas(1, total_questoes))
 
             db.session.commit()
         
@@ -513,11 +1826,12 @@ def finalizar_simulado():
         print(f"Erro ao calcular resultado: {e}")
         return jsonify({"success": False, "error": f"Erro ao calcular dados: {e}"}), 500
 
-    # Limpa a sessão (inalterado)
-    session.pop('simulado_ids', None)
-    session.pop('simulado_respostas', None)
-    session.pop('indice_atual', None)
-    session.pop('tipo_simulado', None)
+    # (ALTERADO) Limpa o simulado do armazém e a chave do cookie
+    try:
+        encerrar_simulado()
+    except Exception as e_db:
+        db.session.rollback()
+        print(f"Erro ao apagar sessão do simulado: {e_db}")
 
     return jsonify({
         "success": True,
@@ -537,22 +1851,20 @@ def get_dashboard_simplificado():
     try:
         # (ALTERADO) O SQLAlchemy cuida da conexão/cursor e do fechamento
         
-        # Métricas principais (usando 1 como ID de usuário fixo)
-        total_simulados = db.session.query(ResultadosSimulados).filter_by(usuario_id=1).count()
-        
-        media_geral_query = db.session.query(func.avg(ResultadosSimulados.percentual_acerto)).filter_by(usuario_id=1).scalar()
-        media_geral = media_geral_query or 0
-        
-        total_acertos_query = db.session.query(func.sum(ResultadosSimulados.total_acertos)).filter_by(usuario_id=1).scalar()
-        total_acertos = total_acertos_query or 0
+        # (ALTERADO) Métricas principais: uma linha lida pela chave primária (usuário fixo em 1)
+        garantir_estatisticas()
+        estatisticas = db.session.get(EstatisticasUsuarios, 1)
+        total_simulados = estatisticas.total_simulados if estatisticas else 0
+        media_geral = estatisticas.soma_percentuais / total_simulados if total_simulados else 0
+        total_acertos = estatisticas.total_acertos if estatisticas else 0
         
         progresso_geral = min(100, round(media_geral, 1))
         
         # Metas ativas
-        metas = MetasUsuarios.query.filter_by(usuario_id=1, concluida=False).limit(3).all()
+        metas = db.session.scalars(consulta_metas_abertas(1)).all()
         
         # Áreas de destaque
-        areas = DesempenhoAreas.query.filter_by(usuario_id=1).order_by(DesempenhoAreas.percentual_acerto.desc()).limit(3).all()
+        areas = db.session.scalars(consulta_areas_destaque(1)).all()
                 
         return jsonify({
             "success": True,
@@ -610,63 +1922,49 @@ def criar_meta():
 @app.route('/api/simulado/revisao-espacada', methods=['POST'])
 def iniciar_revisao_espacada():
     try:
-        # (ALTERADO) Pega 10 questões que o usuário errou
-        # NOTA: func.random() funciona no SQLite e PostgreSQL.
-        query = db.session.query(RespostasUsuarios.questao_id).filter_by(
-            usuario_id=1, 
-            acertou=False
-        ).order_by(func.random()).limit(10)
+        # (ALTERADO) As 10 questões com revisão vencida há mais tempo (agenda SM-2 em
+        # estado_revisao): uma faixa do índice (usuario_id, revisar_em), não o histórico todo
+        garantir_agenda_revisao()
+        agora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        # Modo CSV: busca a mais, porque as que não estão na versão atual do banco saem abaixo
+        query = consulta_revisoes_vencidas(1, agora, limite=REVISAO_QUESTOES * (1 if ARMAZENAMENTO_QUESTOES == 'sql' else 5))
+        if ARMAZENAMENTO_QUESTOES == 'sql':
+            # (NOVO) Modo SQL: o JOIN já descarta respostas de questões que não existem mais
+            query = query.join(Questoes, Questoes.id == EstadoRevisao.questao_id)
         
-        questao_ids = [row.questao_id for row in query.all()]
+        questao_ids = list(db.session.scalars(query))
         
         if not questao_ids:
-            return jsonify({"success": False, "error": "Nenhuma questão para revisão encontrada. Você acertou tudo!"}), 404
+            proxima = db.session.scalar(consulta_proxima_revisao(1))
+            if proxima is None:
+                return jsonify({"success": False, "error": "Nenhuma questão para revisão encontrada. Você acertou tudo!"}), 404
+            return jsonify({"success": False, "proxima_revisao": proxima.isoformat() + 'Z',
+                            "error": f"Nenhuma revisão vencida agora. A próxima vence em {proxima:%d/%m/%Y às %H:%M} (UTC)."}), 404
         
         # O resto da lógica usa Pandas, inalterado
-        if df_questoes.empty:
+        banco = gerenciador_banco.atual()
+        if banco.vazio:
             return jsonify({"success": False, "error": "Banco de questões não carregado no servidor."}), 500
             
-        questoes_revisao = df_questoes.loc[df_questoes.index.isin(questao_ids)]
+        # (ALTERADO) Na ordem da agenda (as mais atrasadas primeiro), só as que estão
+        # na versão atual do banco (o índice 'todos' já exclui as reprovadas na validação)
+        if ARMAZENAMENTO_QUESTOES == 'sql':
+            ids_na_sessao = questao_ids
+        else:
+            no_banco = np.isin(np.asarray(questao_ids, dtype=np.int64), banco.indice.todos)
+            ids_na_sessao = [int(i) for i, existe in zip(questao_ids, no_banco) if existe][:REVISAO_QUESTOES]
         
-        if questoes_revisao.empty:
+        if not ids_na_sessao:
             return jsonify({"success": False, "error": "Questões não encontradas no banco de dados CSV."}), 404
         
-        questoes_formatadas = []
-        ids_na_sessao = []
-        for index, row in questoes_revisao.iterrows():
-            questao = {
-                "id": int(index),
-                "disciplina": row.get('disciplina'),
-                "materia": row.get('materia'),
-                "dificuldade": row.get('dificuldade'),
-                "enunciado": row.get('enunciado'),
-                "alternativas": {
-                    'a': row.get('alternativa_a'),
-                    'b': row.get('alternativa_b'),
-                    'c': row.get('alternativa_c'),
-                    'd': row.get('alternativa_d'),
-                    'e': row.get('alternativa_e')
-                },
-                "resposta_correta": row.get('resposta_correta'),
-                "justificativa": row.get('justificativa'),
-                "dica": row.get('dica'),
-                "formula": row.get('formula')
-            }
-            questoes_formatadas.append(questao)
-            ids_na_sessao.append(int(index))
-        
         # Configurar sessão
-        session['simulado_ids'] = ids_na_sessao
-        session['simulado_respostas'] = {}
-        session['indice_atual'] = 0
-        session['tipo_simulado'] = 'revisao_espacada'
+        salvar_simulado(EstadoSimulado(ids_na_sessao, 'revisao_espacada', banco.versao), novo=True)
         
-        return jsonify({
+        return resposta_json({
             "success": True,
-            "total_questoes": len(questoes_formatadas),
-            "questao_atual": questoes_formatadas[0], # (NOVO) Nome da chave corrigido
+            "total_questoes": len(ids_na_sessao),
             "indice_atual": 0
-        })
+        }, {"questao_atual": banco.payloads.payload(ids_na_sessao[0])}) # (NOVO) Nome da chave corrigido
         
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1129,10 +2427,16 @@ TEMAS_REDACAO_MELHORADOS = [
     }
 ]
 
+# (ALTERADO) Resposta inteira pré-codificada e pré-comprimida, com ETag: servir estes
+# bytes não mexe nos 45 dicionários a cada requisição, então as páginas deles
+# continuam compartilhadas entre os workers
+TEMAS_REDACAO_RESPOSTA = RespostaPronta(codificar_json({"success": True, "temas": TEMAS_REDACAO_MELHORADOS}),
+                                        CACHE_TEMAS_SEGUNDOS)
+
 
 @app.route('/api/redacao/temas-melhorados')
 def get_temas_melhorados():
-    return jsonify({"success": True, "temas": TEMAS_REDACAO_MELHORADOS})
+    return TEMAS_REDACAO_RESPOSTA.servir()
 
 def gerar_correcao_simulada():
     '''(NOVO) Correção simulada quando Gemini não está disponível'''
@@ -1151,26 +2455,16 @@ def gerar_correcao_simulada():
         "sugestoes_melhoria": ["(Simulado) Ampliar o repertório de citações", "Desenvolver mais os exemplos práticos"]
     }
 
-@app.route('/api/redacao/corrigir-gemini-real', methods=['POST'])
-def corrigir_redacao_gemini_real():
-    try:
-        data = request.json
-        tema = data.get('tema')
-        texto = data.get('texto')
-        enunciado = data.get('enunciado')
-        
-        if not tema or not texto:
-            return jsonify({"success": False, "error": "Tema e texto são obrigatórios"}), 400
-        
-        GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-        
-        # (NOVO) Verifica se a chave existe e não é a placeholder
-        if GEMINI_API_KEY and GEMINI_API_KEY != 'sua_chave_gemini_aqui':
-            genai.configure(api_key=GEMINI_API_KEY)
-            
-            # --- (INÍCIO DA ATUALIZAÇÃO) ---
-            # Prompt atualizado para ser mais rigoroso e fiel ao ENEM
-            prompt = f'''
+# (NOVO) Modelo e versão do prompt entram na chave do cache de correções: ao mudar o
+# texto do prompt, aumente VERSAO_PROMPT_CORRECAO para não reaproveitar correções antigas
+MODELO_GEMINI = 'models/gemini-flash-latest'
+VERSAO_PROMPT_CORRECAO = 1
+
+def montar_prompt_correcao(tema, enunciado, texto):
+    '''(NOVO) Prompt da correção (o mesmo de antes, agora fora da rota).'''
+    # --- (INÍCIO DA ATUALIZAÇÃO) ---
+    # Prompt atualizado para ser mais rigoroso e fiel ao ENEM
+    return f'''
             Aja como um avaliador-chefe de banca de correção do ENEM. Seja extremamente rigoroso, técnico e detalhista.
             Sua tarefa é corrigir a redação do aluno com base nos critérios oficiais do ENEM. A nota deve ser justa, mas severa, penalizando desvios gramaticais, falta de coesão, argumentação fraca e propostas de intervenção incompletas.
 
@@ -1227,34 +2521,461 @@ def corrigir_redacao_gemini_real():
                 "sugestoes_melhoria": ["Liste 3 sugestões práticas para o aluno melhorar a nota"]
             }}
             '''
-            # --- (FIM DA ATUALIZAÇÃO) ---
-            
-            # --- (CORREÇÃO 1) Modelo do Gemini ---
-            # O modelo 'gemini-1.5-pro-latest' falhou no log. Mudando para o '1.0-pro'.
-            model = genai.GenerativeModel('models/gemini-flash-latest')
-            # --- FIM DA CORREÇÃO 1 ---
+    # --- (FIM DA ATUALIZAÇÃO) ---
 
-            response = model.generate_content(prompt)
-            
-            # Limpa a resposta do Gemini para garantir que é um JSON
-            json_text = response.text.strip().replace('```json', '').replace('```', '')
-            
-            try:
-                correcao = json.loads(json_text)
-            except json.JSONDecodeError:
-                print("Erro ao decodificar JSON do Gemini. Usando mock.")
-                correcao = gerar_correcao_simulada()
-        else:
-            print("Chave Gemini não configurada. Usando mock.")
-            correcao = gerar_correcao_simulada()
+
+def corrigir_redacao(tema, enunciado, texto):
+    '''(NOVO) Chama o Gemini e retorna (correcao, origem); origem 'simulada' quando não há
+    chave configurada ou a resposta não é um JSON válido. Levanta GeminiIndisponivel
+    (ver cliente_gemini.py) quando o Gemini não responde; outros erros do Gemini sobem.'''
+    cliente = obter_cliente(MODELO_GEMINI)
+    if cliente is None:
+        print("Chave Gemini não configurada. Usando mock.")
+        return gerar_correcao_simulada(), 'simulada'
+
+    return ler_json_correcao(cliente.gerar(montar_prompt_correcao(tema, enunciado, texto)))
+
+
+def ler_json_correcao(texto_modelo):
+    '''(NOVO) (correcao, 'gemini') a partir do texto do modelo, ou a simulada se não for JSON.'''
+    # Limpa a resposta do Gemini para garantir que é um JSON
+    json_text = texto_modelo.strip().replace('```json', '').replace('```', '')
+    
+    try:
+        return json.loads(json_text), 'gemini'
+    except json.JSONDecodeError:
+        print("Erro ao decodificar JSON do Gemini. Usando mock.")
+        return gerar_correcao_simulada(), 'simulada'
+
+
+# ---
+# --- (NOVO) Correção como trabalho em segundo plano (ver fila_correcoes.py) ---
+# ---
+# O POST grava o trabalho em 'trabalhos_redacao' e responde na hora com o id; as threads
+# do pool fazem a chamada ao Gemini e gravam o resultado na mesma linha. O front-end
+# consulta GET /api/redacao/jobs/<id> até o estado ser 'concluido' ou 'erro'. A tabela
+# (e não a memória) guarda o estado porque o GET pode cair em outro worker.
+# Com REDACAO_FILA_MAXIMA trabalhos pendentes no worker, a redação recebe na hora a
+# correção simulada (marcada com "degradado"), em vez de esperar numa fila sem fim.
+REDACAO_TRABALHADORES = int(os.environ.get('REDACAO_TRABALHADORES', '2'))
+REDACAO_FILA_MAXIMA = int(os.environ.get('REDACAO_FILA_MAXIMA', '8'))
+REDACAO_TEMPO_MAXIMO = int(os.environ.get('REDACAO_TEMPO_MAXIMO', '300')) # segundos até um trabalho parado virar erro
+REDACAO_RETENCAO = int(os.environ.get('REDACAO_RETENCAO', str(7 * 24 * 3600))) # trabalhos antigos são apagados
+
+TRABALHO_NA_FILA, TRABALHO_PROCESSANDO, TRABALHO_CONCLUIDO, TRABALHO_ERRO = 'na_fila', 'processando', 'concluido', 'erro'
+
+
+class TrabalhosRedacao(db.Model):
+    __tablename__ = 'trabalhos_redacao'
+    id = db.Column(db.String(32), primary_key=True) # secrets.token_hex(16)
+    estado = db.Column(db.String(20), nullable=False, default=TRABALHO_NA_FILA)
+    tema = db.Column(db.Text, nullable=False)
+    enunciado = db.Column(db.Text)
+    texto = db.Column(db.Text, nullable=False)
+    correcao = db.Column(db.Text) # JSON
+    origem = db.Column(db.String(20)) # 'gemini' ou 'simulada'
+    degradado = db.Column(db.Boolean, nullable=False, default=False) # simulada por fila saturada
+    chave = db.Column(db.String(64), index=True) # (NOVO) chave_da_redacao: envios iguais pendentes viram um só
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.Float, nullable=False, index=True) # time.time()
+    atualizado_em = db.Column(db.Float, nullable=False)
+
+
+_trabalhos_prontos = False
+_ultima_limpeza_trabalhos = 0.0
+
+def preparar_trabalhos_redacao():
+    '''Cria a tabela se faltar (bancos sem o db-upgrade) e, de tempos em tempos, apaga os antigos.'''
+    global _trabalhos_prontos, _ultima_limpeza_trabalhos
+    if not _trabalhos_prontos:
+        TrabalhosRedacao.__table__.create(db.engine, checkfirst=True)
+        CorrecoesCache.__table__.create(db.engine, checkfirst=True)
+        _trabalhos_prontos = True
+    agora = time.time()
+    if agora - _ultima_limpeza_trabalhos > 600: # no máximo uma varredura a cada 10 minutos por processo
+        _ultima_limpeza_trabalhos = agora
+        db.session.execute(comando_limpar_trabalhos(agora - REDACAO_RETENCAO))
+        db.session.execute(comando_limpar_correcoes_cache(agora - REDACAO_CACHE_RETENCAO))
+        db.session.commit()
+
+
+def comando_limpar_trabalhos(antes_de):
+    return delete(TrabalhosRedacao).where(TrabalhosRedacao.criado_em < antes_de)
+
+
+def comando_limpar_correcoes_cache(antes_de):
+    return delete(CorrecoesCache).where(CorrecoesCache.criado_em < antes_de)
+
+
+def consulta_trabalho_pendente(chave, agora):
+    '''O trabalho mais recente ainda em correção para a mesma redação (envios iguais viram um só).'''
+    return (select(TrabalhosRedacao).where(TrabalhosRedacao.chave == chave,
+                                           TrabalhosRedacao.estado.in_((TRABALHO_NA_FILA, TRABALHO_PROCESSANDO)),
+                                           TrabalhosRedacao.atualizado_em > agora - REDACAO_TEMPO_MAXIMO)
+            .order_by(TrabalhosRedacao.criado_em.desc()).limit(1))
+
+
+def comando_interromper_trabalhos(trabalho_ids):
+    return (update(TrabalhosRedacao)
+            .where(TrabalhosRedacao.id.in_(trabalho_ids), TrabalhosRedacao.estado == TRABALHO_NA_FILA)
+            .values(estado=TRABALHO_ERRO, erro="Servidor reiniciado antes da correção. Envie de novo.",
+                    atualizado_em=time.time()))
+
+
+def concluir_trabalho(trabalho, correcao, origem, degradado=False):
+    trabalho.estado = TRABALHO_CONCLUIDO
+    trabalho.correcao = json.dumps(correcao, ensure_ascii=False)
+    trabalho.origem = origem
+    trabalho.degradado = degradado
+    trabalho.atualizado_em = time.time()
+
+
+def executar_trabalho_redacao(trabalho_id):
+    '''Roda numa thread do pool: corrige e grava o resultado (ou o erro) na linha do trabalho.'''
+    with app.app_context():
+        trabalho = db.session.get(TrabalhosRedacao, trabalho_id)
+        if trabalho is None or trabalho.estado != TRABALHO_NA_FILA:
+            return
+        trabalho.estado = TRABALHO_PROCESSANDO
+        trabalho.atualizado_em = time.time()
+        db.session.commit()
+        try:
+            correcao, origem = corrigir_redacao_com_cache(trabalho.tema, trabalho.enunciado, trabalho.texto,
+                                                          trabalho.chave)
+            concluir_trabalho(trabalho, correcao, origem)
+        except GeminiIndisponivel as e:
+            # (NOVO) Gemini fora do ar (ou disjuntor aberto): a simulada, marcada como degradada
+            print(f"AVISO: Gemini indisponível ({e}); usando mock.")
+            concluir_trabalho(trabalho, gerar_correcao_simulada(), 'simulada', degradado=True)
+        except Exception as e:
+            print(f"ERRO na correção da redação (trabalho {trabalho_id}): {e}")
+            trabalho.estado = TRABALHO_ERRO
+            trabalho.erro = str(e)
+            trabalho.atualizado_em = time.time()
+        db.session.commit()
+
+
+# ---
+# --- (NOVO) Cache das correções (ver cache_correcoes.py) ---
+# ---
+# Os valores são (correcao, origem), como corrigir_redacao retorna. Nível persistente: a
+# tabela 'correcoes_cache' (uma linha por chave). Só correções do Gemini entram; a
+# simulada nunca é guardada.
+REDACAO_CACHE_CAPACIDADE = int(os.environ.get('REDACAO_CACHE_CAPACIDADE', '256')) # itens no LRU de cada worker
+REDACAO_CACHE_RETENCAO = int(os.environ.get('REDACAO_CACHE_RETENCAO', str(30 * 24 * 3600)))
+
+
+class CorrecoesCache(db.Model):
+    __tablename__ = 'correcoes_cache'
+    chave = db.Column(db.String(64), primary_key=True) # chave_da_redacao (sha256)
+    modelo = db.Column(db.String(100), nullable=False)
+    correcao = db.Column(db.Text, nullable=False) # JSON
+    criado_em = db.Column(db.Float, nullable=False, index=True) # time.time()
+
+
+def obter_correcao_persistente(chave):
+    linha = db.session.get(CorrecoesCache, chave)
+    return (json.loads(linha.correcao), 'gemini') if linha else None
+
+
+def gravar_correcao_persistente(chave, valor):
+    try:
+        db.session.merge(CorrecoesCache(chave=chave, modelo=MODELO_GEMINI, criado_em=time.time(),
+                                        correcao=json.dumps(valor[0], ensure_ascii=False)))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+cache_correcoes = CacheCorrecoes(REDACAO_CACHE_CAPACIDADE, obter_correcao_persistente, gravar_correcao_persistente)
+
+
+def chave_da_redacao(tema, enunciado, texto):
+    return chave_correcao(MODELO_GEMINI, VERSAO_PROMPT_CORRECAO, tema, enunciado, texto)
+
+
+def corrigir_redacao_com_cache(tema, enunciado, texto, chave=None):
+    '''corrigir_redacao com cache: retorna (correcao, origem), origem 'cache' se já estava guardada.'''
+    (correcao, origem), do_cache = cache_correcoes.obter_ou_calcular(
+        chave or chave_da_redacao(tema, enunciado, texto), lambda: corrigir_redacao(tema, enunciado, texto),
+        cacheavel=lambda valor: valor[1] == 'gemini')
+    return correcao, 'cache' if do_cache else origem
+
+
+pool_redacao = PoolTrabalhos(executar_trabalho_redacao, REDACAO_TRABALHADORES, REDACAO_FILA_MAXIMA, nome='redacao')
+
+
+def encerrar_pool_redacao():
+    '''Espera as correções em andamento; as que nem começaram ficam como erro (o aluno reenvia).'''
+    nao_iniciados = pool_redacao.encerrar()
+    if not nao_iniciados:
+        return
+    with app.app_context():
+        db.session.execute(comando_interromper_trabalhos(nao_iniciados))
+        db.session.commit()
+
+atexit.register(encerrar_pool_redacao)
+
+
+def dados_trabalho(trabalho):
+    dados = {
+        "success": True,
+        "job_id": trabalho.id,
+        "estado": trabalho.estado,
+        "status_url": f"/api/redacao/jobs/{trabalho.id}",
+    }
+    if trabalho.estado == TRABALHO_CONCLUIDO:
+        dados["correcao"] = json.loads(trabalho.correcao)
+        dados["origem"] = trabalho.origem
+        dados["degradado"] = trabalho.degradado
+    elif trabalho.estado == TRABALHO_ERRO:
+        dados["error"] = trabalho.erro
+    return dados
+
+
+@app.route('/api/redacao/corrigir-gemini-real', methods=['POST'])
+def corrigir_redacao_gemini_real():
+    # (ALTERADO) Só cria o trabalho e responde (202); a correção roda no pool
+    try:
+        data = request.json
+        tema = data.get('tema')
+        texto = data.get('texto')
+        enunciado = data.get('enunciado')
         
-        return jsonify({"success": True, "correcao": correcao})
+        if not tema or not texto:
+            return jsonify({"success": False, "error": "Tema e texto são obrigatórios"}), 400
+        
+        preparar_trabalhos_redacao()
+        agora = time.time()
+        chave = chave_da_redacao(tema, enunciado, texto)
+        # (NOVO) Reenvio de uma redação igual a outra ainda em correção (em qualquer worker):
+        # devolve o mesmo trabalho em vez de criar outro
+        pendente = db.session.scalars(consulta_trabalho_pendente(chave, agora)).first()
+        if pendente is not None:
+            return jsonify(dados_trabalho(pendente)), 202
+        trabalho = TrabalhosRedacao(id=secrets.token_hex(16), estado=TRABALHO_NA_FILA, tema=tema, chave=chave,
+                                    enunciado=enunciado, texto=texto, criado_em=agora, atualizado_em=agora)
+        # (NOVO) Redação já corrigida: o trabalho nasce concluído, sem passar pela fila
+        em_cache = cache_correcoes.obter(chave)
+        if em_cache is not None:
+            concluir_trabalho(trabalho, em_cache[0], 'cache')
+        db.session.add(trabalho)
+        db.session.commit()
+        if em_cache is not None:
+            return jsonify(dados_trabalho(trabalho))
+        try:
+            pool_redacao.enviar(trabalho.id)
+            return jsonify(dados_trabalho(trabalho)), 202
+        except FilaSaturada as e:
+            # Load shedding: a correção simulada sai na hora
+            print(f"AVISO: Fila de correções saturada ({e}); usando mock.")
+            concluir_trabalho(trabalho, gerar_correcao_simulada(), 'simulada', degradado=True)
+            db.session.commit()
+            return jsonify(dados_trabalho(trabalho))
         
     except Exception as e:
+        db.session.rollback()
         print(f"ERRO 500 em /corrigir-gemini-real: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/redacao/jobs/<trabalho_id>')
+def get_trabalho_redacao(trabalho_id):
+    # (NOVO) Estado e, quando pronto, resultado de uma correção
+    if not chave_valida(trabalho_id):
+        return jsonify({"success": False, "error": "Trabalho não encontrado."}), 404
+    preparar_trabalhos_redacao()
+    trabalho = db.session.get(TrabalhosRedacao, trabalho_id)
+    if trabalho is None:
+        return jsonify({"success": False, "error": "Trabalho não encontrado."}), 404
+    if trabalho.estado in (TRABALHO_NA_FILA, TRABALHO_PROCESSANDO) and \
+            time.time() - trabalho.atualizado_em > REDACAO_TEMPO_MAXIMO:
+        # O worker que tinha o trabalho morreu (ou travou): não adianta o aluno esperar
+        trabalho.estado = TRABALHO_ERRO
+        trabalho.erro = "A correção não terminou a tempo. Envie de novo."
+        trabalho.atualizado_em = time.time()
+        db.session.commit()
+    return jsonify(dados_trabalho(trabalho))
+
+
+# ---
+# --- (NOVO) Correção em fluxo: Server-Sent Events (ver fluxo_correcao.py) ---
+# ---
+# Variante da correção para a tela de redação: a resposta é text/event-stream e cada
+# competência sai num evento 'competencia' assim que o objeto dela fica completo no JSON
+# que o Gemini está gerando; o evento 'correcao' traz o resultado inteiro no fim ('erro'
+# se a chamada falhar no meio). O aluno vê a primeira competência em vez de esperar a
+# geração toda.
+# A conexão fica aberta durante a geração e ocupa uma thread do worker (gthread, ver
+# gunicorn.conf.py): no máximo REDACAO_FLUXOS_MAXIMO por worker, abaixo de GUNICORN_THREADS.
+# Acima disso (ou em qualquer erro) o front-end usa a correção por trabalho, acima.
+REDACAO_FLUXOS_MAXIMO = int(os.environ.get('REDACAO_FLUXOS_MAXIMO', '2'))
+vagas_fluxo_redacao = threading.BoundedSemaphore(REDACAO_FLUXOS_MAXIMO)
+
+
+def eventos_correcao(correcao, origem, degradado=False):
+    for indice, competencia in enumerate(correcao.get('competencias') or []):
+        yield evento_sse('competencia', dict(competencia, indice=indice))
+    yield evento_sse('correcao', {"correcao": correcao, "origem": origem, "degradado": degradado})
+
+
+def eventos_do_gemini(cliente, leitor, chave, tema, enunciado, texto):
+    '''Eventos da correção que o Gemini gera agora (o líder da chave no singleflight). Retorna
+    o resultado no formato de cache_correcoes.obter_ou_calcular: ((correcao, origem), veio_do_cache).'''
+    em_cache = cache_correcoes.obter(chave) # Outro líder pode ter guardado enquanto este entrava
+    if em_cache is not None:
+        yield from eventos_correcao(em_cache[0], 'cache')
+        return em_cache, True
+    for trecho in cliente.gerar_em_fluxo(montar_prompt_correcao(tema, enunciado, texto)):
+        novas = leitor.alimentar(trecho) # Um trecho pode fechar mais de uma competência
+        for i, competencia in enumerate(novas):
+            yield evento_sse('competencia', dict(competencia, indice=leitor.total - len(novas) + i))
+    correcao, origem = ler_json_correcao(leitor.texto)
+    if origem == 'gemini':
+        cache_correcoes.guardar(chave, (correcao, origem))
+    yield evento_sse('correcao', {"correcao": correcao, "origem": origem, "degradado": False})
+    return (correcao, origem), False
+
+
+def correcao_em_fluxo(tema, enunciado, texto, liberar_vaga):
+    '''Gerador dos eventos SSE de uma correção (usa o cache e o singleflight da correção por trabalho).'''
+    try:
+        chave = chave_da_redacao(tema, enunciado, texto)
+        em_cache = cache_correcoes.obter(chave)
+        if em_cache is not None:
+            yield from eventos_correcao(em_cache[0], 'cache')
+            return
+        cliente = obter_cliente(MODELO_GEMINI)
+        if cliente is None:
+            print("Chave Gemini não configurada. Usando mock.")
+            yield from eventos_correcao(gerar_correcao_simulada(), 'simulada')
+            return
+
+        singleflight = cache_correcoes.singleflight
+        chamada, lider = singleflight.entrar(chave)
+        while not lider:
+            # A mesma redação já está sendo corrigida (em fluxo ou por trabalho): espera e repete o resultado
+            try:
+                (correcao, origem), _ = singleflight.esperar(chamada)
+            except LiderDesistiu:
+                chamada, lider = singleflight.entrar(chave) # O outro fluxo fechou no meio: tenta ser o líder
+                continue
+            except GeminiIndisponivel as e:
+                print(f"AVISO: Gemini indisponível ({e}); usando mock.")
+                yield from eventos_correcao(gerar_correcao_simulada(), 'simulada', degradado=True)
+                return
+            yield from eventos_correcao(correcao, origem)
+            return
+
+        leitor = LeitorCompetencias()
+        try:
+            resultado = yield from eventos_do_gemini(cliente, leitor, chave, tema, enunciado, texto)
+        except Exception as e:
+            singleflight.concluir(chave, chamada, erro=e)
+            if not isinstance(e, GeminiIndisponivel) or leitor.total:
+                raise # Já saiu parte da correção do Gemini: o front-end recomeça pela correção por trabalho
+            print(f"AVISO: Gemini indisponível ({e}); usando mock.")
+            yield from eventos_correcao(gerar_correcao_simulada(), 'simulada', degradado=True)
+            return
+        except BaseException:
+            singleflight.concluir(chave, chamada, desistiu=True) # GeneratorExit: o aluno fechou a conexão
+            raise
+        singleflight.concluir(chave, chamada, resultado=resultado)
+    except Exception as e:
+        print(f"ERRO na correção em fluxo: {e}")
+        yield evento_sse('erro', {"error": str(e)})
+    finally:
+        liberar_vaga()
+
+
+def liberacao_unica(semaforo):
+    '''release() que só vale na primeira chamada (o fim do gerador e o fechamento da resposta chamam).'''
+    lock, liberado = threading.Lock(), []
+    def liberar():
+        with lock:
+            if not liberado:
+                liberado.append(True)
+                semaforo.release()
+    return liberar
+
+
+@app.route('/api/redacao/corrigir-gemini-real/stream', methods=['POST'])
+def corrigir_redacao_em_fluxo():
+    data = request.json or {}
+    tema = data.get('tema')
+    texto = data.get('texto')
+    enunciado = data.get('enunciado')
+    if not tema or not texto:
+        return jsonify({"success": False, "error": "Tema e texto são obrigatórios"}), 400
+    if not vagas_fluxo_redacao.acquire(blocking=False):
+        return jsonify({"success": False, "error": "Muitas correções em andamento; use a correção por trabalho."}), 503
+    liberar_vaga = liberacao_unica(vagas_fluxo_redacao)
+    try:
+        preparar_trabalhos_redacao() # Tabela do cache
+    except Exception:
+        liberar_vaga()
+        raise
+    resposta = Response(stream_with_context(correcao_em_fluxo(tema, enunciado, texto, liberar_vaga)),
+                        mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no' # Proxies (nginx) não devem segurar o fluxo
+    resposta.call_on_close(liberar_vaga) # Cliente que desconecta antes do gerador começar
+    return resposta
+
+
+# ============================================================================
+# 🛠️ (NOVO) ADMINISTRAÇÃO DO BANCO DE QUESTÕES
+# ============================================================================
+def admin_autorizado():
+    # Sem ADMIN_TOKEN configurado as rotas de administração ficam desligadas
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+@app.route('/api/admin/banco/recarregar', methods=['POST'])
+def recarregar_banco():
+    # Recarrega só ESTE worker; os outros percebem a mudança do arquivo sozinhos
+    if not admin_autorizado():
+        return jsonify({"success": False, "error": "Não autorizado."}), 403
+    trocou = gerenciador_banco.recarregar()
+    return jsonify({"success": True, "recarregado": trocou, "banco": gerenciador_banco.metricas()})
+
+@app.route('/api/admin/banco/metricas')
+def metricas_banco():
+    if not admin_autorizado():
+        return jsonify({"success": False, "error": "Não autorizado."}), 403
+    return jsonify({"success": True, "banco": gerenciador_banco.metricas()})
+
+@app.route('/api/admin/respostas/metricas')
+def metricas_respostas():
+    if not admin_autorizado():
+        return jsonify({"success": False, "error": "Não autorizado."}), 403
+    # (NOVO) Fila do gravador em lote deste worker
+    if gravador_respostas is None:
+        return jsonify({"success": True, "modo": GRAVACAO_RESPOSTAS})
+    return jsonify({"success": True, "modo": GRAVACAO_RESPOSTAS, "gravador": gravador_respostas.metricas()})
+
+@app.route('/api/admin/redacao/metricas')
+def metricas_redacao():
+    if not admin_autorizado():
+        return jsonify({"success": False, "error": "Não autorizado."}), 403
+    # (NOVO) Pool de correções deste worker
+    cliente = obter_cliente(MODELO_GEMINI)
+    return jsonify({"success": True, "pool": pool_redacao.metricas(), "cache": cache_correcoes.metricas(),
+                    "gemini": cliente.metricas() if cliente else None})
+
+@app.route('/api/admin/banco/validacao')
+def validacao_banco():
+    # (NOVO) Tabela de erros da validação do banco ativo (?limite=N linhas, padrão 200)
+    if not admin_autorizado():
+        return jsonify({"success": False, "error": "Não autorizado."}), 403
+    banco = gerenciador_banco.atual()
+    if banco.validacao is None:
+        return jsonify({"success": False, "error": "No modo SQL a validação roda no 'flask load-bank'."}), 404
+    limite = request.args.get('limite', 200, type=int)
+    return jsonify({"success": True, "versao": banco.versao, "validacao": banco.validacao.para_dict(limite)})
+
+
 # ---
 # --- ROTAS ANTIGAS (MANTIDAS APENAS SE NECESSÁRIO, MAS SUBSTITUÍDAS) ---
 # ---
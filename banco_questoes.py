@@ -0,0 +1,849 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Banco de Questões: leitura do CSV e snapshot binário pré-compilado ---
+# ---
+# O 'questoes.csv' é validado UMA vez pelo comando 'flask compile-bank', que grava
+# um snapshot binário colunar (com versão e checksum). O app.py carrega o snapshot
+# na inicialização e só volta a ler o CSV quando o snapshot falta ou está velho.
+#
+# O snapshot é aberto com mmap e servido direto do arquivo (códigos, offsets e os
+# payloads JSON já prontos). As páginas ficam no page cache do sistema e são
+# compartilhadas por todos os workers do gunicorn: N workers custam ~1 cópia.
+#
+# Layout do arquivo (.bank):
+#   [8 bytes]  MAGIA
+#   [4 bytes]  versão do formato (uint32, little-endian)
+#   [4 bytes]  tamanho do cabeçalho JSON (uint32)
+#   [N bytes]  cabeçalho JSON (utf-8), completado com espaços até alinhar em 8 bytes
+#   [resto]    seções de dados, cada uma alinhada em 8 bytes:
+#              - colunas categóricas: array de códigos (int32) + categorias no cabeçalho
+#              - colunas de texto: array de offsets (int64, n+1) + blob utf-8 em que
+#                cada valor termina com '\0' (a coluna inteira decodifica com um split)
+#              - payloads: a questão inteira já codificada em JSON, no mesmo layout
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict, deque
+from itertools import accumulate
+
+import numpy as np
+import pandas as pd
+
+from busca_questoes import IndiceBusca
+from validacao_questoes import DIFICULDADES_SINONIMOS, validar_snapshot
+
+ARQUIVO_CSV = 'questoes.csv'
+ARQUIVO_SNAPSHOT = os.path.join('data', 'questoes.bank')
+
+# O cabeçalho de 14 colunas que o app.py espera
+HEADER_ESPERADO = [
+    'disciplina', 'materia', 'banca', 'dificuldade', 'enunciado',
+    'alternativa_a', 'alternativa_b', 'alternativa_c', 'alternativa_d', 'alternativa_e',
+    'resposta_correta', 'justificativa', 'dica', 'formula'
+]
+
+# Colunas com poucos valores distintos: gravadas como códigos + vocabulário
+COLUNAS_CATEGORICAS = ['disciplina', 'materia', 'banca', 'dificuldade', 'resposta_correta']
+
+MAGIA = b'CMAIBANK'
+VERSAO_FORMATO = 2
+_PREAMBULO = struct.Struct('<8sII')
+_ALINHAMENTO = 8
+
+
+class SnapshotInvalido(Exception):
+    '''O snapshot existe mas não pode ser usado (formato, checksum ou origem diferentes).'''
+
+
+def _alinhar(n):
+    return (n + _ALINHAMENTO - 1) // _ALINHAMENTO * _ALINHAMENTO
+
+
+def sha256_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def normalizar_questoes(df):
+    '''Garante as 14 colunas na ordem esperada, todas como texto e sem NaN.'''
+    faltando = [col for col in HEADER_ESPERADO if col not in df.columns]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no CSV: {faltando}")
+    df = df.reindex(columns=HEADER_ESPERADO).fillna('').astype(str)
+    df = df.reset_index(drop=True)
+    df.index.name = 'id' # Usar o índice do DataFrame como 'id' universal
+    return df
+
+
+def ler_csv_questoes(caminho=ARQUIVO_CSV):
+    '''Lê o CSV de questões (utf-8, com fallback para latin-1). Levanta exceção se ambos falharem.'''
+    try:
+        df = pd.read_csv(caminho, sep=';', encoding='utf-8-sig', dtype=str)
+        print(f"INFO: '{caminho}' carregado com 'utf-8'. Total: {len(df)} questões.")
+    except Exception as e:
+        print(f"ERRO 1: Falha ao ler '{caminho}' com 'utf-8'. Erro: {e}")
+        print("TENTANDO FALLBACK com 'latin-1'...")
+        df = pd.read_csv(caminho, sep=';', encoding='latin-1', dtype=str)
+        print(f"INFO: '{caminho}' carregado com 'latin-1'. Total: {len(df)} questões.")
+    return normalizar_questoes(df)
+
+
+# ---
+# --- Formato da questão enviada ao front-end ---
+# ---
+def montar_questao(questao_id, row):
+    '''O dicionário de questão que o front-end recebe (mesmo formato de sempre).'''
+    return {
+        "id": int(questao_id),
+        "disciplina": row.get('disciplina'),
+        "materia": row.get('materia'),
+        "dificuldade": row.get('dificuldade'),
+        "enunciado": row.get('enunciado'),
+        "alternativas": {
+            'a': row.get('alternativa_a'),
+            'b': row.get('alternativa_b'),
+            'c': row.get('alternativa_c'),
+            'd': row.get('alternativa_d'),
+            'e': row.get('alternativa_e')
+        },
+        "resposta_correta": row.get('resposta_correta'),
+        "justificativa": row.get('justificativa'),
+        "dica": row.get('dica'),
+        "formula": row.get('formula')
+    }
+
+
+def codificar_json(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+CAMPOS_GABARITO = ('resposta_correta', 'justificativa')
+
+
+def retirar_gabarito(payload):
+    '''(NOVO) O payload JSON (bytes) de uma questão sem a resposta e a justificativa.'''
+    questao = json.loads(payload)
+    for campo in CAMPOS_GABARITO:
+        questao.pop(campo, None)
+    return codificar_json(questao)
+
+
+# ---
+# --- Escrita do snapshot ---
+# ---
+def _secao_categorica(valores):
+    categorias, codigos = np.unique(np.asarray(valores, dtype=object), return_inverse=True)
+    return [str(c) for c in categorias], codigos.astype('<i4')
+
+
+def _secao_texto(valores):
+    # O valor i ocupa blob[offsets[i]:offsets[i + 1] - 1]; o byte seguinte é o '\0'
+    codificados = [v.replace('\0', '').encode('utf-8') + b'\0' for v in valores]
+    offsets = np.zeros(len(codificados) + 1, dtype='<i8')
+    np.cumsum([len(b) for b in codificados], out=offsets[1:])
+    return offsets, b''.join(codificados)
+
+
+def origem_csv(caminho_csv):
+    return {
+        "arquivo": os.path.basename(caminho_csv),
+        "sha256": sha256_arquivo(caminho_csv),
+        "tamanho": os.path.getsize(caminho_csv),
+        "mtime_ns": os.stat(caminho_csv).st_mtime_ns,
+    }
+
+
+def montar_snapshot(df, origem=None):
+    '''Serializa um DataFrame já normalizado no formato do snapshot. Retorna os bytes do arquivo.'''
+    dados = bytearray()
+
+    def anexar(buf):
+        inicio = len(dados)
+        dados.extend(buf)
+        dados.extend(b'\0' * (_alinhar(len(dados)) - len(dados)))
+        return inicio
+
+    def secao_texto(valores):
+        offsets, blob = _secao_texto(valores)
+        return {"tipo": "texto", "offsets": anexar(offsets.tobytes()), "dados": anexar(blob), "tamanho": len(blob)}
+
+    secoes = {}
+    for coluna in HEADER_ESPERADO:
+        valores = df[coluna].tolist()
+        if coluna in COLUNAS_CATEGORICAS:
+            categorias, codigos = _secao_categorica(valores)
+            secoes[coluna] = {"tipo": "categorica", "categorias": categorias, "codigos": anexar(codigos.tobytes())}
+        else:
+            secoes[coluna] = secao_texto(valores)
+
+    # Payloads JSON prontos: o app só copia bytes, não monta nem codifica nada
+    payloads = [
+        codificar_json(montar_questao(i, linha)).decode('utf-8')
+        for i, linha in enumerate(df.to_dict('records'))
+    ]
+
+    cabecalho = {
+        "versao_formato": VERSAO_FORMATO,
+        "origem": origem,
+        "n_questoes": len(df),
+        "colunas": HEADER_ESPERADO,
+        "secoes": secoes,
+        "payloads": secao_texto(payloads),
+        "crc32": zlib.crc32(dados),
+    }
+    cabecalho_bytes = json.dumps(cabecalho, ensure_ascii=False).encode('utf-8')
+    inicio_dados = _alinhar(_PREAMBULO.size + len(cabecalho_bytes))
+    cabecalho_bytes += b' ' * (inicio_dados - _PREAMBULO.size - len(cabecalho_bytes))
+    return _PREAMBULO.pack(MAGIA, VERSAO_FORMATO, len(cabecalho_bytes)) + cabecalho_bytes + bytes(dados)
+
+
+def gravar_snapshot(conteudo, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    # Grava num temporário e troca atomicamente (workers podem estar lendo o antigo)
+    pasta = os.path.dirname(caminho_snapshot)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    temporario = f"{caminho_snapshot}.{os.getpid()}.tmp"
+    with open(temporario, 'wb') as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho_snapshot)
+
+
+def compilar_snapshot(caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    '''Valida o CSV e grava o snapshot binário. Retorna o cabeçalho gravado.'''
+    df = ler_csv_questoes(caminho_csv)
+    gravar_snapshot(montar_snapshot(df, origem_csv(caminho_csv)), caminho_snapshot)
+    return abrir_snapshot(caminho_snapshot).cabecalho
+
+
+# ---
+# --- Leitura do snapshot ---
+# ---
+class SnapshotQuestoes:
+    '''Visão somente-leitura sobre um snapshot (mmap do arquivo ou bytes em memória).
+
+    Nada é decodificado na abertura: os códigos e offsets são arrays numpy apontando
+    para o próprio buffer, e cada valor só vira str quando é pedido.'''
+
+    def __init__(self, buffer):
+        if len(buffer) < _PREAMBULO.size:
+            raise SnapshotInvalido("arquivo truncado")
+        magia, versao, tamanho_cabecalho = _PREAMBULO.unpack_from(buffer, 0)
+        if magia != MAGIA:
+            raise SnapshotInvalido("assinatura desconhecida")
+        if versao != VERSAO_FORMATO:
+            raise SnapshotInvalido(f"versão de formato {versao}, esperada {VERSAO_FORMATO}")
+
+        inicio_dados = _PREAMBULO.size + tamanho_cabecalho
+        self.cabecalho = json.loads(bytes(buffer[_PREAMBULO.size:inicio_dados]).decode('utf-8'))
+        self._dados = memoryview(buffer)[inicio_dados:]
+        if zlib.crc32(self._dados) != self.cabecalho['crc32']:
+            raise SnapshotInvalido("checksum dos dados não confere")
+
+        self.n = self.cabecalho['n_questoes']
+        self.origem = self.cabecalho['origem']
+        self._codigos = {}
+        self._offsets = {}
+        for coluna, secao in self.cabecalho['secoes'].items():
+            if secao['tipo'] == 'categorica':
+                self._codigos[coluna] = np.frombuffer(self._dados, dtype='<i4', count=self.n, offset=secao['codigos'])
+            else:
+                self._offsets[coluna] = self._abrir_offsets(secao)
+        self._offsets_payload = self._abrir_offsets(self.cabecalho['payloads'])
+
+    def _abrir_offsets(self, secao):
+        return np.frombuffer(self._dados, dtype='<i8', count=self.n + 1, offset=secao['offsets'])
+
+    def __len__(self):
+        return self.n
+
+    def categorias(self, coluna):
+        return self.cabecalho['secoes'][coluna]['categorias']
+
+    def codigos(self, coluna):
+        return self._codigos[coluna]
+
+    def _texto(self, secao, offsets, i):
+        inicio = secao['dados'] + int(offsets[i])
+        return bytes(self._dados[inicio:secao['dados'] + int(offsets[i + 1]) - 1])
+
+    def valor(self, coluna, i):
+        if coluna in self._codigos:
+            return self.categorias(coluna)[self._codigos[coluna][i]]
+        return self._texto(self.cabecalho['secoes'][coluna], self._offsets[coluna], i).decode('utf-8')
+
+    def linha(self, i):
+        '''A questão i como dicionário {coluna: valor}. Levanta KeyError se não existe.'''
+        if not 0 <= i < self.n:
+            raise KeyError(i)
+        return {coluna: self.valor(coluna, i) for coluna in self.cabecalho['colunas']}
+
+    def payload(self, i):
+        return self._texto(self.cabecalho['payloads'], self._offsets_payload, i)
+
+    def tamanhos(self, coluna):
+        '''Tamanho em bytes utf-8 de cada valor da coluna (array), sem decodificar nada.'''
+        if coluna in self._codigos:
+            por_categoria = np.array([len(c.encode('utf-8')) for c in self.categorias(coluna)], dtype=np.int64)
+            return por_categoria[self._codigos[coluna]]
+        return np.diff(self._offsets[coluna]) - 1 # Cada valor termina com '\0'
+
+    def coluna(self, coluna):
+        '''A coluna inteira decodificada (lista de str). Para uso pontual, não no caminho quente.'''
+        return self.fatia(coluna, 0, self.n)
+
+    def fatia(self, coluna, inicio, fim):
+        '''(NOVO) Os valores das questões inicio..fim-1 (lista de str), com um único decode.'''
+        if coluna in self._codigos:
+            return np.asarray(self.categorias(coluna), dtype=object)[self._codigos[coluna][inicio:fim]].tolist()
+        if fim <= inicio:
+            return []
+        secao = self.cabecalho['secoes'][coluna]
+        offsets = self._offsets[coluna]
+        blob = bytes(self._dados[secao['dados'] + int(offsets[inicio]):secao['dados'] + int(offsets[fim]) - 1])
+        return blob.decode('utf-8').split('\0')
+
+    def para_dataframe(self):
+        df = pd.DataFrame({c: self.coluna(c) for c in self.cabecalho['colunas']}, columns=self.cabecalho['colunas'])
+        df.index.name = 'id'
+        return df
+
+
+def abrir_snapshot(caminho_snapshot=ARQUIVO_SNAPSHOT):
+    '''Mapeia o snapshot em memória (mmap somente-leitura) e valida formato e checksum.'''
+    with open(caminho_snapshot, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return SnapshotQuestoes(mm)
+
+
+def snapshot_atualizado(cabecalho, caminho_csv=ARQUIVO_CSV):
+    '''True se o snapshot foi gerado a partir do CSV atual (ou se o CSV não existe).'''
+    if not os.path.exists(caminho_csv):
+        return True
+    origem = cabecalho['origem']
+    if not origem:
+        return False
+    info = os.stat(caminho_csv)
+    if info.st_size != origem['tamanho']:
+        return False
+    if info.st_mtime_ns == origem['mtime_ns']:
+        return True # Caminho rápido: mesmo tamanho e mesma data, não precisa do hash
+    return sha256_arquivo(caminho_csv) == origem['sha256']
+
+
+def _ler_banco(caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    '''Abre o snapshot se válido e atualizado; senão lê o CSV e gera o snapshot.
+
+    Retorna (SnapshotQuestoes, fonte). Quando o CSV é lido, o snapshot é regravado
+    para que os outros workers (e a próxima inicialização) o reaproveitem; se a
+    pasta não for gravável, o snapshot fica só na memória deste processo.
+    Levanta exceção se nem o snapshot nem o CSV puderem ser lidos.'''
+    if os.path.exists(caminho_snapshot):
+        try:
+            snapshot = abrir_snapshot(caminho_snapshot)
+            if snapshot_atualizado(snapshot.cabecalho, caminho_csv):
+                print(f"INFO: Snapshot '{caminho_snapshot}' carregado. Total: {len(snapshot)} questões.")
+                return snapshot, 'snapshot'
+            print(f"AVISO: Snapshot '{caminho_snapshot}' desatualizado em relação a '{caminho_csv}'. Gerando de novo...")
+        except (SnapshotInvalido, OSError, ValueError, KeyError) as e:
+            print(f"AVISO: Snapshot '{caminho_snapshot}' ignorado: {e}")
+
+    df = ler_csv_questoes(caminho_csv)
+    conteudo = montar_snapshot(df, origem_csv(caminho_csv))
+    try:
+        gravar_snapshot(conteudo, caminho_snapshot)
+        return abrir_snapshot(caminho_snapshot), 'csv'
+    except OSError as e:
+        print(f"AVISO: Não foi possível gravar '{caminho_snapshot}' ({e}). O banco fica só na memória deste processo.")
+        return SnapshotQuestoes(conteudo), 'csv'
+
+
+def carregar_questoes(caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    '''Carrega o banco de questões como DataFrame: snapshot se válido e atualizado, senão o CSV.
+
+    Nunca levanta exceção: em último caso retorna um DataFrame vazio para não
+    derrubar o app.'''
+    try:
+        return _ler_banco(caminho_csv, caminho_snapshot)[0].para_dataframe()
+    except Exception as e:
+        print(f"ERRO CRÍTICO: Falha ao ler '{caminho_csv}' com ambos os métodos. Erro: {e}")
+        return pd.DataFrame(columns=HEADER_ESPERADO) # Inicia vazio para não quebrar o resto
+
+
+# ---
+# --- (NOVO) Índices invertidos para os filtros do simulado ---
+# ---
+_VAZIO = np.empty(0, dtype=np.int64)
+
+
+class IndiceQuestoes:
+    '''Mapeia cada valor categórico para um array ordenado de ids de questões.
+
+    Filtrar vira união (dentro de um campo) e interseção (entre campos) dessas
+    listas, sem montar máscaras booleanas sobre o banco inteiro.'''
+
+    CAMPOS = ('disciplina', 'banca', 'dificuldade', 'materia')
+    CAMPOS_ESTRATO = ('disciplina', 'banca', 'dificuldade', 'materia')
+
+    def __init__(self, snapshot, validas=None):
+        # (NOVO) 'validas' (máscara bool) deixa de fora as questões reprovadas na validação
+        self.total = len(snapshot)
+        self.todos = np.arange(self.total, dtype=np.int64) if validas is None else np.flatnonzero(validas)
+        self.listas = {}
+        for campo in self.CAMPOS:
+            # Ordenar os códigos (estável) agrupa os ids de cada valor já em ordem crescente
+            codigos = snapshot.codigos(campo)[self.todos]
+            categorias = snapshot.categorias(campo)
+            ordem = self.todos[np.argsort(codigos, kind='stable')]
+            contagens = np.bincount(codigos, minlength=len(categorias))
+            grupos = np.split(ordem, np.cumsum(contagens)[:-1]) if len(categorias) else []
+            self.listas[campo] = {valor: ids for valor, ids in zip(categorias, grupos) if len(ids)}
+        self.estratos = self._montar_estratos(snapshot)
+
+    def _montar_estratos(self, snapshot):
+        '''(NOVO) {disciplina: {banca: {(dificuldade, materia): ids}}}, para o sorteio
+        estratificado. A dificuldade já vem canônica ('Média' conta como 'Médio').'''
+        codigos = [snapshot.codigos(campo)[self.todos] for campo in self.CAMPOS_ESTRATO]
+        ordem = np.lexsort(codigos[::-1]) # Estável: dentro de cada estrato os ids seguem crescentes
+        codigos = [c[ordem] for c in codigos]
+        ids = self.todos[ordem]
+        comeca = np.zeros(len(ids), dtype=bool) # Onde começa cada estrato
+        comeca[:1] = True
+        for c in codigos:
+            comeca[1:] |= c[1:] != c[:-1]
+        inicios = np.flatnonzero(comeca)
+        fins = np.append(inicios[1:], len(ids))
+
+        categorias = [snapshot.categorias(campo) for campo in self.CAMPOS_ESTRATO]
+        estratos = {}
+        for inicio, fim in zip(inicios.tolist(), fins.tolist()):
+            disciplina, banca, dificuldade, materia = (cats[c[inicio]] for cats, c in zip(categorias, codigos))
+            celulas = estratos.setdefault(disciplina, {}).setdefault(banca, {})
+            chave = (DIFICULDADES_SINONIMOS.get(dificuldade, dificuldade), materia)
+            celulas[chave] = np.sort(np.concatenate((celulas[chave], ids[inicio:fim]))) if chave in celulas else ids[inicio:fim]
+        return estratos
+
+    def estratos_filtrados(self, disciplina=None, banca=None):
+        '''{(dificuldade, materia): [arrays de ids]} das questões que atendem aos filtros.
+        O custo depende do número de estratos, não do número de questões.'''
+        disciplinas = [disciplina] if isinstance(disciplina, str) else disciplina
+        bancas = [banca] if isinstance(banca, str) else banca
+        resultado = {}
+        for d in (self.estratos if disciplinas is None else dict.fromkeys(disciplinas)):
+            por_banca = self.estratos.get(d, {})
+            for b in (por_banca if bancas is None else dict.fromkeys(bancas)):
+                for chave, ids in por_banca.get(b, {}).items():
+                    resultado.setdefault(chave, []).append(ids)
+        return resultado
+
+    def ids(self, campo, valor):
+        return self.listas[campo].get(valor, _VAZIO)
+
+    def uniao(self, campo, valores):
+        # As listas de um mesmo campo são disjuntas: concatenar e ordenar basta
+        listas = [self.ids(campo, v) for v in dict.fromkeys(valores)]
+        if not listas:
+            return _VAZIO
+        if len(listas) == 1:
+            return listas[0]
+        return np.sort(np.concatenate(listas))
+
+    def filtrar(self, **filtros):
+        '''Ids que atendem a todos os filtros. Cada filtro aceita um valor ou uma lista;
+        filtros None são ignorados. Sem filtros, retorna todos os ids.'''
+        listas = []
+        for campo, valores in filtros.items():
+            if valores is None:
+                continue
+            if isinstance(valores, str):
+                valores = [valores]
+            listas.append(self.uniao(campo, valores))
+
+        # Começa pela lista mais curta para que as interseções fiquem pequenas
+        candidatos = None
+        for lista in sorted(listas, key=len):
+            if candidatos is None:
+                candidatos = lista
+            else:
+                candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+            if len(candidatos) == 0:
+                break
+        if candidatos is None:
+            return self.todos
+        return candidatos
+
+    def contagem(self, campo):
+        '''{valor: total de questões}, do mais frequente para o menos (como value_counts).'''
+        contagem = {valor: len(ids) for valor, ids in self.listas[campo].items()}
+        return dict(sorted(contagem.items(), key=lambda item: -item[1]))
+
+
+def sortear_ids(candidatos, quantidade, rng=random):
+    '''Sorteia até 'quantidade' ids distintos em O(quantidade), sem copiar os candidatos.'''
+    quantidade = min(quantidade, len(candidatos))
+    posicoes = rng.sample(range(len(candidatos)), quantidade)
+    return [int(candidatos[p]) for p in posicoes]
+
+
+# ---
+# --- (NOVO) Sorteio estratificado por dificuldade e matéria ---
+# ---
+# O sorteio simples devolve a mistura que o acaso der (um simulado de 10 questões
+# pode vir com 9 "Fácil" da mesma matéria). Aqui a quantidade pedida é primeiro
+# repartida entre as dificuldades (proporções alvo, ex.: a mistura de uma prova
+# real) e, dentro de cada dificuldade, entre as matérias (proporções alvo, ou por
+# igual para espalhar o simulado). Só então cada estrato sorteia seus ids, sem
+# reposição. Tudo custa O(estratos + quantidade): o tamanho do banco não entra.
+PROPORCOES_DIFICULDADE_PADRAO = {'Fácil': 0.3, 'Médio': 0.5, 'Difícil': 0.2}
+
+
+def repartir(quantidade, pesos, disponiveis, rng=random):
+    '''Divide 'quantidade' entre as chaves de 'disponiveis' ({chave: total}) na
+    proporção de 'pesos' ({chave: peso}), sem passar do disponível em cada chave.
+
+    Maiores restos, com empate desfeito ao acaso (senão as mesmas chaves levariam
+    sempre as sobras). O que não couber nas chaves com peso vai para as sem peso,
+    na proporção do que elas têm. Retorna {chave: quantidade} só com as não nulas.'''
+    alocado = dict.fromkeys(disponiveis, 0)
+    restante = min(quantidade, sum(disponiveis.values()))
+    for etapa in (pesos, disponiveis):
+        ativas = {c: float(etapa.get(c, 0)) for c in disponiveis if etapa.get(c, 0) > 0}
+        while restante > 0:
+            ativas = {c: p for c, p in ativas.items() if alocado[c] < disponiveis[c]}
+            if not ativas:
+                break
+            total_pesos = sum(ativas.values())
+            cotas = {c: restante * p / total_pesos for c, p in ativas.items()}
+            inteiras = {c: min(int(q), disponiveis[c] - alocado[c]) for c, q in cotas.items()}
+            sobra = restante - sum(inteiras.values())
+            for c in sorted(cotas, key=lambda c: (-(cotas[c] - int(cotas[c])), rng.random())):
+                if sobra == 0:
+                    break
+                if inteiras[c] < disponiveis[c] - alocado[c]:
+                    inteiras[c] += 1
+                    sobra -= 1
+            for c, q in inteiras.items():
+                alocado[c] += q
+            distribuido = sum(inteiras.values())
+            restante -= distribuido
+            if distribuido == 0:
+                break
+    return {c: q for c, q in alocado.items() if q}
+
+
+def alocar_estratos(disponiveis, quantidade, proporcoes_dificuldade=None, proporcoes_materia=None, rng=random):
+    '''Quantas questões sortear de cada estrato.
+
+    disponiveis: {(dificuldade, materia): total}. Sem proporcoes_dificuldade, usa
+    PROPORCOES_DIFICULDADE_PADRAO; sem proporcoes_materia, as matérias recebem por
+    igual. A quantidade por dificuldade é exata (dentro do disponível); a por
+    matéria é repartida dentro de cada dificuldade.'''
+    por_dificuldade = defaultdict(int)
+    materias = defaultdict(dict)
+    for (dificuldade, materia), total in disponiveis.items():
+        por_dificuldade[dificuldade] += total
+        materias[dificuldade][materia] = total
+
+    pesos_dificuldade = {DIFICULDADES_SINONIMOS.get(d, d): p for d, p in
+                         (proporcoes_dificuldade or PROPORCOES_DIFICULDADE_PADRAO).items()}
+    alocacao = {}
+    for dificuldade, n in repartir(quantidade, pesos_dificuldade, por_dificuldade, rng).items():
+        pesos_materia = proporcoes_materia or dict.fromkeys(materias[dificuldade], 1)
+        for materia, m in repartir(n, pesos_materia, materias[dificuldade], rng).items():
+            alocacao[(dificuldade, materia)] = m
+    return alocacao
+
+
+def sortear_de_listas(listas, quantidade, rng=random):
+    '''Como sortear_ids, sobre a união de várias listas disjuntas, sem concatená-las.'''
+    limites = list(accumulate(len(ids) for ids in listas))
+    total = limites[-1] if limites else 0
+    sorteados = []
+    for p in rng.sample(range(total), min(quantidade, total)):
+        i = bisect_right(limites, p)
+        sorteados.append(int(listas[i][p - (limites[i - 1] if i else 0)]))
+    return sorteados
+
+
+def _sortear_estratos(estratos, quantidade, proporcoes_dificuldade, proporcoes_materia, rng):
+    disponiveis = {chave: sum(map(len, listas)) for chave, listas in estratos.items()}
+    alocacao = alocar_estratos(disponiveis, quantidade, proporcoes_dificuldade, proporcoes_materia, rng)
+    sorteados = []
+    for chave, n in alocacao.items():
+        sorteados.extend(sortear_de_listas(estratos[chave], n, rng))
+    return sorteados
+
+
+def separar_vistas(listas, vistas):
+    '''(NOVO) (não vistas, vistas): cada array de ids dividido por um teste de bit
+    (vistas = ConjuntoBits do usuário).'''
+    novas, repetidas = [], []
+    for ids in listas:
+        mascara = vistas.contem(ids)
+        novas.append(ids[~mascara])
+        repetidas.append(ids[mascara])
+    return novas, repetidas
+
+
+def sortear_estratificado(estratos, quantidade, proporcoes_dificuldade=None, proporcoes_materia=None, rng=random,
+                          vistas=None, excluir_vistas=False):
+    '''Sorteia até 'quantidade' ids de {(dificuldade, materia): [arrays de ids]},
+    respeitando as proporções (ver alocar_estratos). A ordem final é embaralhada.
+
+    (NOVO) Com 'vistas', as questões já respondidas só entram se faltarem não vistas
+    (ou nunca, com excluir_vistas=True).'''
+    if vistas is None:
+        sorteados = _sortear_estratos(estratos, quantidade, proporcoes_dificuldade, proporcoes_materia, rng)
+    else:
+        separados = {chave: separar_vistas(listas, vistas) for chave, listas in estratos.items()}
+        sorteados = _sortear_estratos({c: novas for c, (novas, _) in separados.items()}, quantidade,
+                                      proporcoes_dificuldade, proporcoes_materia, rng)
+        if not excluir_vistas and len(sorteados) < quantidade:
+            sorteados += _sortear_estratos({c: repetidas for c, (_, repetidas) in separados.items()},
+                                           quantidade - len(sorteados), proporcoes_dificuldade, proporcoes_materia, rng)
+    rng.shuffle(sorteados)
+    return sorteados
+
+
+def sortear_nao_vistas(candidatos, quantidade, vistas, excluir_vistas=False, rng=random):
+    '''(NOVO) Como sortear_ids, preferindo os candidatos fora de 'vistas'.'''
+    (novas,), (repetidas,) = separar_vistas([np.asarray(candidatos, dtype=np.int64)], vistas)
+    sorteados = sortear_ids(novas, quantidade, rng)
+    if not excluir_vistas and len(sorteados) < quantidade:
+        sorteados += sortear_ids(repetidas, quantidade - len(sorteados), rng)
+    rng.shuffle(sorteados)
+    return sorteados
+
+
+# ---
+# --- (NOVO) Cache de payloads JSON por questão ---
+# ---
+class CachePayloads:
+    '''Entrega, por id, a questão já codificada em JSON (bytes).
+
+    Os payloads são gerados junto com o snapshot e lidos direto do mmap, então o
+    cache é compartilhado entre os workers. Pertence a uma versão do banco:
+    recarregar o banco = criar outro cache.'''
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    def payload(self, questao_id):
+        '''Bytes JSON da questão. Levanta KeyError se o id não existe.'''
+        if not 0 <= questao_id < len(self.snapshot):
+            raise KeyError(questao_id)
+        return self.snapshot.payload(questao_id)
+
+    def lista(self, ids, ocultar_gabarito=()):
+        '''Array JSON com os payloads dos ids, na ordem dada. (NOVO) Os ids em
+        'ocultar_gabarito' vão sem resposta_correta/justificativa.'''
+        return b'[' + b','.join(retirar_gabarito(self.payload(i)) if i in ocultar_gabarito else self.payload(i)
+                                for i in ids) + b']'
+
+
+# ---
+# --- (NOVO) Versões do banco e recarga a quente ---
+# ---
+class BancoQuestoes:
+    '''Uma versão do banco: snapshot, índices e cache de payloads, sempre juntos.
+
+    Nunca é alterada depois de montada. Recarregar o CSV = montar outra e trocar.
+    A versão é derivada do sha256 do CSV, então é a mesma em todos os workers.'''
+
+    def __init__(self, snapshot, fonte='csv'):
+        self.snapshot = snapshot
+        self.validacao = validar_snapshot(snapshot)
+        self.indice = IndiceQuestoes(snapshot, validas=self.validacao.validas)
+        self.busca = IndiceBusca.do_snapshot(snapshot, self.indice.todos) # (NOVO) Busca textual (BM25)
+        self.payloads = CachePayloads(snapshot)
+        origem = snapshot.origem or {}
+        self.versao = origem['sha256'][:12] if origem.get('sha256') else 'vazio'
+        self.fonte = fonte
+        self.carregado_em = time.time()
+
+    def __len__(self):
+        return len(self.snapshot)
+
+    @property
+    def vazio(self):
+        return len(self.snapshot) == 0
+
+    def linha(self, questao_id):
+        '''A questão como dicionário {coluna: valor}. Levanta KeyError se o id não existe.'''
+        return self.snapshot.linha(questao_id)
+
+    def sortear(self, quantidade, vistas=None, excluir_vistas=False, rng=random, **filtros):
+        '''Até 'quantidade' ids distintos entre as questões que atendem aos filtros.
+        (NOVO) 'vistas' (ConjuntoBits): as já respondidas vão para o fim da fila.
+        (NOVO) Com um random.Random semeado em 'rng', o sorteio é reproduzível.'''
+        candidatos = self.indice.filtrar(**filtros)
+        if vistas is not None:
+            return sortear_nao_vistas(candidatos, quantidade, vistas, excluir_vistas, rng)
+        return sortear_ids(candidatos, quantidade, rng)
+
+    def sortear_estratificado(self, quantidade, proporcoes_dificuldade=None, proporcoes_materia=None,
+                              disciplina=None, banca=None, vistas=None, excluir_vistas=False, rng=random):
+        '''(NOVO) Como sortear, mas com a mistura de dificuldades e matérias controlada.'''
+        return sortear_estratificado(self.indice.estratos_filtrados(disciplina, banca), quantidade,
+                                     proporcoes_dificuldade, proporcoes_materia, rng=rng,
+                                     vistas=vistas, excluir_vistas=excluir_vistas)
+
+    @classmethod
+    def vazio_em_memoria(cls):
+        snapshot = SnapshotQuestoes(montar_snapshot(pd.DataFrame(columns=HEADER_ESPERADO)))
+        return cls(snapshot, fonte='vazio')
+
+
+def carregar_banco(caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    '''Uma versão do banco lida do snapshot (ou do CSV, se o snapshot estiver velho).'''
+    return BancoQuestoes(*_ler_banco(caminho_csv, caminho_snapshot))
+
+
+class GerenciadorBanco:
+    '''Guarda o banco ativo e troca por uma versão nova de forma atômica.
+
+    - verificar_mudancas(): barata, pode ser chamada a cada requisição; no máximo
+      uma vez por 'intervalo_verificacao' segundos compara mtime/tamanho do CSV e do
+      snapshot e, se mudaram, recarrega numa thread em segundo plano.
+    - recarregar(): monta a nova versão (arquivo + índices) fora do caminho das
+      requisições e só então troca a referência. Se falhar, a versão atual fica.
+    - versao(v): as últimas versões ficam em memória para que simulados em
+      andamento continuem resolvendo seus ids na versão em que foram sorteados.'''
+
+    VERSOES_MANTIDAS = 3
+
+    def __init__(self, caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT, intervalo_verificacao=30):
+        self.caminho_csv = caminho_csv
+        self.caminho_snapshot = caminho_snapshot
+        self.intervalo_verificacao = intervalo_verificacao
+        self._lock = threading.Lock()
+        self._versoes = OrderedDict()
+        self._proxima_verificacao = time.monotonic() + intervalo_verificacao
+
+        self.total_recargas = 0
+        self.total_falhas = 0
+        self.ultimo_erro = None
+        self.duracoes_ms = deque(maxlen=20)
+
+        assinatura = self._assinatura_arquivos()
+        inicio = time.perf_counter()
+        try:
+            banco = carregar_banco(caminho_csv, caminho_snapshot)
+        except Exception as e:
+            print(f"ERRO CRÍTICO: Falha ao ler '{caminho_csv}' com ambos os métodos. Erro: {e}")
+            self.total_falhas += 1
+            self.ultimo_erro = str(e)
+            banco = BancoQuestoes.vazio_em_memoria() # Inicia vazio para não quebrar o resto
+        self._assinatura = self._assinatura_apos_carga(assinatura)
+        self._ativar(banco, time.perf_counter() - inicio)
+
+    def atual(self):
+        return self._atual
+
+    def versao(self, versao):
+        '''A versão pedida, se ainda estiver em memória (senão None).'''
+        return self._versoes.get(versao)
+
+    def _assinatura_arquivos(self):
+        assinatura = []
+        for caminho in (self.caminho_csv, self.caminho_snapshot):
+            try:
+                info = os.stat(caminho)
+                assinatura.append((info.st_mtime_ns, info.st_size))
+            except OSError:
+                assinatura.append(None)
+        return tuple(assinatura)
+
+    def _assinatura_apos_carga(self, assinatura_antes):
+        # A carga pode ter regravado o snapshot; isso não é mudança a recarregar.
+        # Do CSV vale a assinatura de ANTES: se ele mudou durante a leitura, a
+        # próxima verificação enxerga a diferença e recarrega de novo.
+        return (assinatura_antes[0], self._assinatura_arquivos()[1])
+
+    def verificar_mudancas(self):
+        '''Dispara uma recarga em segundo plano se os arquivos mudaram. Retorna True se disparou.'''
+        if not self.intervalo_verificacao:
+            return False
+        agora = time.monotonic()
+        if agora < self._proxima_verificacao:
+            return False
+        self._proxima_verificacao = agora + self.intervalo_verificacao
+        if self._assinatura_arquivos() == self._assinatura:
+            return False
+        return self.recarregar_em_segundo_plano()
+
+    def recarregar_em_segundo_plano(self):
+        if self._lock.locked():
+            return False
+        threading.Thread(target=self.recarregar, name='recarga-banco', daemon=True).start()
+        return True
+
+    def recarregar(self):
+        '''Lê os arquivos de novo e troca o banco ativo. Retorna True se a versão mudou.'''
+        if not self._lock.acquire(blocking=False):
+            return False # Já tem uma recarga em andamento
+        try:
+            assinatura = self._assinatura_arquivos()
+            inicio = time.perf_counter()
+            try:
+                novo = carregar_banco(self.caminho_csv, self.caminho_snapshot)
+                if novo.vazio:
+                    raise ValueError("o banco novo está vazio")
+            except Exception as e:
+                self.total_falhas += 1
+                self.ultimo_erro = str(e)
+                self._assinatura = self._assinatura_apos_carga(assinatura) # Só tenta de novo quando o arquivo mudar outra vez
+                print(f"ERRO: Recarga do banco de questões falhou, mantendo a versão {self._atual.versao}. Erro: {e}")
+                return False
+
+            self._assinatura = self._assinatura_apos_carga(assinatura)
+            if novo.versao == self._atual.versao:
+                return False
+            self._ativar(novo, time.perf_counter() - inicio)
+            return True
+        finally:
+            self._lock.release()
+
+    def _ativar(self, banco, duracao):
+        self._versoes[banco.versao] = banco
+        self._versoes.move_to_end(banco.versao)
+        while len(self._versoes) > self.VERSOES_MANTIDAS:
+            self._versoes.popitem(last=False)
+        self._atual = banco # A troca é uma única atribuição: atômica para as requisições
+        self.total_recargas += 1
+        self.duracoes_ms.append(round(duracao * 1000, 1))
+        print(f"INFO: Banco de questões versão {banco.versao} ativo ({len(banco)} questões, fonte: {banco.fonte}, {duracao * 1000:.0f} ms).")
+        if len(banco.validacao.erros):
+            resumo = ', '.join(f"{regra}: {total}" for regra, total in banco.validacao.resumo().items())
+            print(f"AVISO: Validação do banco: {banco.validacao.total_invalidas} questões fora dos simulados ({resumo}).")
+
+    def metricas(self):
+        atual = self._atual
+        return {
+            "versao_ativa": atual.versao,
+            "fonte": atual.fonte,
+            "total_questoes": len(atual),
+            "questoes_invalidas": atual.validacao.total_invalidas,
+            "validacao": atual.validacao.resumo(),
+            "busca": atual.busca.metricas(),
+            "carregado_em": atual.carregado_em,
+            "versoes_em_memoria": list(self._versoes),
+            "recarregando": self._lock.locked(),
+            "total_recargas": self.total_recargas,
+            "total_falhas": self.total_falhas,
+            "ultimo_erro": self.ultimo_erro,
+            "ultima_duracao_ms": self.duracoes_ms[-1] if self.duracoes_ms else None,
+            "duracoes_recentes_ms": list(self.duracoes_ms),
+        }
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Benchmark: tempo de carga do banco de questões (CSV x snapshot binário) ---
+# ---
+# Uso:
+#   python benchmark_inicializacao.py                 (usa o questoes.csv atual)
+#   python benchmark_inicializacao.py --multiplicar 50 (simula um banco 50x maior)
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+import banco_questoes
+
+LEITURA_ANTIGA = dict(sep=';', encoding='utf-8', engine='python')
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a carga do CSV com a do snapshot binário.")
+    parser.add_argument('--csv', default=banco_questoes.ARQUIVO_CSV)
+    parser.add_argument('--multiplicar', type=int, default=1, help="replica as linhas N vezes")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho_csv = args.csv
+        if args.multiplicar > 1:
+            df = banco_questoes.ler_csv_questoes(args.csv)
+            caminho_csv = os.path.join(pasta, 'questoes.csv')
+            pd.concat([df] * args.multiplicar, ignore_index=True).to_csv(
+                caminho_csv, sep=';', index=False, encoding='utf-8-sig')
+        caminho_snapshot = os.path.join(pasta, 'questoes.bank')
+        cabecalho = banco_questoes.compilar_snapshot(caminho_csv, caminho_snapshot)
+
+        cenarios = [
+            ("CSV (engine python, como antes)", lambda: pd.read_csv(caminho_csv, **LEITURA_ANTIGA).fillna('')),
+            ("CSV (fallback atual)", lambda: banco_questoes.ler_csv_questoes(caminho_csv)),
+            ("Snapshot binário", lambda: banco_questoes.carregar_questoes(caminho_csv, caminho_snapshot)),
+            ("Snapshot mmap (como o app.py)", lambda: banco_questoes.BancoQuestoes(
+                banco_questoes.abrir_snapshot(caminho_snapshot), 'snapshot')),
+        ]
+
+        print("\n" + "=" * 64)
+        print(f"Questões: {cabecalho['n_questoes']} | CSV: {os.path.getsize(caminho_csv) / 1024:.0f} KB"
+              f" | Snapshot: {os.path.getsize(caminho_snapshot) / 1024:.0f} KB")
+        print("=" * 64)
+        resultados = {}
+        for nome, funcao in cenarios:
+            mediana, melhor = cronometrar(funcao, args.repeticoes)
+            resultados[nome] = mediana
+            print(f"{nome:<36} mediana {mediana:9.1f} ms | melhor {melhor:9.1f} ms")
+        base = resultados[cenarios[0][0]]
+        print(f"\nGanho do snapshot sobre o caminho antigo: {base / resultados['Snapshot binário']:.1f}x"
+              f" (mmap: {base / resultados['Snapshot mmap (como o app.py)']:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
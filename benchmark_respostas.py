@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Benchmark: latência do POST /api/simulado/responder (commit por resposta x lote) ---
+# ---
+# Roda o app com o cliente de teste do Flask sobre um SQLite temporário. Para imitar
+# o Postgres hospedado, cada comando SQL e cada commit esperam --latencia-ms (a ida
+# e volta pela rede). (ALTERADO) O estado do simulado fica no armazém padrão do app
+# ('sql'), como em produção: o POST mede a gravação da resposta E a da sessão. Com
+# --armazem memoria sobra só a gravação da resposta.
+#
+# Uso:
+#   python benchmark_respostas.py                       (5 ms por ida e volta, 4 clientes)
+#   python benchmark_respostas.py --latencia-ms 20 --clientes 8 --respostas 300
+#   python benchmark_respostas.py --armazem memoria
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def medir(app_module, clientes, respostas):
+    '''Cada cliente inicia um simulado e responde 'respostas' questões; retorna os tempos (ms).'''
+    tempos, erros = [], []
+    lock = threading.Lock()
+
+    def cliente():
+        c = app_module.app.test_client()
+        r = c.post('/api/simulado/iniciar', json={'areas': list(app_module.gerenciador_banco.atual().indice.listas['disciplina']),
+                                                  'quantidade': respostas, 'questoes_vistas': 'ignorar',
+                                                  'estratificar': False})
+        ids = [q['id'] for q in c.get(f'/api/simulado/questoes?inicio=0&quantidade={respostas}').get_json()['questoes']]
+        locais = []
+        for questao_id in ids:
+            inicio = time.perf_counter()
+            r = c.post('/api/simulado/responder', json={'questao_id': questao_id, 'alternativa': 'a'})
+            locais.append((time.perf_counter() - inicio) * 1000)
+            if not r.get_json().get('success'):
+                erros.append(r.get_json())
+        with lock:
+            tempos.extend(locais)
+
+    threads = [threading.Thread(target=cliente) for _ in range(clientes)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return tempos, erros
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a latência do responder com e sem gravação em lote.")
+    parser.add_argument('--latencia-ms', type=float, default=5.0, help="espera por comando SQL / commit")
+    parser.add_argument('--clientes', type=int, default=4)
+    parser.add_argument('--respostas', type=int, default=100, help="respostas por cliente (máx. JANELA_MAX_QUESTOES)")
+    parser.add_argument('--sem-fsync', action='store_true', help="não faz fsync do diário a cada resposta")
+    parser.add_argument('--armazem', choices=['sql', 'arquivo', 'memoria'], default='sql',
+                        help="onde fica o simulado em andamento (SESSAO_SIMULADO_ARMAZEM)")
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(pasta, 'benchmark.db')
+    os.environ['SESSAO_SIMULADO_ARMAZEM'] = args.armazem
+    os.environ['GRAVACAO_RESPOSTAS'] = 'lote'
+    os.environ['PASTA_DIARIO_RESPOSTAS'] = os.path.join(pasta, 'diario')
+    os.environ['DIARIO_RESPOSTAS_FSYNC'] = '0' if args.sem_fsync else '1'
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    from sqlalchemy import event
+
+    with app_module.app.app_context():
+        app_module.migracoes.aplicar(app_module.db.engine) # Inclui a tabela do armazém 'sql'
+        motor = app_module.db.engine
+    espera = args.latencia_ms / 1000
+    event.listen(motor, 'before_cursor_execute', lambda *_: time.sleep(espera))
+    event.listen(motor, 'commit', lambda *_: time.sleep(espera))
+
+    gravador = app_module.gravador_respostas
+    cenarios = [("Commit por resposta (antes)", None), ("Diário + lote (write-behind)", gravador)]
+
+    print("\n" + "=" * 72)
+    print(f"Latência simulada do banco: {args.latencia_ms} ms | clientes: {args.clientes}"
+          f" | respostas por cliente: {args.respostas} | fsync do diário: {not args.sem_fsync}"
+          f" | armazém do simulado: {args.armazem}")
+    print("=" * 72)
+    for nome, gravador_cenario in cenarios:
+        app_module.gravador_respostas = gravador_cenario
+        tempos, erros = medir(app_module, args.clientes, args.respostas)
+        if gravador_cenario is not None:
+            gravador_cenario.encerrar()
+        print(f"{nome:32s} p50 {statistics.median(tempos):7.2f} ms | p99 {percentil(tempos, 99):7.2f} ms"
+              f" | máx {max(tempos):7.2f} ms | {len(tempos)} POSTs" + (f" | {len(erros)} erros" if erros else ""))
+    with app_module.app.app_context():
+        total = app_module.RespostasUsuarios.query.count()
+    print(f"Respostas no banco ao final: {total} (esperado: {2 * args.clientes * args.respostas})")
+    if gravador is not None:
+        print(f"Lotes gravados: {gravador.total_lotes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Busca textual no banco de questões (índice invertido + BM25) ---
+# ---
+# "questões sobre Lei 14.133", "regência verbal": sem índice, responder isso seria
+# um str.contains sobre o enunciado de todas as questões a cada busca.
+#
+# O índice é montado junto com o banco (uma vez por versão) e guarda, para cada
+# termo, a lista de questões em que ele aparece (postings, arrays numpy) com o
+# peso BM25 já calculado. Buscar = juntar as listas dos termos da consulta e
+# somar os pesos; o custo depende do tamanho das listas, não do banco.
+#
+# Normalização (a mesma no índice e na consulta):
+#   - minúsculas e sem acentos ("Regência" -> "regencia", "ção" -> "cao");
+#   - números com ponto/vírgula viram um termo só ("14.133" -> "14133");
+#   - stopwords e letras soltas saem;
+#   - stemming leve: plural e vogal final ("licitações" e "licitação" -> "licitaca").
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# (campo, peso): o peso multiplica a frequência do termo (a matéria vale mais que o enunciado)
+CAMPOS_INDEXADOS = (
+    ('materia', 2), ('enunciado', 1),
+    ('alternativa_a', 1), ('alternativa_b', 1), ('alternativa_c', 1), ('alternativa_d', 1), ('alternativa_e', 1),
+    ('justificativa', 1),
+)
+BM25_K1 = 1.2
+BM25_B = 0.75
+LOTE_INDEXACAO = 5000 # Questões tokenizadas por vez (limita a memória da montagem)
+
+# Na montagem o texto de um lote inteiro passa por UM findall, sobre os bytes utf-8
+# (o re em bytes é bem mais rápido que em str com acentos); b'\x01' separa as questões.
+# Bytes >= 0x80 contam como letra: as palavras acentuadas saem inteiras e só as
+# DISTINTAS são decodificadas, limpas e dobradas.
+_SEPARADOR = b'\x01'
+_TOKEN = re.compile(rb'[\w\x01\x80-\xff]+(?:[.,]\d+)*')
+_PONTUACAO_NUMERO = str.maketrans('', '', '.,')
+_NAO_ALFANUMERICO = re.compile(r'[\W_]+')
+
+
+def _tabela_sem_acentos():
+    tabela = {}
+    for codigo in range(0x80, 0x250):
+        decomposto = unicodedata.normalize('NFKD', chr(codigo))
+        base = ''.join(c for c in decomposto if not unicodedata.combining(c))
+        if base != chr(codigo) and base.isascii():
+            tabela[codigo] = base.lower()
+    return tabela
+
+_SEM_ACENTOS = _tabela_sem_acentos()
+
+STOPWORDS = frozenset('''
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles depois do dos e
+ela elas ele eles em entre era eram essa essas esse esses esta estas este estes eu foi foram ha isso isto ja
+lhe lhes mais mas me mesmo meu minha muito na nao nas nem no nos num numa o os ou para pela pelas pelo pelos
+por qual quando que quem se sem ser seu seus so sua suas tambem te tem ter um uma umas uns voce
+questao questoes sobre
+'''.split())
+
+
+def dobrar(texto):
+    '''Minúsculas e sem acentos.'''
+    return texto.lower().translate(_SEM_ACENTOS)
+
+
+# Plurais, do sufixo mais longo para o mais curto: (sufixo, troca)
+_PLURAIS = (('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'),
+            ('res', 'r'), ('zes', 'z'), ('ses', 's'), ('ns', 'm'))
+
+
+def radical(palavra):
+    '''Stemming leve para o português: tira o plural e a vogal final.'''
+    if len(palavra) <= 3 or palavra[0].isdigit():
+        return palavra
+    for sufixo, troca in _PLURAIS:
+        if palavra.endswith(sufixo):
+            palavra = palavra[:-len(sufixo)] + troca
+            break
+    else:
+        if palavra.endswith('s') and not palavra.endswith(('ss', 'us', 'is')):
+            palavra = palavra[:-1]
+    if len(palavra) > 4 and palavra[-1] in 'aeo':
+        palavra = palavra[:-1]
+    return palavra
+
+
+def _termo(token):
+    '''O termo indexado de um token (bytes, como saiu do _TOKEN), ou None se ele não entra no índice.'''
+    texto = token.decode('utf-8', 'ignore')
+    if texto[:1].isdigit():
+        return texto.translate(_PONTUACAO_NUMERO)
+    # Aspas e travessões tipográficos também são bytes >= 0x80: saem aqui
+    palavra = _NAO_ALFANUMERICO.sub('', dobrar(texto))
+    if palavra in STOPWORDS or len(palavra) == 1 or not palavra.isalpha():
+        return None
+    return radical(palavra)
+
+
+def termos(texto):
+    '''Os termos de uma consulta, na ordem, sem repetição.'''
+    tokens = _TOKEN.findall(texto.lower().encode('utf-8').replace(_SEPARADOR, b' '))
+    return list(dict.fromkeys(t for t in map(_termo, tokens) if t))
+
+
+def _indice_do_termo(termo_do_token, vocabulario, token):
+    indice = termo_do_token.get(token)
+    if indice is None:
+        termo = _termo(token)
+        indice = termo_do_token[token] = -1 if termo is None else vocabulario.setdefault(termo, len(vocabulario))
+    return indice
+
+
+def _colunas_do_lote(linhas, campos):
+    colunas = list(zip(*linhas))
+    return colunas[0], {campo: colunas[i + 1] for i, campo in enumerate(campos)}
+
+
+class IndiceBusca:
+    '''Índice invertido em formato CSR: os postings do termo t são as posições
+    inicios[t]:inicios[t + 1] de 'questoes' (ids em ordem crescente) e 'pesos'
+    (parte do BM25 que depende da questão: tf e tamanho do documento).'''
+
+    def __init__(self, vocabulario, inicios, questoes, pesos, idf, total_documentos, duracao=0.0):
+        self.vocabulario = vocabulario # {termo: índice}
+        self.inicios = inicios
+        self.questoes = questoes
+        self.pesos = pesos
+        self.idf = idf
+        self.total_documentos = total_documentos
+        self.duracao = duracao
+
+    @classmethod
+    def montar(cls, lotes, k1=BM25_K1, b=BM25_B):
+        '''Monta o índice a partir de lotes (ids, {campo: lista de textos}).
+
+        O texto do lote inteiro passa por um único findall, e só as palavras
+        distintas (novas) passam por acentos/stopwords/stemming em Python; as
+        contagens saem de um np.unique sobre os pares (termo, questão). Nada guarda
+        a lista de tokens do banco inteiro.'''
+        inicio = time.perf_counter()
+        vocabulario = {}
+        termo_do_token = {_SEPARADOR: -2} # Token -> índice do termo (-1 = fora do índice, -2 = separador)
+        termos_lotes, questoes_lotes, tf_lotes = [], [], []
+        ids_documentos, tamanhos_documentos = [], []
+
+        for ids, colunas in lotes:
+            ids = np.asarray(ids, dtype=np.int64)
+            if len(ids) == 0:
+                continue
+            textos = zip(*(colunas[campo] for campo, peso in CAMPOS_INDEXADOS for _ in range(peso)))
+            lote = ' \x01 '.join(' '.join(t).replace('\x01', ' ') for t in textos).lower().encode('utf-8')
+            codigos, distintos = pd.factorize(pd.Series(_TOKEN.findall(lote), dtype=object), sort=False)
+            mapa = np.fromiter((_indice_do_termo(termo_do_token, vocabulario, d) for d in distintos),
+                               dtype=np.int64, count=len(distintos))
+            termo_token = mapa[codigos]
+            posicao_token = np.cumsum(termo_token == -2)
+            mantidos = termo_token >= 0
+            termo_token, posicao_token = termo_token[mantidos], posicao_token[mantidos]
+
+            pares, tf = np.unique(termo_token * len(ids) + posicao_token, return_counts=True)
+            termos_lotes.append(pares // len(ids))
+            questoes_lotes.append(ids[pares % len(ids)].astype(np.int32))
+            tf_lotes.append(tf)
+            ids_documentos.append(ids)
+            tamanhos_documentos.append(np.bincount(posicao_token, minlength=len(ids)))
+
+        if not ids_documentos:
+            vazio = np.empty(0, dtype=np.int32)
+            return cls({}, np.zeros(1, dtype=np.int64), vazio, np.empty(0, dtype=np.float32),
+                       np.empty(0, dtype=np.float32), 0, time.perf_counter() - inicio)
+
+        termo = np.concatenate(termos_lotes)
+        questao = np.concatenate(questoes_lotes) # int32: metade da memória dos postings
+        tf = np.concatenate(tf_lotes).astype(np.float32)
+        # Os lotes vêm em ordem crescente de id: a ordenação estável por termo mantém cada lista ordenada
+        ordem = np.argsort(termo, kind='stable')
+        termo, questao, tf = termo[ordem], questao[ordem], tf[ordem]
+
+        ids = np.concatenate(ids_documentos)
+        tamanhos = np.concatenate(tamanhos_documentos).astype(np.float32)
+        media = float(tamanhos.mean()) or 1.0
+        tamanho_da_questao = tamanhos[np.searchsorted(ids, questao)]
+        pesos = tf * (k1 + 1) / (tf + k1 * (1 - b + b * tamanho_da_questao / media))
+
+        frequencias = np.bincount(termo, minlength=len(vocabulario))
+        inicios = np.concatenate(([0], np.cumsum(frequencias)))
+        n = len(ids)
+        idf = np.log1p((n - frequencias + 0.5) / (frequencias + 0.5)).astype(np.float32)
+        return cls(vocabulario, inicios, questao, pesos.astype(np.float32), idf, n, time.perf_counter() - inicio)
+
+    @classmethod
+    def do_snapshot(cls, snapshot, ids, tamanho_lote=LOTE_INDEXACAO):
+        '''Índice das questões 'ids' (array ordenado) de um SnapshotQuestoes.'''
+        def lotes():
+            for i in range(0, len(ids), tamanho_lote):
+                lote = ids[i:i + tamanho_lote]
+                primeiro, ultimo = int(lote[0]), int(lote[-1]) + 1
+                posicoes = (lote - primeiro).tolist()
+                colunas = {}
+                for campo, _ in CAMPOS_INDEXADOS:
+                    faixa = snapshot.fatia(campo, primeiro, ultimo)
+                    colunas[campo] = [faixa[p] for p in posicoes]
+                yield lote, colunas
+        return cls.montar(lotes())
+
+    @classmethod
+    def das_linhas(cls, linhas, tamanho_lote=LOTE_INDEXACAO):
+        '''Índice a partir de linhas (id, *CAMPOS_INDEXADOS) em ordem crescente de id,
+        ex.: um SELECT em lotes na tabela 'questoes' (modo SQL).'''
+        campos = [campo for campo, _ in CAMPOS_INDEXADOS]
+
+        def lotes():
+            lote = []
+            for linha in linhas:
+                lote.append(linha)
+                if len(lote) == tamanho_lote:
+                    yield _colunas_do_lote(lote, campos)
+                    lote = []
+            if lote:
+                yield _colunas_do_lote(lote, campos)
+        return cls.montar(lotes())
+
+    def __len__(self):
+        return len(self.vocabulario)
+
+    def buscar(self, consulta, candidatos=None, limite=None):
+        '''(ids, scores, total): as questões com algum termo da consulta, do melhor
+        para o pior score (empate: menor id primeiro), e quantas são no total.
+
+        'candidatos' (array ordenado de ids) restringe o resultado, ex.: filtros de
+        disciplina/banca. 'limite' ordena só os 'limite' melhores (paginação).'''
+        listas, pesos = [], []
+        for termo in termos(consulta):
+            t = self.vocabulario.get(termo)
+            if t is None:
+                continue
+            inicio, fim = self.inicios[t], self.inicios[t + 1]
+            listas.append(self.questoes[inicio:fim])
+            pesos.append(self.pesos[inicio:fim] * self.idf[t])
+        if not listas:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0
+
+        if len(listas) == 1:
+            ids, scores = listas[0], pesos[0]
+        else:
+            ids, posicoes = np.unique(np.concatenate(listas), return_inverse=True)
+            scores = np.bincount(posicoes, weights=np.concatenate(pesos)).astype(np.float32)
+        if candidatos is not None:
+            candidatos = np.asarray(candidatos, dtype=np.int64)
+            if len(candidatos) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0
+            posicoes = np.minimum(np.searchsorted(candidatos, ids), len(candidatos) - 1)
+            mantidos = candidatos[posicoes] == ids
+            ids, scores = ids[mantidos], scores[mantidos]
+
+        total = len(ids)
+        if limite is not None and limite < total:
+            # Só os que empatam ou superam o 'limite'-ésimo score entram na ordenação
+            corte = np.partition(scores, total - limite)[total - limite]
+            mantidos = scores >= corte
+            ids, scores = ids[mantidos], scores[mantidos]
+        ordem = np.lexsort((ids, -scores))[:limite]
+        return ids[ordem], scores[ordem], total
+
+    def metricas(self):
+        return {
+            "documentos": self.total_documentos,
+            "termos": len(self.vocabulario),
+            "postings": len(self.questoes),
+            "memoria_kb": round((self.inicios.nbytes + self.questoes.nbytes + self.pesos.nbytes + self.idf.nbytes) / 1024),
+            "montagem_ms": round(self.duracao * 1000, 1),
+        }
+
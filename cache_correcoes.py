@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Cache das correções de redação ---
+# ---
+# O aluno reenvia a mesma redação depois de uma falha de rede ou clica duas vezes em
+# "Corrigir", e cada envio era outra chamada lenta (e paga) ao Gemini.
+#
+#   - Chave: sha256 de (modelo, versão do prompt, tema, enunciado, texto normalizado).
+#     Trocar o modelo ou o prompt muda a chave, então correções antigas não voltam.
+#   - Dois níveis: um LRU em memória (por processo) na frente de um nível persistente
+#     (funções obter/gravar do app, que usam a tabela 'correcoes_cache').
+#   - Singleflight: pedidos iguais ao mesmo tempo no processo esperam a chamada que já
+#     está em andamento e recebem o mesmo resultado (uma chamada ao Gemini só), seja
+#     ela da correção por trabalho ou da correção em fluxo.
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+
+from sessao_simulado import CacheLRU
+
+_ESPACOS = re.compile(r'[ \t\u00a0]+')
+_LINHAS_VAZIAS = re.compile(r'\n{3,}')
+
+
+def normalizar_texto(texto):
+    '''Mesmo texto para o corretor: Unicode NFC, quebras de linha '\\n', espaços repetidos
+    viram um, sem espaços nas pontas das linhas e no máximo uma linha em branco seguida
+    (os parágrafos continuam separados).'''
+    texto = unicodedata.normalize('NFC', texto or '').replace('\r\n', '\n').replace('\r', '\n')
+    linhas = [_ESPACOS.sub(' ', linha).strip() for linha in texto.split('\n')]
+    return _LINHAS_VAZIAS.sub('\n\n', '\n'.join(linhas)).strip()
+
+
+def chave_correcao(modelo, versao_prompt, tema, enunciado, texto):
+    conteudo = [modelo, versao_prompt, normalizar_texto(tema), normalizar_texto(enunciado), normalizar_texto(texto)]
+    return hashlib.sha256(json.dumps(conteudo, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class LiderDesistiu(Exception):
+    '''Quem calculava a chave parou sem resultado nem erro (ex.: o aluno fechou o fluxo).'''
+
+
+class _Chamada:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.desistiu = False
+
+
+class Singleflight:
+    '''executar(chave, funcao): com várias threads na mesma chave, só a primeira chama
+    funcao(); as outras esperam e recebem o mesmo resultado (ou a mesma exceção).
+    Quem não calcula numa função só (a correção em fluxo vai entregando os trechos)
+    usa entrar(), concluir() e esperar() diretamente.'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self.total_coalescidas = 0
+
+    def entrar(self, chave):
+        '''(chamada, lider): o líder calcula e chama concluir(); os outros chamam esperar().'''
+        with self._lock:
+            chamada = self._em_andamento.get(chave)
+            if chamada is not None:
+                self.total_coalescidas += 1
+                return chamada, False
+            chamada = self._em_andamento[chave] = _Chamada()
+            return chamada, True
+
+    def concluir(self, chave, chamada, resultado=None, erro=None, desistiu=False):
+        chamada.resultado, chamada.erro, chamada.desistiu = resultado, erro, desistiu
+        with self._lock:
+            del self._em_andamento[chave]
+        chamada.evento.set()
+
+    @staticmethod
+    def esperar(chamada):
+        '''Resultado do líder (ou a exceção dele); LiderDesistiu se ele parou sem nenhum dos dois.'''
+        chamada.evento.wait()
+        if chamada.desistiu:
+            raise LiderDesistiu()
+        if chamada.erro is not None:
+            raise chamada.erro
+        return chamada.resultado
+
+    def executar(self, chave, funcao):
+        chamada, lider = self.entrar(chave)
+        while not lider:
+            try:
+                return self.esperar(chamada)
+            except LiderDesistiu:
+                chamada, lider = self.entrar(chave) # Tenta de novo: uma das que esperavam vira o líder
+        try:
+            resultado = funcao()
+        except Exception as e:
+            self.concluir(chave, chamada, erro=e)
+            raise
+        except BaseException:
+            self.concluir(chave, chamada, desistiu=True)
+            raise
+        self.concluir(chave, chamada, resultado=resultado)
+        return resultado
+
+
+class CacheCorrecoes:
+    '''LRU em memória + nível persistente. obter_persistente(chave) -> valor ou None e
+    gravar_persistente(chave, valor) são do app; erros neles só são logados.'''
+
+    def __init__(self, capacidade, obter_persistente, gravar_persistente):
+        self._lru = CacheLRU(capacidade)
+        self._obter_persistente = obter_persistente
+        self._gravar_persistente = gravar_persistente
+        self.singleflight = Singleflight() # Público: a correção em fluxo registra a chave nele
+        self.total_acertos_memoria = 0
+        self.total_acertos_persistente = 0
+        self.total_faltas = 0
+
+    def obter(self, chave):
+        valor = self._lru.obter(chave)
+        if valor is not None:
+            self.total_acertos_memoria += 1
+            return valor
+        try:
+            valor = self._obter_persistente(chave)
+        except Exception as e:
+            print(f"AVISO: Falha ao ler o cache persistente de correções: {e}")
+            valor = None
+        if valor is not None:
+            self.total_acertos_persistente += 1
+            self._lru.guardar(chave, valor)
+        return valor
+
+    def guardar(self, chave, valor):
+        self._lru.guardar(chave, valor)
+        try:
+            self._gravar_persistente(chave, valor)
+        except Exception as e:
+            print(f"AVISO: Falha ao gravar o cache persistente de correções: {e}")
+
+    def obter_ou_calcular(self, chave, calcular, cacheavel=lambda valor: True):
+        '''Valor em cache ou calcular() (uma vez só para chamadas simultâneas na mesma chave).
+        Retorna (valor, veio_do_cache). Só guarda o que cacheavel(valor) aprovar.'''
+        valor = self.obter(chave)
+        if valor is not None:
+            return valor, True
+
+        def calcular_e_guardar():
+            # Outra thread pode ter acabado de guardar enquanto esta esperava a vez
+            valor = self.obter(chave)
+            if valor is not None:
+                return valor, True
+            self.total_faltas += 1
+            valor = calcular()
+            if cacheavel(valor):
+                self.guardar(chave, valor)
+            return valor, False
+
+        return self.singleflight.executar(chave, calcular_e_guardar)
+
+    def metricas(self):
+        return {
+            "itens_memoria": len(self._lru),
+            "capacidade_memoria": self._lru.capacidade,
+            "acertos_memoria": self.total_acertos_memoria,
+            "acertos_persistente": self.total_acertos_persistente,
+            "faltas": self.total_faltas,
+            "chamadas_coalescidas": self.singleflight.total_coalescidas,
+        }
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Ids das questões que sobrevivem a uma versão nova do banco ---
+# ---
+# O id de uma questão é a posição dela no CSV (e na tabela 'questoes', que o
+# load-bank copia com os mesmos ids). respostas_usuarios, estado_revisao e
+# questoes_vistas guardam esse id: um CSV novo com linhas inseridas no meio ou
+# reordenadas fazia o histórico, a agenda SM-2 e os bitsets apontarem para outras
+# questões depois da recarga.
+#
+# A tabela 'chaves_questoes' (uma linha só) guarda a versão do banco a que os ids
+# gravados se referem e a chave estável de cada posição dessa versão: blake2b de 16
+# bytes do enunciado + alternativas (espaços normalizados), como a deduplicação da
+# ingestão. Quando o app ativa uma versão nova:
+#   - remapear() troca a linha (compare-and-set na versão: só um processo remapeia)
+#     e, na mesma transação, reescreve respostas_usuarios.questao_id com
+#     mapa_posicoes(). Questões que saíram do banco ficam com QUESTAO_REMOVIDA: a
+#     resposta continua contando nas estatísticas, mas não volta para a agenda;
+#   - o app remonta a agenda e os bitsets a partir das respostas (o mesmo que
+#     'flask rebuild-review' e 'flask rebuild-seen').
+# Acréscimos no fim do CSV não mudam nenhuma posição: aí nada é reescrito.
+import datetime
+import hashlib
+
+from sqlalchemy import Column, Integer, MetaData, Table, insert, select, update
+
+TAMANHO_CHAVE = 16
+CAMPOS_CHAVE = ('enunciado', 'alternativa_a', 'alternativa_b', 'alternativa_c', 'alternativa_d', 'alternativa_e')
+QUESTAO_REMOVIDA = -1
+LOTE_MAPA = 5000
+
+
+def chave_questao(valores):
+    texto = '\x1f'.join(' '.join((valor or '').split()) for valor in valores)
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=TAMANHO_CHAVE).digest()
+
+
+def chaves_do_snapshot(snapshot):
+    '''As chaves de todas as posições do snapshot, concatenadas (TAMANHO_CHAVE bytes cada).'''
+    colunas = [snapshot.coluna(campo) for campo in CAMPOS_CHAVE]
+    return b''.join(chave_questao(valores) for valores in zip(*colunas))
+
+
+def chave_da_posicao(chaves, posicao):
+    if not 0 <= posicao < len(chaves) // TAMANHO_CHAVE:
+        return None
+    return chaves[posicao * TAMANHO_CHAVE:(posicao + 1) * TAMANHO_CHAVE]
+
+
+def posicoes(chaves):
+    '''{chave: posição}. Questões repetidas ficam com a primeira posição.'''
+    resultado = {}
+    for posicao in range(len(chaves) // TAMANHO_CHAVE):
+        resultado.setdefault(chave_da_posicao(chaves, posicao), posicao)
+    return resultado
+
+
+def mapa_posicoes(chaves_antigas, chaves_novas):
+    '''{posição antiga: posição nova} só das posições que mudaram (QUESTAO_REMOVIDA se saiu).'''
+    novas = posicoes(chaves_novas)
+    mapa = {}
+    for antiga in range(len(chaves_antigas) // TAMANHO_CHAVE):
+        nova = novas.get(chave_da_posicao(chaves_antigas, antiga), QUESTAO_REMOVIDA)
+        if nova != antiga:
+            mapa[antiga] = nova
+    return mapa
+
+
+def consulta_versao(tabela_chaves):
+    return select(tabela_chaves.c.versao).where(tabela_chaves.c.id == 1)
+
+
+def consulta_chaves(tabela_chaves, versao):
+    return select(tabela_chaves.c.chaves).where(tabela_chaves.c.id == 1, tabela_chaves.c.versao == versao)
+
+
+def comando_trocar_versao(tabela_chaves, antiga, versao, chaves, agora):
+    '''Compare-and-set: só troca se a linha ainda estiver na versão 'antiga'.'''
+    return (update(tabela_chaves).where(tabela_chaves.c.id == 1, tabela_chaves.c.versao == antiga)
+            .values(versao=versao, chaves=chaves, atualizado_em=agora))
+
+
+def remapear(conexao, tabela_chaves, respostas, versao, chaves):
+    '''Põe os ids de 'respostas' na 'versao' (chaves = chaves_do_snapshot dela). Retorna o
+    mapa aplicado ({} na primeira vez ou se nada mudou de posição), ou None se os ids já
+    estavam nessa versão (outro processo pode ter acabado de remapear).'''
+    agora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    gravada = conexao.execute(consulta_versao(tabela_chaves)).scalar()
+    if gravada is None:
+        conexao.execute(insert(tabela_chaves).values(id=1, versao=versao, chaves=chaves, atualizado_em=agora))
+        return {}
+    if gravada == versao:
+        return None
+    antigas = conexao.execute(consulta_chaves(tabela_chaves, gravada)).scalar()
+    if not conexao.execute(comando_trocar_versao(tabela_chaves, gravada, versao, chaves, agora)).rowcount:
+        return None
+    mapa = mapa_posicoes(antigas, chaves)
+    if mapa:
+        # Um UPDATE só (com o mapa numa tabela temporária): trocar id a id colidiria
+        # quando uma questão vai para a posição que outra está deixando
+        temporaria = Table('mapa_questoes', MetaData(),
+                           Column('antigo', Integer, primary_key=True, autoincrement=False),
+                           Column('novo', Integer, nullable=False),
+                           prefixes=['TEMPORARY'])
+        temporaria.create(conexao)
+        itens = [{"antigo": antigo, "novo": novo} for antigo, novo in mapa.items()]
+        for i in range(0, len(itens), LOTE_MAPA):
+            conexao.execute(insert(temporaria), itens[i:i + LOTE_MAPA])
+        novo = select(temporaria.c.novo).where(temporaria.c.antigo == respostas.c.questao_id).scalar_subquery()
+        conexao.execute(update(respostas)
+                        .where(respostas.c.questao_id.in_(select(temporaria.c.antigo)))
+                        .values(questao_id=novo))
+        temporaria.drop(conexao)
+    return mapa
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Cliente único do Gemini: prazo, retentativas e disjuntor ---
+# ---
+# Cada correção chamava genai.configure(...) e criava um GenerativeModel novo, sem prazo
+# e sem política de retentativa: um Gemini travado prendia o worker indefinidamente, e
+# numa queda parcial toda redação levava segundos para falhar antes de cair na simulada.
+#
+#   - Um cliente por processo (obter_cliente()), criado no primeiro uso depois do fork:
+#     o configure e o modelo (com as conexões dele) são reaproveitados entre chamadas.
+#   - Prazo por chamada (GEMINI_PRAZO) passado ao SDK; a retentativa do SDK fica
+#     desligada e a política é a daqui.
+#   - Retentativa só para erros transitórios (429, 500, 503, 504, rede, prazo estourado),
+#     com espera exponencial e jitter "completo": uniforme entre 0 e base * 2^tentativa.
+#   - Disjuntor: depois de GEMINI_DISJUNTOR_FALHAS chamadas seguidas que falharam, as
+#     próximas GEMINI_DISJUNTOR_ABERTO segundos nem tentam (GeminiIndisponivel na hora,
+#     e o app usa a correção simulada). Passado esse tempo, uma chamada de teste decide
+#     se fecha de novo.
+#   - GEMINI_API_ENDPOINT aponta o cliente para outro servidor (transporte REST), por
+#     exemplo o servidor_gemini_falso.py, para testar tudo isso sem a API de verdade.
+import os
+import random
+import threading
+import time
+
+try:
+    import requests
+except ImportError: # Só usado para reconhecer erros de rede do transporte REST
+    requests = None
+
+import google.generativeai as genai
+from google.api_core import exceptions as erros_google
+
+ERROS_TRANSITORIOS = (
+    erros_google.TooManyRequests,
+    erros_google.ResourceExhausted,
+    erros_google.InternalServerError,
+    erros_google.ServiceUnavailable,
+    erros_google.DeadlineExceeded,
+    erros_google.RetryError,
+    ConnectionError,
+    TimeoutError,
+) + ((requests.exceptions.ConnectionError, requests.exceptions.Timeout) if requests else ())
+
+
+class GeminiIndisponivel(Exception):
+    '''O Gemini não respondeu (disjuntor aberto ou retentativas esgotadas): use a simulada.'''
+
+
+class Disjuntor:
+    '''Fechado: tudo passa. Aberto: nada passa até 'tempo_aberto' segundos. Meio-aberto:
+    uma chamada de teste passa; sucesso fecha, falha abre de novo.'''
+
+    def __init__(self, limite_falhas=5, tempo_aberto=30.0):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self._lock = threading.Lock()
+        self._falhas_seguidas = 0
+        self._aberto_ate = None
+        self._teste_em_andamento = False
+        self.total_aberturas = 0
+
+    @property
+    def estado(self):
+        if self._aberto_ate is None:
+            return 'fechado'
+        return 'aberto' if time.monotonic() < self._aberto_ate else 'meio_aberto'
+
+    def permitir(self):
+        with self._lock:
+            if self._aberto_ate is None:
+                return True
+            if time.monotonic() < self._aberto_ate or self._teste_em_andamento:
+                return False
+            self._teste_em_andamento = True
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            self._falhas_seguidas = 0
+            self._aberto_ate = None
+            self._teste_em_andamento = False
+
+    def inconclusivo(self):
+        '''A chamada terminou sem dizer nada sobre a saúde do Gemini (erro permanente): o
+        estado fica como está; se era a chamada de teste, a próxima pode testar.'''
+        with self._lock:
+            self._teste_em_andamento = False
+
+    def falha(self):
+        with self._lock:
+            self._falhas_seguidas += 1
+            if self._teste_em_andamento or self._falhas_seguidas >= self.limite_falhas:
+                if self._aberto_ate is None or self._teste_em_andamento:
+                    self.total_aberturas += 1
+                    print(f"AVISO: Disjuntor do Gemini aberto por {self.tempo_aberto:.0f}s "
+                          f"({self._falhas_seguidas} falhas seguidas).")
+                self._aberto_ate = time.monotonic() + self.tempo_aberto
+            self._teste_em_andamento = False
+
+
+class ClienteGemini:
+    def __init__(self, api_key, modelo, endpoint=None, prazo=30.0, tentativas=3,
+                 espera_base=0.5, espera_maxima=8.0, disjuntor=None):
+        self.api_key = api_key
+        self.nome_modelo = modelo
+        self.endpoint = endpoint
+        self.prazo = prazo
+        self.tentativas = tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.disjuntor = disjuntor or Disjuntor()
+        self._lock = threading.Lock()
+        self._modelo = None
+
+        self.total_chamadas = 0
+        self.total_retentativas = 0
+        self.total_falhas = 0
+        self.total_recusadas = 0
+        self.ultimo_erro = None
+
+    def _obter_modelo(self):
+        with self._lock:
+            if self._modelo is None:
+                if self.endpoint:
+                    genai.configure(api_key=self.api_key, transport='rest',
+                                    client_options={'api_endpoint': self.endpoint})
+                else:
+                    genai.configure(api_key=self.api_key)
+                self._modelo = genai.GenerativeModel(self.nome_modelo)
+            return self._modelo
+
+    def _opcoes(self, limite):
+        # retry=None desliga a retentativa do próprio SDK
+        return {'timeout': max(0.1, min(self.prazo, limite - time.monotonic())), 'retry': None}
+
+    def _espera(self, tentativa):
+        return random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** tentativa))
+
+    def _chamar(self, executar):
+        '''executar(opcoes) com disjuntor e retentativas; levanta GeminiIndisponivel.'''
+        if not self.disjuntor.permitir():
+            self.total_recusadas += 1
+            raise GeminiIndisponivel("disjuntor aberto")
+        self.total_chamadas += 1
+        limite = time.monotonic() + self.prazo * self.tentativas # Prazo total, com as esperas
+        tentativa = 0
+        while True:
+            try:
+                resultado = executar(self._opcoes(limite))
+                self.disjuntor.sucesso()
+                return resultado
+            except ERROS_TRANSITORIOS as e:
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                espera = self._espera(tentativa)
+                tentativa += 1
+                if tentativa >= self.tentativas or time.monotonic() + espera >= limite:
+                    self.total_falhas += 1
+                    self.disjuntor.falha()
+                    raise GeminiIndisponivel(self.ultimo_erro) from e
+                self.total_retentativas += 1
+                time.sleep(espera)
+            except Exception as e:
+                # Erro permanente (chave inválida, pedido recusado...): não adianta repetir, e
+                # não diz se o Gemini está saudável: nem fecha nem abre o disjuntor. Sobe como está.
+                self.ultimo_erro = f"{type(e).__name__}: {e}"
+                self.total_falhas += 1
+                self.disjuntor.inconclusivo()
+                raise
+
+    def gerar(self, prompt):
+        '''Texto completo da resposta.'''
+        return self._chamar(lambda opcoes: self._obter_modelo().generate_content(prompt, request_options=opcoes).text)
+
+    def gerar_em_fluxo(self, prompt):
+        '''Iterador dos trechos de texto. A retentativa só vale até o primeiro trecho chegar
+        (depois disso, repetir duplicaria o que já foi entregue): uma falha no meio levanta
+        GeminiIndisponivel para quem está lendo.'''
+        def abrir(opcoes):
+            partes = iter(self._obter_modelo().generate_content(prompt, stream=True, request_options=opcoes))
+            return partes, next(partes, None)
+
+        partes, primeira = self._chamar(abrir)
+        if primeira is None:
+            return
+        yield primeira.text
+        try:
+            for parte in partes:
+                yield parte.text
+        except Exception as e:
+            self.ultimo_erro = f"{type(e).__name__}: {e}"
+            self.total_falhas += 1
+            self.disjuntor.falha()
+            raise GeminiIndisponivel(self.ultimo_erro) from e
+
+    def metricas(self):
+        return {
+            "modelo": self.nome_modelo,
+            "endpoint": self.endpoint or "padrão",
+            "prazo_s": self.prazo,
+            "tentativas": self.tentativas,
+            "disjuntor": self.disjuntor.estado,
+            "aberturas_disjuntor": self.disjuntor.total_aberturas,
+            "chamadas": self.total_chamadas,
+            "retentativas": self.total_retentativas,
+            "falhas": self.total_falhas,
+            "recusadas_disjuntor_aberto": self.total_recusadas,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+_cliente = None
+_cliente_pid = None
+_lock_cliente = threading.Lock()
+
+
+def chave_configurada():
+    chave = os.getenv('GEMINI_API_KEY')
+    # (NOVO) Verifica se a chave existe e não é a placeholder
+    return chave if chave and chave != 'sua_chave_gemini_aqui' else None
+
+
+def obter_cliente(modelo):
+    '''O ClienteGemini deste processo (None sem chave configurada). Criado no primeiro uso
+    depois do fork, porque as conexões do SDK não sobrevivem a ele.'''
+    global _cliente, _cliente_pid
+    api_key = chave_configurada()
+    if api_key is None:
+        return None
+    if _cliente_pid != os.getpid():
+        with _lock_cliente:
+            if _cliente_pid != os.getpid():
+                _cliente = ClienteGemini(
+                    api_key, modelo,
+                    endpoint=os.getenv('GEMINI_API_ENDPOINT') or None,
+                    prazo=float(os.getenv('GEMINI_PRAZO', '30')),
+                    tentativas=int(os.getenv('GEMINI_TENTATIVAS', '3')),
+                    disjuntor=Disjuntor(int(os.getenv('GEMINI_DISJUNTOR_FALHAS', '5')),
+                                        float(os.getenv('GEMINI_DISJUNTOR_ABERTO', '30'))))
+                _cliente_pid = os.getpid()
+    return _cliente
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Pool limitado de trabalhos em segundo plano (correção de redações) ---
+# ---
+# A correção pelo Gemini leva vários segundos. Feita dentro da requisição, ela prendia um
+# worker síncrono do gunicorn esse tempo todo, e poucas redações ao mesmo tempo deixavam
+# os simulados sem worker. Agora a rota só grava o trabalho (tabela) e o entrega a este
+# pool: 'trabalhadores' threads por processo, que chamam executar(trabalho_id).
+#
+#   - Limite: no máximo 'capacidade' trabalhos pendentes (na fila + em execução) por
+#     processo. Acima disso enviar() levanta FilaSaturada na hora, e quem chama degrada
+#     (o app usa a correção simulada): melhor uma resposta imediata do que uma fila que
+#     só cresce.
+#   - As threads são do processo que as criou (o fork do gunicorn não leva threads); o
+#     pool inicia no primeiro enviar() de cada processo.
+#   - encerrar() para de aceitar trabalhos, espera os que estão rodando e devolve os ids
+#     que nem começaram (o app os marca como interrompidos).
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+_PARAR = object()
+
+
+class FilaSaturada(Exception):
+    pass
+
+
+class PoolTrabalhos:
+    '''Threads que executam executar(trabalho_id) para cada id enviado, com limite de pendentes.'''
+
+    def __init__(self, executar, trabalhadores=2, capacidade=8, nome='trabalhos'):
+        self.executar = executar
+        self.trabalhadores = trabalhadores
+        self.capacidade = capacidade
+        self.nome = nome
+        self._lock = threading.Lock()
+        self._pid = None
+        self._encerrado = False
+
+        self.total_enviados = 0
+        self.total_concluidos = 0
+        self.total_falhas = 0
+        self.total_recusados = 0
+        self.ultimo_erro = None
+        self.duracoes_ms = deque(maxlen=50)
+
+    def _iniciar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._fila = queue.Queue()
+            self._pendentes = 0
+            self._em_execucao = 0
+            self._threads = [threading.Thread(target=self._laco, name=f'{self.nome}-{i}', daemon=True)
+                             for i in range(self.trabalhadores)]
+            self._pid = os.getpid()
+            self._encerrado = False
+            for thread in self._threads:
+                thread.start()
+
+    def profundidade(self):
+        '''Trabalhos pendentes neste processo (na fila + em execução).'''
+        return self._pendentes if self._pid == os.getpid() else 0
+
+    def enviar(self, trabalho_id):
+        '''Põe o trabalho na fila. Levanta FilaSaturada se já houver 'capacidade' pendentes.'''
+        self._iniciar()
+        with self._lock:
+            if self._encerrado or self._pendentes >= self.capacidade:
+                self.total_recusados += 1
+                raise FilaSaturada(f"{self._pendentes} trabalhos pendentes (limite {self.capacidade})")
+            self._pendentes += 1
+            self.total_enviados += 1
+            self._fila.put(trabalho_id)
+
+    def _laco(self):
+        while True:
+            trabalho_id = self._fila.get()
+            if trabalho_id is _PARAR:
+                return
+            with self._lock:
+                self._em_execucao += 1
+            inicio = time.perf_counter()
+            try:
+                self.executar(trabalho_id)
+                self.total_concluidos += 1
+                self.duracoes_ms.append((time.perf_counter() - inicio) * 1000)
+            except Exception as e: # executar() deve tratar os próprios erros; isto só protege a thread
+                self.total_falhas += 1
+                self.ultimo_erro = str(e)
+                print(f"ERRO: Trabalho '{trabalho_id}' do pool '{self.nome}' falhou: {e}")
+            finally:
+                with self._lock:
+                    self._em_execucao -= 1
+                    self._pendentes -= 1
+
+    def encerrar(self, timeout=20):
+        '''Não aceita mais trabalhos, espera os em execução e retorna os ids que não começaram.'''
+        if self._pid != os.getpid():
+            return []
+        with self._lock:
+            self._encerrado = True
+        nao_iniciados = []
+        while True:
+            try:
+                item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _PARAR:
+                nao_iniciados.append(item)
+        with self._lock:
+            self._pendentes -= len(nao_iniciados)
+        for _ in self._threads:
+            self._fila.put(_PARAR)
+        limite = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, limite - time.monotonic()))
+        if any(thread.is_alive() for thread in self._threads):
+            print(f"AVISO: O pool '{self.nome}' não terminou a tempo.")
+        return nao_iniciados
+
+    def metricas(self):
+        duracoes = sorted(self.duracoes_ms)
+        ativo = self._pid == os.getpid()
+        return {
+            "trabalhadores": self.trabalhadores,
+            "capacidade": self.capacidade,
+            "pendentes": self._pendentes if ativo else 0,
+            "em_execucao": self._em_execucao if ativo else 0,
+            "enviados": self.total_enviados,
+            "concluidos": self.total_concluidos,
+            "falhas": self.total_falhas,
+            "recusados_fila_saturada": self.total_recusados,
+            "ultimo_erro": self.ultimo_erro,
+            "duracao_ms_mediana": round(duracoes[len(duracoes) // 2], 1) if duracoes else None,
+        }
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Correção em fluxo (SSE): leitura incremental das competências ---
+# ---
+# O Gemini gera o JSON da correção aos poucos. Em vez de esperar o texto inteiro, o
+# LeitorCompetencias acompanha o JSON parcial caractere a caractere (strings, escapes e
+# profundidade de chaves/colchetes) e devolve cada objeto do array "competencias" assim
+# que o '}' dele chega. O texto completo continua sendo lido com json.loads no fim.
+import json
+
+
+class LeitorCompetencias:
+    '''alimentar(trecho) -> lista das competências (dicts) que ficaram completas com o trecho.'''
+
+    def __init__(self, chave='competencias'):
+        self.chave = chave
+        self.texto = ''
+        self._pos = 0
+        self._em_string = False
+        self._escape = False
+        self._inicio_string = None
+        self._ultima_string = None
+        self._chave_atual = None
+        self._profundidade = 0
+        self._profundidade_array = None # profundidade do '[' de "competencias" (None: ainda não achou)
+        self._array_fechado = False
+        self._inicio_objeto = None
+        self.total = 0
+
+    def alimentar(self, trecho):
+        self.texto += trecho
+        completas = []
+        texto = self.texto
+        for pos in range(self._pos, len(texto)):
+            c = texto[pos]
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._em_string = False
+                    self._ultima_string = texto[self._inicio_string + 1:pos]
+                continue
+            if c == '"':
+                self._em_string = True
+                self._inicio_string = pos
+            elif c == ':':
+                self._chave_atual = self._ultima_string
+            elif c == ',':
+                self._chave_atual = None
+            elif c in '[{':
+                self._profundidade += 1
+                if c == '[' and self._chave_atual == self.chave and self._profundidade_array is None:
+                    self._profundidade_array = self._profundidade
+                elif (c == '{' and self._profundidade_array is not None and not self._array_fechado
+                      and self._profundidade == self._profundidade_array + 1):
+                    self._inicio_objeto = pos
+                self._chave_atual = None
+            elif c in ']}':
+                if (c == '}' and self._inicio_objeto is not None
+                        and self._profundidade == self._profundidade_array + 1):
+                    try:
+                        completas.append(json.loads(texto[self._inicio_objeto:pos + 1]))
+                        self.total += 1
+                    except ValueError:
+                        pass # Objeto malformado: fica para a leitura do texto completo
+                    self._inicio_objeto = None
+                elif c == ']' and self._profundidade == self._profundidade_array:
+                    self._array_fechado = True
+                self._profundidade -= 1
+        self._pos = len(texto)
+        return completas
+
+
+def evento_sse(evento, dados):
+    '''Um evento no formato text/event-stream (dados em JSON numa linha só).'''
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Gravação das respostas em lote (write-behind) ---
+# ---
+# O responder_questao fazia um INSERT + commit síncrono por resposta: contra o
+# Postgres hospedado, essa ida e volta dominava o tempo do POST mais frequente do app.
+#
+# Agora a resposta é anotada num diário local (arquivo append-only, com fsync) e vai
+# para uma fila; uma thread por processo junta os registros e grava em lote (um
+# INSERT com várias linhas + um commit) quando o lote enche ou o intervalo vence.
+#
+#   - Durabilidade: o POST só responde depois da linha estar no diário. Um arquivo
+#     '.ok' ao lado guarda até onde o diário já está no banco; quando tudo foi gravado,
+#     o diário é zerado. Se o processo morrer, o que faltou é regravado a partir do diário.
+#   - Diário por processo ('respostas.<pid>.diario'), travado com flock enquanto o
+#     processo vive. Ao iniciar, a thread regrava os diários sem trava (processos que
+#     morreram). Sem fcntl (Windows), isso fica para o 'flask flush-answers'.
+#   - Backpressure: no máximo CAPACIDADE_FILA respostas pendentes. Com a fila cheia,
+#     registrar() espera até ESPERA_MAXIMA_FILA e então levanta FilaCheia (quem chama
+#     grava direto no banco, como antes).
+#   - encerrar() (atexit / worker_exit do gunicorn) esvazia a fila antes de sair.
+#
+# Um lote que falhou é tentado de novo com espera crescente; se o processo sair antes,
+# o diário guarda o lote. (ALTERADO) Só se o erro for transitório (conexão, trava): se
+# erro_permanente(e) disser que o banco recusou os próprios registros, o lote é gravado
+# um a um e os registros recusados vão para 'respostas.quarentena' (uma linha JSON com o
+# registro e o erro), com o diário confirmado depois deles. Sem isso, um registro ruim
+# travava a thread para sempre, a fila enchia e todo POST caía em FilaCheia. Entre o commit do lote e a gravação do '.ok' há uma janela
+# muito curta em que uma queda faria o lote ser regravado (entrega "pelo menos uma vez").
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError: # Windows: sem trava entre processos
+    fcntl = None
+
+TAMANHO_LOTE = 200
+INTERVALO_LOTE = 0.2 # segundos: o lote sai quando enche ou quando o primeiro registro espera isso
+CAPACIDADE_FILA = 5000
+ESPERA_MAXIMA_FILA = 0.5 # segundos que registrar() espera por vaga antes de desistir
+ESPERA_MAXIMA_RETENTATIVA = 5.0
+
+_PARAR = object()
+
+
+class FilaCheia(Exception):
+    pass
+
+
+class Diario:
+    '''Arquivo append-only com uma linha JSON por registro e, ao lado, '<arquivo>.ok'
+    com o offset até onde os registros já foram gravados no banco.'''
+
+    def __init__(self, caminho, fsync=True):
+        self.caminho = caminho
+        self.fsync = fsync
+        self._arquivo = open(caminho, 'ab')
+        if fcntl:
+            try:
+                fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._arquivo.close()
+                raise
+        self.tamanho = self._arquivo.tell()
+
+    def anexar(self, registro):
+        '''Grava o registro e retorna o offset do fim dele no arquivo.'''
+        linha = json.dumps(registro, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        self._arquivo.write(linha)
+        self._arquivo.flush()
+        if self.fsync:
+            os.fsync(self._arquivo.fileno())
+        self.tamanho += len(linha)
+        return self.tamanho
+
+    def confirmar(self, offset):
+        gravar_confirmado(self.caminho, offset)
+
+    def zerar(self):
+        '''Tudo já está no banco: começa o arquivo de novo (chamar sem anexos em paralelo).'''
+        self._arquivo.truncate(0)
+        self.tamanho = 0
+        gravar_confirmado(self.caminho, 0)
+
+    def fechar(self, apagar=False):
+        if apagar:
+            for caminho in (self.caminho, self.caminho + '.ok'):
+                try:
+                    os.remove(caminho)
+                except OSError:
+                    pass
+        self._arquivo.close()
+
+
+def gravar_confirmado(caminho, offset):
+    temporario = caminho + '.ok.tmp'
+    with open(temporario, 'w') as f:
+        f.write(str(offset))
+    os.replace(temporario, caminho + '.ok')
+
+
+def registros_pendentes(caminho):
+    '''(registro, offset do fim dele) do diário depois do offset confirmado (uma linha
+    incompleta no fim é ignorada).'''
+    try:
+        with open(caminho + '.ok') as f:
+            confirmado = int(f.read() or 0)
+    except (OSError, ValueError):
+        confirmado = 0
+    with open(caminho, 'rb') as f:
+        f.seek(confirmado)
+        dados = f.read()
+    registros = []
+    fim = confirmado
+    for linha in dados.split(b'\n')[:-1]:
+        fim += len(linha) + 1
+        try:
+            registros.append((json.loads(linha), fim))
+        except ValueError:
+            print(f"AVISO: Linha ilegível no diário '{caminho}' ignorada.")
+    return registros
+
+
+class GravadorEmLote:
+    '''Fila com diário + thread que chama gravar_lote(registros) com até 'tamanho_lote'
+    registros de cada vez. gravar_lote deve gravar tudo numa transação ou levantar exceção;
+    erro_permanente(e) diz se a exceção é dos registros (não adianta repetir o lote).'''
+
+    def __init__(self, gravar_lote, pasta, tamanho_lote=TAMANHO_LOTE, intervalo=INTERVALO_LOTE,
+                 capacidade=CAPACIDADE_FILA, espera_maxima=ESPERA_MAXIMA_FILA, fsync=True,
+                 erro_permanente=lambda e: False):
+        self.gravar_lote = gravar_lote
+        self.erro_permanente = erro_permanente
+        self.pasta = pasta
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self.capacidade = capacidade
+        self.espera_maxima = espera_maxima
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._diario = None
+        self._pid = None # A thread e o diário são do processo que os criou (o fork do gunicorn não leva threads)
+
+        self.total_registrados = 0
+        self.total_gravados = 0
+        self.total_lotes = 0
+        self.total_recuperados = 0
+        self.total_recusados = 0
+        self.total_falhas = 0
+        self.total_quarentena = 0
+        self.ultimo_erro = None
+        self.duracoes_ms = deque(maxlen=50)
+
+    def _iniciar(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.pasta, exist_ok=True)
+            self._fila = queue.Queue()
+            self._vagas = threading.BoundedSemaphore(self.capacidade)
+            self._recuperar_orfaos(apenas_o_proprio=True) # Um diário velho com o nosso pid é de outro processo
+            self._diario = Diario(os.path.join(self.pasta, f'respostas.{os.getpid()}.diario'), self.fsync)
+            self._thread = threading.Thread(target=self._laco, name='gravador-respostas', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def registrar(self, registro):
+        '''Anota o registro no diário e o põe na fila. Levanta FilaCheia se não houver
+        vaga em 'espera_maxima' segundos (nada foi anotado nesse caso).'''
+        self._iniciar()
+        if not self._vagas.acquire(timeout=self.espera_maxima):
+            self.total_recusados += 1
+            raise FilaCheia(f"{self.capacidade} respostas aguardando gravação")
+        try:
+            with self._lock:
+                fim = self._diario.anexar(registro)
+                self._fila.put((registro, fim))
+        except Exception:
+            self._vagas.release()
+            raise
+        self.total_registrados += 1
+
+    def _laco(self):
+        if fcntl:
+            self._recuperar_orfaos()
+        parar = False
+        while not parar:
+            item = self._fila.get()
+            if item is _PARAR:
+                break
+            lote = [item]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamanho_lote:
+                restante = limite - time.monotonic()
+                try:
+                    item = self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _PARAR:
+                    parar = True
+                    break
+                lote.append(item)
+            self._gravar(lote, self._diario, insistir=not parar)
+
+    def _gravar(self, lote, diario, insistir=True):
+        '''Grava os (registro, offset) do lote e confirma no diário à medida que avança.
+        Retorna False se desistiu num erro transitório (o resto fica no diário).'''
+        espera = 0.1
+        um_a_um = False
+        while lote:
+            parte = lote[:1] if um_a_um else lote
+            inicio = time.perf_counter()
+            try:
+                self.gravar_lote([registro for registro, _ in parte])
+                self.duracoes_ms.append((time.perf_counter() - inicio) * 1000)
+                self.total_gravados += len(parte)
+                self.total_lotes += 1
+            except Exception as e:
+                self.total_falhas += 1
+                self.ultimo_erro = str(e)
+                if not self.erro_permanente(e):
+                    print(f"ERRO: Falha ao gravar lote de {len(parte)} respostas (fica no diário). Erro: {e}")
+                    if not insistir:
+                        return False
+                    time.sleep(espera)
+                    espera = min(espera * 2, ESPERA_MAXIMA_RETENTATIVA)
+                    continue
+                if len(parte) > 1:
+                    print(f"AVISO: O banco recusou o lote de {len(parte)} respostas; gravando uma a uma. Erro: {e}")
+                    um_a_um = True
+                    continue
+                self._por_em_quarentena(parte[0][0], e)
+            self._confirmar(parte, diario)
+            lote = lote[len(parte):]
+        return True
+
+    def _confirmar(self, parte, diario):
+        if diario is not self._diario: # Diário de outro processo (recuperação): sem vagas a devolver
+            diario.confirmar(parte[-1][1])
+            return
+        with self._lock:
+            confirmado = parte[-1][1]
+            if confirmado == self._diario.tamanho:
+                self._diario.zerar() # Nada pendente: o diário não cresce para sempre
+            else:
+                self._diario.confirmar(confirmado)
+        for _ in parte:
+            self._vagas.release()
+
+    def _por_em_quarentena(self, registro, erro):
+        linha = json.dumps({"registro": registro, "erro": str(erro), "em": time.time()}, ensure_ascii=False)
+        with open(os.path.join(self.pasta, 'respostas.quarentena'), 'a', encoding='utf-8') as f:
+            f.write(linha + '\n')
+        self.total_quarentena += 1
+        print(f"ERRO: Resposta recusada pelo banco foi para a quarentena: {linha}")
+
+    def _recuperar_orfaos(self, apenas_o_proprio=False):
+        '''Regrava os diários de processos que não existem mais (os que não estão travados).'''
+        padrao = f'respostas.{os.getpid()}.diario' if apenas_o_proprio else 'respostas.*.diario'
+        for caminho in sorted(glob.glob(os.path.join(self.pasta, padrao))):
+            if self._pid == os.getpid() and caminho == self._diario.caminho:
+                continue
+            try:
+                diario = Diario(caminho, fsync=False)
+            except OSError:
+                continue # Travado: o processo dono está vivo
+            try:
+                registros = registros_pendentes(caminho)
+                for i in range(0, len(registros), self.tamanho_lote):
+                    if not self._gravar(registros[i:i + self.tamanho_lote], diario, insistir=False):
+                        raise RuntimeError("o banco não aceitou o lote")
+                self.total_recuperados += len(registros)
+                if registros:
+                    print(f"INFO: {len(registros)} respostas recuperadas do diário '{caminho}'.")
+            except Exception as e:
+                self.total_falhas += 1
+                self.ultimo_erro = str(e)
+                print(f"ERRO: Falha ao recuperar o diário '{caminho}' (fica para a próxima). Erro: {e}")
+                diario.fechar()
+                continue
+            diario.fechar(apagar=True)
+
+    def recuperar_todos(self):
+        '''Regrava os diários que sobraram na pasta (com o app parado; usado pelo CLI).'''
+        os.makedirs(self.pasta, exist_ok=True)
+        antes = self.total_recuperados
+        self._recuperar_orfaos()
+        return self.total_recuperados - antes
+
+    def encerrar(self, timeout=10):
+        '''Esvazia a fila (grava o que falta) e para a thread. Seguro chamar mais de uma vez.'''
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._fila.put(_PARAR)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print("AVISO: O gravador de respostas não terminou a tempo; o diário guarda o que faltou.")
+            return
+        with self._lock:
+            self._diario.fechar(apagar=self._diario.tamanho == 0)
+
+    def metricas(self):
+        duracoes = sorted(self.duracoes_ms)
+        return {
+            "pendentes": self._fila.qsize() if self._pid == os.getpid() else 0,
+            "capacidade": self.capacidade,
+            "registrados": self.total_registrados,
+            "gravados": self.total_gravados,
+            "lotes": self.total_lotes,
+            "recuperados_do_diario": self.total_recuperados,
+            "recusados_fila_cheia": self.total_recusados,
+            "falhas": self.total_falhas,
+            "quarentena": self.total_quarentena,
+            "ultimo_erro": self.ultimo_erro,
+            "lote_ms_mediana": round(duracoes[len(duracoes) // 2], 2) if duracoes else None,
+        }
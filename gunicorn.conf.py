@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Configuração do Gunicorn (lida automaticamente quando está na pasta do app) ---
+# ---
+# preload_app: o app (e o banco de questões) é carregado UMA vez no processo mestre,
+# antes do fork. Os workers herdam o mmap do snapshot e os objetos do módulo.
+#
+# gc.freeze(): move tudo o que o mestre criou para a geração permanente do GC. Sem
+# isso, cada coleta nos workers escreve nos cabeçalhos desses objetos e o
+# copy-on-write duplica as páginas, fazendo cada worker voltar a ter sua cópia.
+#
+# (NOVO) worker_class 'gthread': cada worker atende 'threads' requisições ao mesmo tempo.
+# Com workers sync a correção em fluxo (SSE) prendia o worker inteiro durante a geração
+# do Gemini; agora prende uma thread, e o app limita essas conexões a
+# REDACAO_FLUXOS_MAXIMO por worker (menos que 'threads'), sobrando threads para o resto.
+import gc
+import os
+
+preload_app = True
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def worker_exit(server, worker):
+    # (NOVO) Grava as respostas que ainda estão na fila do gravador em lote antes do worker sair
+    import app
+    if app.gravador_respostas is not None:
+        app.gravador_respostas.encerrar()
+    # (NOVO) Espera as correções de redação em andamento; as que nem começaram viram erro
+    app.encerrar_pool_redacao()
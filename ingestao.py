@@ -0,0 +1,467 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Ingestão do banco de questões (substitui os scripts de limpeza avulsos) ---
+# ---
+# Lê qualquer número de CSVs linha a linha (memória constante em relação ao tamanho
+# das questões), valida cada linha contra o HEADER_ESPERADO, conserta o que dá para
+# consertar, põe em quarentena o que não dá (com arquivo e linha de origem), remove
+# duplicatas e grava o banco mestre numa única passada. No fim grava um relatório JSON.
+#
+# (NOVO) Além das cópias exatas, remove as quase duplicadas (paráfrases da mesma
+# questão) com MinHash + LSH: ver quase_duplicatas.py. Cada grupo mantém uma questão
+# e as demais vão para a quarentena com o motivo 'quase_duplicata'.
+#
+# (NOVO) As questões aceitas passam pela validação semântica (validacao_questoes.py):
+# as que violam uma regra de severidade 'erro' (resposta fora de a–e, alternativa
+# correta vazia, dificuldade/banca fora do vocabulário) vão para a quarentena com o
+# nome da regra como motivo; os avisos só entram no relatório.
+#
+# Uso:
+#   python ingestao.py questoes.csv "novas questoes.csv"              (gera questoes.csv)
+#   python ingestao.py questoes_originais.csv novas_questoes_IA.csv --saida questoes.csv
+#   python ingestao.py questoes.csv --verificar                      (só audita, não grava)
+#   python ingestao.py questoes.csv --similaridade 0.9               (mais conservador)
+#   python ingestao.py questoes.csv --similaridade 0                 (sem quase duplicatas)
+#
+# Depois de gerar o banco, rode 'flask compile-bank' para atualizar o snapshot.
+import argparse
+import codecs
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+
+import quase_duplicatas
+import validacao_questoes
+from banco_questoes import HEADER_ESPERADO
+
+DELIMITADOR = ';'
+N_COLUNAS_ESPERADO = len(HEADER_ESPERADO) # Exatamente 14
+BANCA_PADRAO = 'Banca Padrão'
+MAX_DIAGNOSTICOS = 1000
+LOTE_ASSINATURAS = 2000 # questões por lote de assinaturas MinHash (~40 MB de temporários)
+
+# Motivos de quarentena e de reparo (aparecem no relatório e no CSV de quarentena)
+COLUNAS_A_MAIS = 'colunas_a_mais'
+COLUNAS_A_MENOS = 'colunas_a_menos'
+ENUNCIADO_VAZIO = 'enunciado_vazio'
+CABECALHO_REPETIDO = 'cabecalho_repetido'
+LINHA_VAZIA = 'linha_vazia'
+VAZIAS_NO_FINAL = 'colunas_vazias_no_final_removidas'
+BANCA_ADICIONADA = 'banca_padrao_adicionada'
+CARACTERE_NULO = 'caractere_nulo_removido'
+QUASE_DUPLICATA = 'quase_duplicata'
+
+csv.field_size_limit(16 * 1024 * 1024)
+
+
+def detectar_codificacao(caminho):
+    '''utf-8 se o arquivo inteiro decodifica como utf-8, senão latin-1 (lido em blocos).'''
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1 << 20), b''):
+                decodificador.decode(bloco)
+            decodificador.decode(b'', final=True)
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def chave_duplicata(linha):
+    '''Hash do enunciado normalizado (espaços e maiúsculas não contam). 16 bytes por questão.'''
+    enunciado = ' '.join(linha[HEADER_ESPERADO.index('enunciado')].split()).casefold()
+    return hashlib.blake2b(enunciado.encode('utf-8'), digest_size=16).digest()
+
+
+class Relatorio:
+    '''Contadores por arquivo + diagnósticos linha a linha (limitados a MAX_DIAGNOSTICOS).'''
+
+    def __init__(self, max_diagnosticos=MAX_DIAGNOSTICOS):
+        self.arquivos = {}
+        self.diagnosticos = []
+        self.diagnosticos_omitidos = 0
+        self.max_diagnosticos = max_diagnosticos
+        self.total_gravadas = 0
+        self.limiar_similaridade = None
+        self.grupos_quase_duplicados = []
+        self.total_grupos_quase_duplicados = 0
+        self.validacao = {}
+
+    def arquivo(self, caminho, codificacao, cabecalho):
+        self.arquivos[caminho] = {
+            "codificacao": codificacao,
+            "cabecalho": cabecalho,
+            "linhas_lidas": 0,
+            "aceitas": 0,
+            "reparadas": 0,
+            "quarentena": 0,
+            "duplicadas": 0,
+            "quase_duplicadas": 0,
+            "invalidas": 0,
+            "ignoradas": 0,
+        }
+        return self.arquivos[caminho]
+
+    def diagnostico(self, caminho, linha, acao, motivo, detalhe=''):
+        if len(self.diagnosticos) >= self.max_diagnosticos:
+            self.diagnosticos_omitidos += 1
+            return
+        self.diagnosticos.append({"arquivo": caminho, "linha": linha, "acao": acao, "motivo": motivo, "detalhe": detalhe})
+
+    def grupo_quase_duplicado(self, mantida, removidas):
+        '''mantida = (arquivo, linha); removidas = [(arquivo, linha, similaridade), ...].'''
+        self.total_grupos_quase_duplicados += 1
+        if len(self.grupos_quase_duplicados) >= self.max_diagnosticos:
+            return
+        self.grupos_quase_duplicados.append({
+            "mantida": {"arquivo": mantida[0], "linha": mantida[1]},
+            "removidas": [{"arquivo": a, "linha": l, "similaridade": round(s, 3)} for a, l, s in removidas],
+        })
+
+    def totais(self):
+        campos = ("linhas_lidas", "aceitas", "reparadas", "quarentena", "duplicadas", "quase_duplicadas",
+                  "invalidas", "ignoradas")
+        return {campo: sum(a[campo] for a in self.arquivos.values()) for campo in campos}
+
+    def para_dict(self):
+        return {
+            "header_esperado": HEADER_ESPERADO,
+            "totais": dict(self.totais(), gravadas=self.total_gravadas),
+            "arquivos": self.arquivos,
+            "diagnosticos": self.diagnosticos,
+            "diagnosticos_omitidos": self.diagnosticos_omitidos,
+            "quase_duplicatas": {
+                "limiar_similaridade": self.limiar_similaridade,
+                "total_grupos": self.total_grupos_quase_duplicados,
+                "grupos": self.grupos_quase_duplicados,
+            },
+            "validacao": self.validacao,
+        }
+
+
+def _mapear_cabecalho(primeira_linha):
+    '''Descobre como as colunas do arquivo viram as 14 colunas esperadas.
+
+    Retorna (tipo, mapa, linha_de_dados): 'mapa' é uma lista com, para cada coluna
+    esperada, a posição dela no arquivo (ou None se falta). Se a primeira linha não
+    for um cabeçalho, ela é tratada como dados e as colunas são posicionais.'''
+    nomes = [c.strip().lstrip('\ufeff') for c in primeira_linha]
+    if nomes == HEADER_ESPERADO:
+        return 'esperado', list(range(N_COLUNAS_ESPERADO)), None
+    if 'disciplina' in nomes and 'enunciado' in nomes:
+        mapa = [nomes.index(c) if c in nomes else None for c in HEADER_ESPERADO]
+        return 'por_nome', mapa, None
+    return 'ausente', list(range(N_COLUNAS_ESPERADO)), primeira_linha
+
+
+def _reparar(bruta, n_colunas_arquivo):
+    '''Conserta o que é seguro consertar. Retorna (linha, reparos) ou (None, motivo).'''
+    reparos = []
+    linha = bruta
+    if len(linha) > n_colunas_arquivo:
+        # ';' sobrando no fim da linha: as colunas extras estão vazias
+        if not any(c.strip() for c in linha[n_colunas_arquivo:]):
+            linha = linha[:n_colunas_arquivo]
+            reparos.append(VAZIAS_NO_FINAL)
+        else:
+            return None, COLUNAS_A_MAIS
+    if len(linha) < n_colunas_arquivo:
+        return None, COLUNAS_A_MENOS
+    if any('\0' in c for c in linha):
+        linha = [c.replace('\0', '') for c in linha]
+        reparos.append(CARACTERE_NULO)
+    return linha, reparos
+
+
+def ler_linhas(caminho, relatorio):
+    '''Gera (numero_da_linha, linha_com_14_colunas, reparos, linha_bruta) de um CSV, em streaming.
+
+    Linhas que não podem ser consertadas saem com linha=None e o motivo no lugar dos reparos.'''
+    codificacao = detectar_codificacao(caminho)
+    with open(caminho, encoding=codificacao, newline='') as f:
+        leitor = csv.reader(f, delimiter=DELIMITADOR, quotechar='"')
+        try:
+            primeira = next(leitor)
+        except StopIteration:
+            relatorio.arquivo(caminho, codificacao, 'vazio')
+            return
+        tipo, mapa, pendente = _mapear_cabecalho(primeira)
+        stats = relatorio.arquivo(caminho, codificacao, tipo)
+        n_colunas_arquivo = len(primeira)
+        sem_banca = mapa[HEADER_ESPERADO.index('banca')] is None
+        if tipo == 'ausente' and n_colunas_arquivo == N_COLUNAS_ESPERADO - 1:
+            # Formato antigo (13 colunas, sem 'banca'): a banca entra depois de 'materia'
+            mapa = list(range(2)) + [None] + list(range(2, N_COLUNAS_ESPERADO - 1))
+            sem_banca = True
+        faltando = [HEADER_ESPERADO[i] for i, pos in enumerate(mapa) if pos is None and HEADER_ESPERADO[i] != 'banca']
+
+        linhas = leitor if pendente is None else _com_primeira(pendente, leitor)
+        inicio_registro = 1 if pendente is not None else leitor.line_num + 1
+        for bruta in linhas:
+            numero = inicio_registro
+            inicio_registro = leitor.line_num + 1
+            stats["linhas_lidas"] += 1
+
+            if not any(c.strip() for c in bruta):
+                stats["ignoradas"] += 1
+                relatorio.diagnostico(caminho, numero, 'ignorada', LINHA_VAZIA)
+                continue
+            if [c.strip() for c in bruta[:2]] == ['disciplina', 'materia']:
+                stats["ignoradas"] += 1
+                relatorio.diagnostico(caminho, numero, 'ignorada', CABECALHO_REPETIDO)
+                continue
+
+            linha, reparos = _reparar(bruta, n_colunas_arquivo)
+            if linha is None:
+                yield numero, None, reparos, bruta
+                continue
+
+            final = [linha[pos].strip() if pos is not None else '' for pos in mapa]
+            if sem_banca:
+                final[HEADER_ESPERADO.index('banca')] = BANCA_PADRAO
+                reparos = reparos + [BANCA_ADICIONADA]
+            if faltando:
+                reparos = reparos + [f"coluna_ausente:{c}" for c in faltando]
+            if not final[HEADER_ESPERADO.index('enunciado')]:
+                yield numero, None, ENUNCIADO_VAZIO, bruta
+                continue
+            yield numero, final, reparos, bruta
+
+
+def _com_primeira(primeira, leitor):
+    yield primeira
+    yield from leitor
+
+
+def _ultimas_ocorrencias(entradas):
+    '''Pré-leitura (só hashes) para saber qual é a última ocorrência de cada enunciado.'''
+    ultima = {}
+    relatorio_descartavel = Relatorio(max_diagnosticos=0)
+    for caminho in entradas:
+        for numero, linha, _, _ in ler_linhas(caminho, relatorio_descartavel):
+            if linha is not None:
+                ultima[chave_duplicata(linha)] = (caminho, numero)
+    return ultima
+
+
+def _validar_aceitas(acumulador, origens, relatorio):
+    '''Roda a validação semântica sobre as questões aceitas.
+
+    Retorna {posição na saída: motivo} das que têm erro (os avisos só vão para o relatório).'''
+    resultado = validacao_questoes.validar(acumulador.colunas())
+    relatorio.validacao = resultado.resumo()
+    for posicao, regra, severidade, valor in resultado.erros[['id', 'regra', 'severidade', 'valor']].itertuples(index=False):
+        caminho, numero = origens[posicao]
+        relatorio.diagnostico(caminho, numero, 'quarentena' if severidade == validacao_questoes.ERRO else 'aviso',
+                              regra, valor)
+    removidas = resultado.motivos()
+    for posicao in removidas:
+        stats = relatorio.arquivos[origens[posicao][0]]
+        stats["aceitas"] -= 1
+        stats["invalidas"] += 1
+    relatorio.total_gravadas -= len(removidas)
+    return removidas
+
+
+def _escolher_quase_duplicatas(assinaturas, origens, pontuacoes, limiar, manter, relatorio, invalidas):
+    '''Agrupa as questões aceitas e escolhe a que fica em cada grupo. As 'invalidas'
+    (já removidas pela validação) não entram nos grupos.
+
+    Retorna {posição na saída: motivo} das que saem.'''
+    matriz = assinaturas.matriz()
+    grupos, _ = quase_duplicatas.agrupar(matriz, limiar)
+    removidas = {}
+    for grupo in grupos:
+        grupo = [q for q in grupo if q not in invalidas]
+        if len(grupo) < 2:
+            continue
+        mantida = quase_duplicatas.escolher_mantida(grupo, pontuacoes, manter)
+        outras = [q for q in grupo if q != mantida]
+        for q in outras:
+            removidas[q] = f"{QUASE_DUPLICATA}:{origens[mantida][0]}:{origens[mantida][1]}"
+            stats = relatorio.arquivos[origens[q][0]]
+            stats["aceitas"] -= 1
+            stats["quase_duplicadas"] += 1
+        relatorio.total_gravadas -= len(outras)
+        similaridades = quase_duplicatas.similaridade(matriz, mantida, outras).tolist()
+        relatorio.grupo_quase_duplicado(origens[mantida], [
+            (*origens[q], s) for q, s in zip(outras, similaridades)])
+    return removidas
+
+
+def _remover_da_saida(temporario, removidas, origens, escritor_quarentena):
+    '''Regrava o banco temporário sem as 'removidas' ({posição: motivo}), numa leitura sequencial.'''
+    filtrado = f"{temporario}.filtrado"
+    with open(temporario, encoding='utf-8-sig', newline='') as entrada, \
+            open(filtrado, 'w', encoding='utf-8-sig', newline='') as saida:
+        leitor = csv.reader(entrada, delimiter=DELIMITADOR, quotechar='"')
+        escritor = csv.writer(saida, delimiter=DELIMITADOR, quotechar='"')
+        escritor.writerow(next(leitor))
+        for posicao, linha in enumerate(leitor):
+            if posicao not in removidas:
+                escritor.writerow(linha)
+            elif escritor_quarentena:
+                caminho, numero = origens[posicao]
+                escritor_quarentena.writerow([caminho, numero, removidas[posicao], len(linha), DELIMITADOR.join(linha)])
+    os.replace(filtrado, temporario)
+
+
+def ingerir(entradas, saida=None, quarentena=None, manter='ultima', max_diagnosticos=MAX_DIAGNOSTICOS,
+            similaridade=quase_duplicatas.LIMIAR_SIMILARIDADE):
+    '''Lê as entradas, grava o banco mestre em 'saida' e as linhas ruins em 'quarentena'.
+
+    Com saida=None nada é gravado (modo auditoria). manter='ultima' reproduz o
+    drop_duplicates(keep='last') dos scripts antigos (o arquivo/linha mais recente
+    vence) à custa de uma pré-leitura só de hashes; manter='primeira' faz tudo numa
+    única leitura. As questões reprovadas na validação semântica saem. Com
+    similaridade > 0, as quase duplicatas (Jaccard estimado >= similaridade) também
+    saem: em cada grupo fica a questão mais completa e, no empate, a indicada por
+    'manter'. Retorna o Relatorio.'''
+    relatorio = Relatorio(max_diagnosticos)
+    ultima = _ultimas_ocorrencias(entradas) if manter == 'ultima' else None
+    vistos = set()
+
+    assinaturas = quase_duplicatas.AssinaturasMinHash() if similaridade else None
+    relatorio.limiar_similaridade = similaridade or None
+    textos, origens, pontuacoes = [], [], []
+    acumulador = validacao_questoes.AcumuladorColunas(HEADER_ESPERADO)
+
+    arquivo_saida = arquivo_quarentena = None
+    temporario = f"{saida}.{os.getpid()}.tmp" if saida else None
+    try:
+        if saida:
+            arquivo_saida = open(temporario, 'w', encoding='utf-8-sig', newline='')
+            escritor = csv.writer(arquivo_saida, delimiter=DELIMITADOR, quotechar='"')
+            escritor.writerow(HEADER_ESPERADO)
+        if quarentena:
+            arquivo_quarentena = open(quarentena, 'w', encoding='utf-8-sig', newline='')
+            escritor_quarentena = csv.writer(arquivo_quarentena, delimiter=DELIMITADOR, quotechar='"')
+            escritor_quarentena.writerow(['arquivo', 'linha', 'motivo', 'n_colunas', 'conteudo'])
+
+        for caminho in entradas:
+            for numero, linha, reparos, bruta in ler_linhas(caminho, relatorio):
+                stats = relatorio.arquivos[caminho]
+                if linha is None:
+                    stats["quarentena"] += 1
+                    relatorio.diagnostico(caminho, numero, 'quarentena', reparos, f"{len(bruta)} colunas")
+                    if arquivo_quarentena:
+                        escritor_quarentena.writerow([caminho, numero, reparos, len(bruta), DELIMITADOR.join(bruta)])
+                    continue
+
+                chave = chave_duplicata(linha)
+                if ultima is not None:
+                    duplicada = ultima[chave] != (caminho, numero)
+                else:
+                    duplicada = chave in vistos
+                    vistos.add(chave)
+                if duplicada:
+                    stats["duplicadas"] += 1
+                    continue
+
+                if reparos:
+                    stats["reparadas"] += 1
+                    relatorio.diagnostico(caminho, numero, 'reparada', ','.join(reparos))
+                stats["aceitas"] += 1
+                relatorio.total_gravadas += 1
+                if arquivo_saida:
+                    escritor.writerow(linha)
+                origens.append((caminho, numero))
+                acumulador.adicionar(linha)
+                if assinaturas is not None:
+                    textos.append(quase_duplicatas.texto_da_questao(linha))
+                    pontuacoes.append(quase_duplicatas.pontuacao_da_questao(linha))
+                    if len(textos) >= LOTE_ASSINATURAS:
+                        assinaturas.adicionar(textos)
+                        textos = []
+
+        removidas = _validar_aceitas(acumulador, origens, relatorio)
+        if assinaturas is not None:
+            assinaturas.adicionar(textos)
+            removidas.update(_escolher_quase_duplicatas(
+                assinaturas, origens, pontuacoes, similaridade, manter, relatorio, removidas))
+
+        if arquivo_saida:
+            arquivo_saida.close()
+            if removidas:
+                _remover_da_saida(temporario, removidas, origens,
+                                  escritor_quarentena if arquivo_quarentena else None)
+            os.replace(temporario, saida)
+    finally:
+        for arquivo in (arquivo_saida, arquivo_quarentena):
+            if arquivo and not arquivo.closed:
+                arquivo.close()
+        if temporario:
+            for resto in (temporario, f"{temporario}.filtrado"):
+                if os.path.exists(resto):
+                    os.remove(resto)
+    return relatorio
+
+
+def imprimir_resumo(relatorio):
+    print("\n" + "=" * 60)
+    for caminho, stats in relatorio.arquivos.items():
+        print(f"'{caminho}' ({stats['codificacao']}, cabeçalho {stats['cabecalho']}): "
+              f"{stats['linhas_lidas']} lidas, {stats['aceitas']} aceitas, {stats['reparadas']} reparadas, "
+              f"{stats['quarentena']} em quarentena, {stats['duplicadas']} duplicadas, "
+              f"{stats['quase_duplicadas']} quase duplicadas, {stats['invalidas']} inválidas")
+    totais = relatorio.totais()
+    print("-" * 60)
+    print(f"Total gravado: {relatorio.total_gravadas} questões | quarentena: {totais['quarentena']} "
+          f"| duplicadas: {totais['duplicadas']} | quase duplicadas: {totais['quase_duplicadas']} "
+          f"({relatorio.total_grupos_quase_duplicados} grupos) | inválidas: {totais['invalidas']} "
+          f"| reparadas: {totais['reparadas']}")
+    if relatorio.validacao:
+        print("Validação: " + ', '.join(f"{regra}: {total}" for regra, total in relatorio.validacao.items()))
+    for d in [d for d in relatorio.diagnosticos if d['acao'] == 'quarentena'][:20]:
+        print(f"   -> {d['arquivo']}:{d['linha']}: {d['motivo']} ({d['detalhe']})")
+    for grupo in relatorio.grupos_quase_duplicados[:10]:
+        mantida = grupo['mantida']
+        removidas = ', '.join(f"{r['arquivo']}:{r['linha']} ({r['similaridade']:.2f})" for r in grupo['removidas'])
+        print(f"   ~> mantida {mantida['arquivo']}:{mantida['linha']}, removidas {removidas}")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valida, conserta, deduplica e unifica CSVs de questões.")
+    parser.add_argument('entradas', nargs='+', help="CSVs de entrada, do mais antigo para o mais novo")
+    parser.add_argument('--saida', default='questoes.csv')
+    parser.add_argument('--quarentena', default='questoes_quarentena.csv')
+    parser.add_argument('--relatorio', default='relatorio_ingestao.json')
+    parser.add_argument('--manter', choices=['ultima', 'primeira'], default='ultima',
+                        help="qual ocorrência de uma questão duplicada fica (padrão: a última)")
+    parser.add_argument('--verificar', action='store_true', help="só audita: não grava banco nem quarentena")
+    parser.add_argument('--similaridade', type=float, default=quase_duplicatas.LIMIAR_SIMILARIDADE,
+                        help="similaridade (0 a 1) a partir da qual duas questões são quase duplicadas; 0 desliga")
+    args = parser.parse_args()
+
+    faltando = [e for e in args.entradas if not os.path.exists(e)]
+    if faltando:
+        print(f"❌ ERRO CRÍTICO: Arquivo(s) não encontrado(s): {faltando}")
+        sys.exit(1)
+
+    inicio = time.perf_counter()
+    relatorio = ingerir(
+        args.entradas,
+        saida=None if args.verificar else args.saida,
+        quarentena=None if args.verificar else args.quarentena,
+        manter=args.manter,
+        similaridade=args.similaridade,
+    )
+    dados = relatorio.para_dict()
+    dados["duracao_s"] = round(time.perf_counter() - inicio, 3)
+    with open(args.relatorio, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+
+    imprimir_resumo(relatorio)
+    if args.verificar:
+        print(f"Auditoria concluída (nada foi gravado). Relatório: '{args.relatorio}'")
+    else:
+        print(f"🎉 Banco gravado em '{args.saida}'. Relatório: '{args.relatorio}'")
+        print("PRÓXIMO PASSO: rode 'flask compile-bank' para atualizar o snapshot.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Migrações de esquema versionadas (só para frente) ---
+# ---
+# O 'flask init-db' apaga tudo (drop_all + create_all): o esquema não podia evoluir
+# sem perder dados. Agora cada mudança é uma migração numerada em MIGRACOES, e a
+# tabela 'versao_esquema' guarda quais já rodaram. 'flask db-upgrade' aplica as que
+# faltam, em ordem, cada uma na sua transação (junto com o registro da versão).
+#
+# Regras para novas migrações:
+#   - nunca editar uma migração que já foi publicada: crie a próxima;
+#   - não há "downgrade": para desfazer, escreva outra migração para frente;
+#   - cada migração descreve as tabelas como elas eram na versão dela (Tables próprias,
+#     num MetaData só dela), nunca a partir dos modelos do app.py: os modelos mudam, a
+#     migração não. Assim um banco novo passa pelos mesmos passos que um antigo;
+#   - escrever DDL idempotente (IF NOT EXISTS / checkfirst): bancos criados pelo
+#     create_all de antes das migrações já têm as tabelas da base;
+#   - SQL que funcione no SQLite e no PostgreSQL (os dois bancos do app).
+#
+# No PostgreSQL, CREATE INDEX trava as escritas na tabela enquanto roda; com tabelas
+# grandes, rode o db-upgrade numa janela de manutenção.
+from sqlalchemy import (Boolean, Column, DateTime, Float, Index, Integer, LargeBinary, MetaData, String, Table,
+                        Text, UniqueConstraint, func, inspect, text)
+
+import revisao_espacada
+
+TABELA_VERSAO = 'versao_esquema'
+
+
+def _criar_indice(conexao, nome, tabela, colunas):
+    conexao.execute(text(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({', '.join(colunas)})"))
+
+
+def _adicionar_coluna(conexao, tabela, coluna, tipo):
+    # O SQLite não tem ADD COLUMN IF NOT EXISTS: confere antes
+    if coluna not in {c['name'] for c in inspect(conexao).get_columns(tabela)}:
+        conexao.execute(text(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}"))
+
+
+def _tabelas_base():
+    '''As tabelas do app antes das migrações (o que o create_all do init-db criava).'''
+    base = MetaData()
+    Table('resultados_simulados', base,
+          Column('id', Integer, primary_key=True),
+          Column('usuario_id', Integer, nullable=False),
+          Column('data', DateTime, server_default=func.now()),
+          Column('total_questoes', Integer, nullable=False),
+          Column('total_acertos', Integer, nullable=False),
+          Column('percentual_acerto', Float, nullable=False),
+          Column('tipo_simulado', String(50)))
+    Table('respostas_usuarios', base,
+          Column('id', Integer, primary_key=True),
+          Column('usuario_id', Integer, nullable=False),
+          Column('questao_id', Integer, nullable=False),
+          Column('acertou', Boolean, nullable=False),
+          Column('data_resposta', DateTime, server_default=func.now()),
+          Column('disciplina', String(100)))
+    Table('metas_usuarios', base,
+          Column('id', Integer, primary_key=True),
+          Column('usuario_id', Integer, nullable=False),
+          Column('tipo_meta', String(100), nullable=False),
+          Column('valor_meta', Float, nullable=False),
+          Column('valor_atual', Float),
+          Column('concluida', Boolean))
+    Table('desempenho_areas', base,
+          Column('id', Integer, primary_key=True),
+          Column('usuario_id', Integer, nullable=False),
+          Column('area', String(100), nullable=False),
+          Column('total_questoes', Integer),
+          Column('total_acertos', Integer),
+          Column('percentual_acerto', Float),
+          UniqueConstraint('usuario_id', 'area', name='_usuario_area_uc'))
+    Table('questoes_vistas', base,
+          Column('usuario_id', Integer, primary_key=True, autoincrement=False),
+          Column('bits', LargeBinary, nullable=False),
+          Column('total', Integer, nullable=False),
+          Column('atualizado_em', DateTime, server_default=func.now()))
+    Table('estatisticas_usuarios', base,
+          Column('usuario_id', Integer, primary_key=True, autoincrement=False),
+          Column('total_simulados', Integer, nullable=False),
+          Column('soma_percentuais', Float, nullable=False),
+          Column('total_acertos', Integer, nullable=False),
+          Column('total_questoes', Integer, nullable=False),
+          Column('ultima_atividade', DateTime))
+    Table('sessoes_simulado', base,
+          Column('chave', String(32), primary_key=True),
+          Column('dados', LargeBinary, nullable=False),
+          Column('expira_em', Float, nullable=False),
+          Index('ix_sessoes_simulado_expira_em', 'expira_em'))
+    Table('questoes', base,
+          Column('id', Integer, primary_key=True, autoincrement=False),
+          Column('disciplina', String(200), nullable=False),
+          Column('materia', String(200), nullable=False),
+          Column('banca', String(100), nullable=False),
+          Column('dificuldade', String(50), nullable=False),
+          Column('enunciado', Text, nullable=False),
+          *[Column(f'alternativa_{letra}', Text, nullable=False) for letra in 'abcde'],
+          Column('resposta_correta', String(10), nullable=False),
+          Column('justificativa', Text, nullable=False),
+          Column('dica', Text, nullable=False),
+          Column('formula', Text, nullable=False),
+          Column('payload', Text, nullable=False),
+          Index('ix_questoes_disciplina_banca_dificuldade', 'disciplina', 'banca', 'dificuldade'))
+    Table('info_banco_questoes', base,
+          Column('id', Integer, primary_key=True),
+          Column('versao', String(64), nullable=False),
+          Column('total_questoes', Integer, nullable=False),
+          Column('total_invalidas', Integer, nullable=False),
+          Column('carregado_em', DateTime, server_default=func.now()))
+    return base
+
+
+def _tabela_estado_revisao(metadata):
+    return Table('estado_revisao', metadata,
+                 Column('usuario_id', Integer, primary_key=True, autoincrement=False),
+                 Column('questao_id', Integer, primary_key=True, autoincrement=False),
+                 Column('repeticoes', Integer, nullable=False),
+                 Column('intervalo', Float, nullable=False),
+                 Column('facilidade', Float, nullable=False),
+                 Column('revisar_em', DateTime, nullable=False),
+                 Column('atualizado_em', DateTime, nullable=False))
+
+
+def migracao_001_tabelas(conexao):
+    # Base: as tabelas de antes das migrações (checkfirst: as que já existem ficam como estão)
+    _tabelas_base().create_all(conexao, checkfirst=True)
+
+
+def migracao_002_indices_consultas_quentes(conexao):
+    # Um índice por consulta frequente do app.py (ver consultas_quentes() e 'flask db-check-indexes')
+    _criar_indice(conexao, 'ix_respostas_usuarios_usuario_acertou', 'respostas_usuarios',
+                  ['usuario_id', 'acertou', 'questao_id'])
+    _criar_indice(conexao, 'ix_resultados_simulados_usuario', 'resultados_simulados',
+                  ['usuario_id', 'data', 'percentual_acerto', 'total_acertos', 'total_questoes'])
+    _criar_indice(conexao, 'ix_metas_usuarios_usuario_concluida_tipo', 'metas_usuarios',
+                  ['usuario_id', 'concluida', 'tipo_meta'])
+    _criar_indice(conexao, 'ix_desempenho_areas_usuario_percentual', 'desempenho_areas',
+                  ['usuario_id', 'percentual_acerto'])
+    _criar_indice(conexao, 'ix_sessoes_simulado_expira_em', 'sessoes_simulado', ['expira_em'])
+    # O índice de estratos cobre filtro + GROUP BY (dificuldade, materia); o antigo é prefixo dele
+    _criar_indice(conexao, 'ix_questoes_estratos', 'questoes', ['disciplina', 'banca', 'dificuldade', 'materia'])
+    conexao.execute(text("DROP INDEX IF EXISTS ix_questoes_disciplina_banca_dificuldade"))
+    _criar_indice(conexao, 'ix_questoes_banca', 'questoes', ['banca']) # Catálogo de bancas e filtro só por banca
+
+
+def migracao_003_agenda_revisao(conexao):
+    # Tabela da revisão espaçada (SM-2), preenchida repassando o histórico de respostas
+    metadata = _tabelas_base()
+    estados = _tabela_estado_revisao(metadata)
+    estados.create(conexao, checkfirst=True)
+    _criar_indice(conexao, 'ix_estado_revisao_usuario_revisar_em', 'estado_revisao',
+                  ['usuario_id', 'revisar_em', 'questao_id'])
+    if conexao.execute(text("SELECT 1 FROM estado_revisao LIMIT 1")).first() is None:
+        revisao_espacada.recalcular(conexao, metadata.tables['respostas_usuarios'], estados)
+
+
+def migracao_004_trabalhos_redacao(conexao):
+    # Fila persistente das correções de redação
+    Table('trabalhos_redacao', MetaData(),
+          Column('id', String(32), primary_key=True),
+          Column('estado', String(20), nullable=False),
+          Column('tema', Text, nullable=False),
+          Column('enunciado', Text),
+          Column('texto', Text, nullable=False),
+          Column('correcao', Text),
+          Column('origem', String(20)),
+          Column('degradado', Boolean, nullable=False),
+          Column('erro', Text),
+          Column('criado_em', Float, nullable=False),
+          Column('atualizado_em', Float, nullable=False)).create(conexao, checkfirst=True)
+    _criar_indice(conexao, 'ix_trabalhos_redacao_criado_em', 'trabalhos_redacao', ['criado_em'])
+
+
+def migracao_005_cache_correcoes(conexao):
+    # Cache persistente das correções e a chave delas nos trabalhos (envios iguais viram um só)
+    Table('correcoes_cache', MetaData(),
+          Column('chave', String(64), primary_key=True),
+          Column('modelo', String(100), nullable=False),
+          Column('correcao', Text, nullable=False),
+          Column('criado_em', Float, nullable=False)).create(conexao, checkfirst=True)
+    _criar_indice(conexao, 'ix_correcoes_cache_criado_em', 'correcoes_cache', ['criado_em'])
+    _adicionar_coluna(conexao, 'trabalhos_redacao', 'chave', 'VARCHAR(64)')
+    _criar_indice(conexao, 'ix_trabalhos_redacao_chave', 'trabalhos_redacao', ['chave'])
+
+
+def migracao_006_indice_historico_respostas(conexao):
+    # O índice (usuario_id, acertou, questao_id) servia à revisão antiga, que hoje lê estado_revisao.
+    # No lugar, o histórico na ordem do rebuild-review (e do rebuild-seen), sem ordenar a tabela
+    conexao.execute(text("DROP INDEX IF EXISTS ix_respostas_usuarios_usuario_acertou"))
+    _criar_indice(conexao, 'ix_respostas_usuarios_historico', 'respostas_usuarios',
+                  ['usuario_id', 'questao_id', 'data_resposta', 'id', 'acertou'])
+
+
+
+def migracao_007_chaves_questoes(conexao):
+    # Versão do banco a que os ids gravados se referem + chave estável de cada posição (ver chaves_questoes.py).
+    # Fica vazia: o app grava a primeira linha quando ativa o banco
+    Table('chaves_questoes', MetaData(),
+          Column('id', Integer, primary_key=True, autoincrement=False),
+          Column('versao', String(64), nullable=False),
+          Column('chaves', LargeBinary, nullable=False),
+          Column('atualizado_em', DateTime, nullable=False)).create(conexao, checkfirst=True)
+
+
+MIGRACOES = [
+    (1, "Tabelas da base (antes das migrações)", migracao_001_tabelas),
+    (2, "Índices compostos para as consultas frequentes", migracao_002_indices_consultas_quentes),
+    (3, "Agenda da revisão espaçada (estado_revisao)", migracao_003_agenda_revisao),
+    (4, "Trabalhos de correção de redação (trabalhos_redacao)", migracao_004_trabalhos_redacao),
+    (5, "Cache das correções de redação (correcoes_cache)", migracao_005_cache_correcoes),
+    (6, "Índice do histórico de respostas (troca o de acertou)", migracao_006_indice_historico_respostas),
+    (7, "Chaves estáveis das questões (chaves_questoes)", migracao_007_chaves_questoes),
+]
+
+
+def _garantir_tabela_versao(conexao):
+    conexao.execute(text(f"CREATE TABLE IF NOT EXISTS {TABELA_VERSAO} ("
+                         "versao INTEGER PRIMARY KEY, "
+                         "descricao VARCHAR(200) NOT NULL, "
+                         "aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"))
+
+
+def versao_atual(motor):
+    '''Maior versão já aplicada (0 se nenhuma).'''
+    with motor.begin() as conexao:
+        _garantir_tabela_versao(conexao)
+        return conexao.execute(text(f"SELECT COALESCE(MAX(versao), 0) FROM {TABELA_VERSAO}")).scalar()
+
+
+def pendentes(motor):
+    atual = versao_atual(motor)
+    return [migracao for migracao in MIGRACOES if migracao[0] > atual]
+
+
+def aplicar(motor):
+    '''Aplica as migrações pendentes em ordem. Retorna [(versao, descricao)] das aplicadas.
+    Se uma falhar, a transação dela é desfeita e as seguintes não rodam.'''
+    aplicadas = []
+    for versao, descricao, migrar in pendentes(motor):
+        with motor.begin() as conexao:
+            migrar(conexao)
+            conexao.execute(text(f"INSERT INTO {TABELA_VERSAO} (versao, descricao) VALUES (:versao, :descricao)"),
+                            {"versao": versao, "descricao": descricao})
+        aplicadas.append((versao, descricao))
+    return aplicadas
+
+
+def apagar_tabela_versao(motor):
+    '''Para o init-db, que recomeça o banco do zero.'''
+    with motor.begin() as conexao:
+        conexao.execute(text(f"DROP TABLE IF EXISTS {TABELA_VERSAO}"))
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Detecção de questões quase duplicadas (MinHash + LSH) ---
+# ---
+# O drop_duplicates por enunciado só pega cópias idênticas byte a byte. Os lotes
+# gerados por IA trazem paráfrases da mesma questão, que o aluno acabava vendo duas
+# vezes no mesmo simulado. Aqui cada questão (enunciado + alternativas) vira um
+# conjunto de shingles de palavras, resumido numa assinatura MinHash de 64 valores;
+# a fração de valores iguais entre duas assinaturas estima a similaridade de
+# Jaccard dos dois conjuntos.
+#
+# Para não comparar todos os pares (quadrático), a assinatura é cortada em bandas
+# (LSH): só viram candidatas as questões que coincidem em pelo menos uma banda
+# inteira. Com 16 bandas de 4 valores, um par com Jaccard 0.8 vira candidato com
+# probabilidade > 99.9%; um par com 0.3, em ~12% das vezes (e é descartado na
+# verificação da assinatura).
+#
+# Tudo é vetorizado com numpy sobre os bytes utf-8 do lote (sem laço Python por
+# palavra): as palavras viram hashes polinomiais por soma de prefixos, e a assinatura
+# usa "one permutation hashing" (um hash por shingle, espalhado em 64 caixas, com as
+# caixas vazias preenchidas pela vizinha, por rotação). O custo é linear no número
+# de shingles e cada questão ocupa só 256 bytes depois de processada.
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+from banco_questoes import HEADER_ESPERADO
+
+N_PERMUTACOES = 64          # caixas da assinatura (potência de 2)
+N_BANDAS = 16
+TAMANHO_SHINGLE = 2         # shingles de 2 palavras seguidas
+LIMIAR_SIMILARIDADE = 0.8   # Jaccard estimado a partir do qual duas questões são "a mesma"
+
+CAMPOS_TEXTO = ('enunciado', 'alternativa_a', 'alternativa_b', 'alternativa_c', 'alternativa_d', 'alternativa_e')
+CAMPOS_OPCIONAIS = ('justificativa', 'dica', 'formula')
+_INDICES_TEXTO = [HEADER_ESPERADO.index(c) for c in CAMPOS_TEXTO]
+_INDICES_OPCIONAIS = [HEADER_ESPERADO.index(c) for c in CAMPOS_OPCIONAIS]
+
+_BASE = np.uint64(0x100000001b3)                # base do hash polinomial das palavras (ímpar)
+_BASE_INVERSA = np.uint64(pow(0x100000001b3, -1, 2 ** 64))
+_DOURADO = np.uint64(0x9e3779b97f4a7c15)
+_SEPARADOR_QUESTOES = 10                        # '\n'
+
+
+def _tabelas_de_bytes():
+    '''Tabelas de 256 posições para normalizar o texto direto nos bytes utf-8.
+
+    _CARACTERE: ASCII alfanumérico -> minúscula; outra pontuação ASCII -> 0 (separa
+    palavras); '\\n' -> '\\n' (separa questões); bytes >= 0x80 ficam como estão.
+    _LATIN1: segundo byte de um caractere 0xC3 xx (À..ÿ) -> letra ASCII sem acento,
+    ou 0 quando não há equivalente (ß, æ, ×...), e aí o caractere fica intacto.'''
+    caractere = np.zeros(256, dtype=np.uint8)
+    for b in range(256):
+        c = chr(b)
+        if b >= 0x80:
+            caractere[b] = b
+        elif c.isalnum():
+            caractere[b] = ord(c.lower())
+    caractere[_SEPARADOR_QUESTOES] = _SEPARADOR_QUESTOES
+    latin1 = np.zeros(256, dtype=np.uint8)
+    for b in range(0x80, 0xC0):
+        base = unicodedata.normalize('NFKD', chr(0xC0 + b - 0x80))[0].lower()
+        if base.isascii() and base.isalnum():
+            latin1[b] = ord(base)
+    return caractere, latin1
+
+
+_CARACTERE, _LATIN1 = _tabelas_de_bytes()
+
+
+def texto_da_questao(linha):
+    '''Enunciado + alternativas de uma linha com as 14 colunas do HEADER_ESPERADO.'''
+    return ' '.join(linha[i] for i in _INDICES_TEXTO)
+
+
+def pontuacao_da_questao(linha):
+    '''Quantos campos opcionais (justificativa, dica, fórmula) estão preenchidos.'''
+    return sum(1 for i in _INDICES_OPCIONAIS if linha[i].strip())
+
+
+def _misturar(x):
+    '''Finalizador do splitmix64, vetorizado: espalha os bits de um array uint64.'''
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def _bytes_normalizados(textos):
+    '''Os textos unidos por '\\n', em bytes: sem acentos (Latin-1), minúsculos e com a
+    pontuação (ASCII e aspas/travessões tipográficos U+2000..U+203F) trocada por 0.'''
+    dados = '\n'.join(t.replace('\n', ' ') for t in textos).encode('utf-8')
+    b = np.frombuffer(dados, dtype=np.uint8)
+    manter = np.ones(len(b), dtype=bool)
+    b = b.copy()
+
+    acentuados = np.flatnonzero(b[:-1] == 0xC3)
+    base = _LATIN1[b[acentuados + 1]]
+    dobraveis = acentuados[base != 0]
+    b[dobraveis + 1] = base[base != 0]
+    manter[dobraveis] = False
+
+    tipograficos = np.flatnonzero((b[:-2] == 0xE2) & (b[1:-1] == 0x80))
+    for deslocamento in range(3):
+        b[tipograficos + deslocamento] = 0
+    return _CARACTERE[b[manter]]
+
+
+class AssinaturasMinHash:
+    '''Acumula assinaturas MinHash (uint32, n_permutacoes por questão) lote a lote.
+
+    As questões recebem índices 0, 1, 2... na ordem em que são adicionadas. Só as
+    assinaturas ficam em memória; os textos não.'''
+
+    def __init__(self, n_permutacoes=N_PERMUTACOES, tamanho_shingle=TAMANHO_SHINGLE):
+        if n_permutacoes & (n_permutacoes - 1):
+            raise ValueError("n_permutacoes precisa ser potência de 2")
+        self.n_permutacoes = n_permutacoes
+        self.tamanho_shingle = tamanho_shingle
+        self._bits_caixa = n_permutacoes.bit_length() - 1
+        self._cache_potencias = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64))
+        self._lotes = []
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def _palavras(self, textos):
+        '''(hash de cada palavra, índice da questão dona de cada palavra), no lote.'''
+        c = _bytes_normalizados(textos)
+        eh_palavra = (c != 0) & (c != _SEPARADOR_QUESTOES)
+        borda = np.diff(eh_palavra.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+        inicios, fins = np.flatnonzero(borda == 1), np.flatnonzero(borda == -1)
+
+        # hash(palavra) = soma de c[j] * B^(j - inicio): diferença de somas de prefixos
+        # vezes B^-inicio (tudo módulo 2^64, que é o estouro natural do uint64)
+        potencias, inversas = self._potencias(len(c))
+        prefixos = np.zeros(len(c) + 1, dtype=np.uint64)
+        np.cumsum(c * potencias[:len(c)], out=prefixos[1:])
+        hashes = (prefixos[fins] - prefixos[inicios]) * inversas[inicios]
+
+        donos = np.searchsorted(np.flatnonzero(c == _SEPARADOR_QUESTOES), inicios)
+        return _misturar(hashes), donos
+
+    def _potencias(self, tamanho):
+        '''B^1..B^tamanho e B^-1..B^-tamanho, calculadas uma vez e reaproveitadas entre lotes.'''
+        if len(self._cache_potencias[0]) < tamanho:
+            tamanho = max(tamanho, 2 * len(self._cache_potencias[0]))
+            self._cache_potencias = (np.cumprod(np.full(tamanho, _BASE, dtype=np.uint64)),
+                                     np.cumprod(np.full(tamanho, _BASE_INVERSA, dtype=np.uint64)))
+        return self._cache_potencias
+
+    def _shingles(self, textos):
+        '''(hash de cada shingle, índice da questão dona de cada shingle), no lote.'''
+        n = len(textos)
+        palavras, donos = self._palavras(textos)
+        k = self.tamanho_shingle
+        m = max(len(palavras) - k + 1, 0)
+        shingles = palavras[:m]
+        for j in range(1, k):
+            shingles = _misturar(shingles * _DOURADO + palavras[j:j + m])
+        validos = donos[:m] == donos[k - 1:k - 1 + m]   # as k palavras são da mesma questão
+        hashes, donos_shingles = [shingles[validos]], [donos[:m][validos]]
+
+        # Textos com menos de k palavras: um shingle só, com a primeira palavra
+        tamanhos = np.bincount(donos, minlength=n)
+        primeiras = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+        curtas = np.flatnonzero((tamanhos > 0) & (tamanhos < k))
+        hashes.append(palavras[primeiras[curtas]])
+        donos_shingles.append(curtas)
+        # Sem nenhuma palavra: um hash único por questão, para não casar com ninguém
+        vazias = np.flatnonzero(tamanhos == 0)
+        hashes.append(_misturar(np.uint64(2 ** 63) + (self._n + vazias).astype(np.uint64)))
+        donos_shingles.append(vazias)
+        return np.concatenate(hashes), np.concatenate(donos_shingles)
+
+    def adicionar(self, textos):
+        '''Calcula e guarda as assinaturas de uma lista de textos.'''
+        if not textos:
+            return
+        n, caixas = len(textos), self.n_permutacoes
+        hashes, donos = self._shingles(textos)
+
+        # One permutation hashing: os bits de cima escolhem a caixa, os de baixo são o valor
+        caixa = (hashes >> np.uint64(64 - self._bits_caixa)).astype(np.int64)
+        vazia = np.uint64(1 << 32)
+        minimos = np.full(n * caixas, vazia, dtype=np.uint64)
+        np.minimum.at(minimos, donos * caixas + caixa, hashes & np.uint64(0xffffffff))
+        minimos = minimos.reshape(n, caixas)
+
+        # Caixa vazia recebe o valor da próxima caixa cheia (circular) + um deslocamento
+        # que depende da distância, para duas questões só coincidirem ali se coincidem lá
+        posicoes = np.arange(2 * caixas)
+        cheia = np.tile(minimos != vazia, 2)
+        proxima = np.where(cheia, posicoes, 2 * caixas)
+        proxima = np.minimum.accumulate(proxima[:, ::-1], axis=1)[:, ::-1][:, :caixas]
+        distancia = (proxima - posicoes[:caixas]).astype(np.uint64)
+        valores = np.take_along_axis(minimos, proxima % caixas, axis=1) + distancia * _DOURADO
+        self._lotes.append((valores & np.uint64(0xffffffff)).astype(np.uint32))
+        self._n += n
+
+    def matriz(self):
+        if len(self._lotes) != 1:
+            self._lotes = [np.vstack(self._lotes) if self._lotes else
+                           np.empty((0, self.n_permutacoes), dtype=np.uint32)]
+        return self._lotes[0]
+
+
+def similaridade(assinaturas, i, j):
+    '''Jaccard estimado entre as questões i e j (arrays de índices ou inteiros).'''
+    return (assinaturas[i] == assinaturas[j]).mean(axis=-1)
+
+
+def pares_candidatos(assinaturas, n_bandas=N_BANDAS):
+    '''Pares (i, j) que coincidem em pelo menos uma banda inteira da assinatura.
+
+    Dentro de cada balde, cada questão é pareada com a primeira do balde (e não com
+    todas as outras): o número de pares fica linear mesmo com baldes enormes, e o
+    agrupamento por componentes conexas liga o resto.'''
+    n, n_permutacoes = assinaturas.shape
+    linhas_por_banda = n_permutacoes // n_bandas
+    primeiros, outros = [], []
+    for banda in range(n_bandas):
+        colunas = assinaturas[:, banda * linhas_por_banda:(banda + 1) * linhas_por_banda].astype(np.uint64)
+        chave = np.zeros(n, dtype=np.uint64)
+        for c in range(linhas_por_banda):
+            chave = _misturar(chave * np.uint64(0x9e3779b97f4a7c15) + colunas[:, c])
+        ordem = np.argsort(chave, kind='stable')
+        ordenada = chave[ordem]
+        novo = np.ones(n, dtype=bool)
+        novo[1:] = ordenada[1:] != ordenada[:-1]
+        inicio_balde = np.maximum.accumulate(np.where(novo, np.arange(n), 0))
+        primeiros.append(ordem[inicio_balde][~novo])
+        outros.append(ordem[~novo])
+    if not primeiros:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    i, j = np.concatenate(primeiros), np.concatenate(outros)
+    codigos = np.unique(np.minimum(i, j).astype(np.int64) * n + np.maximum(i, j))
+    return codigos // n, codigos % n
+
+
+def agrupar(assinaturas, limiar=LIMIAR_SIMILARIDADE, n_bandas=N_BANDAS):
+    '''Agrupa as questões quase duplicadas.
+
+    Retorna uma lista de grupos (listas de índices em ordem crescente, com 2 ou mais
+    questões) e um dict {(i, j): similaridade} com os pares confirmados.'''
+    i, j = pares_candidatos(assinaturas, n_bandas)
+    sim = np.empty(len(i))
+    for inicio in range(0, len(i), 1 << 16):
+        fatia = slice(inicio, inicio + (1 << 16))
+        sim[fatia] = similaridade(assinaturas, i[fatia], j[fatia])
+    confirmados = sim >= limiar
+    i, j, sim = i[confirmados], j[confirmados], sim[confirmados]
+
+    # Union-find só sobre as questões que aparecem em algum par confirmado
+    pai = {}
+
+    def raiz(x):
+        while pai.setdefault(x, x) != x:
+            pai[x] = pai[pai[x]]
+            x = pai[x]
+        return x
+
+    for a, b in zip(i.tolist(), j.tolist()):
+        ra, rb = raiz(a), raiz(b)
+        if ra != rb:
+            pai[max(ra, rb)] = min(ra, rb)
+    grupos = defaultdict(list)
+    for x in sorted(pai):
+        grupos[raiz(x)].append(x)
+    pares = dict(zip(zip(i.tolist(), j.tolist()), sim.tolist()))
+    return [g for _, g in sorted(grupos.items())], pares
+
+
+def escolher_mantida(grupo, pontuacoes, manter='ultima'):
+    '''A questão que fica: a mais completa (justificativa, dica, fórmula); no empate,
+    a última (ou a primeira, com manter='primeira'), como na deduplicação exata.'''
+    if manter == 'ultima':
+        return max(reversed(grupo), key=lambda q: pontuacoes[q])
+    return max(grupo, key=lambda q: pontuacoes[q])
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Questões já vistas por usuário (bitset compacto) ---
+# ---
+# O iniciar_simulado ignorava o histórico, e o aluno recebia de novo questões que
+# já tinha respondido. Filtrar com "NOT IN (SELECT questao_id FROM respostas_usuarios)"
+# cresce com o histórico; aqui cada usuário tem um bitset (bit i = questão i já
+# respondida), gravado comprimido numa linha da tabela 'questoes_vistas'.
+#
+# - responder_questao liga um bit (lê a linha, liga, grava);
+# - o sorteio testa os ids candidatos de uma vez, com operações de bit em numpy.
+#
+# Tamanho: 1 bit por questão do banco (300 mil questões = 37 KB), e o zlib reduz
+# isso a poucos KB para quem respondeu uma fração pequena do banco.
+import zlib
+
+import numpy as np
+
+NIVEL_COMPRESSAO = 1 # Grava a cada resposta: o nível 1 é ~3x mais rápido e quase do mesmo tamanho
+
+
+class ConjuntoBits:
+    '''Conjunto de ids inteiros não negativos, 1 bit por id (ordem de bits little-endian).'''
+
+    def __init__(self, bits=b''):
+        self.bits = bytearray(bits)
+
+    @classmethod
+    def de_ids(cls, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return cls()
+        marcados = np.zeros(int(ids.max()) + 1, dtype=bool)
+        marcados[ids] = True
+        return cls(np.packbits(marcados, bitorder='little').tobytes())
+
+    @classmethod
+    def de_bytes(cls, dados):
+        '''O inverso de para_bytes().'''
+        return cls(zlib.decompress(dados) if dados else b'')
+
+    def para_bytes(self):
+        return zlib.compress(bytes(self.bits.rstrip(b'\0')), NIVEL_COMPRESSAO)
+
+    def __len__(self):
+        return int.from_bytes(self.bits, 'little').bit_count()
+
+    def __contains__(self, i):
+        return i >> 3 < len(self.bits) and bool(self.bits[i >> 3] >> (i & 7) & 1)
+
+    def adicionar(self, i):
+        '''Liga o bit i. Retorna True se ele estava desligado.'''
+        if i in self:
+            return False
+        if i >> 3 >= len(self.bits):
+            self.bits.extend(bytes((i >> 3) + 1 - len(self.bits)))
+        self.bits[i >> 3] |= 1 << (i & 7)
+        return True
+
+    def contem(self, ids):
+        '''Máscara bool: quais dos ids (array) estão no conjunto. Custo O(len(ids)).'''
+        ids = np.asarray(ids, dtype=np.int64)
+        bytes_ = np.frombuffer(self.bits, dtype=np.uint8)
+        mascara = np.zeros(len(ids), dtype=bool)
+        dentro = (ids >> 3) < len(bytes_)
+        mascara[dentro] = (bytes_[ids[dentro] >> 3] >> (ids[dentro] & 7).astype(np.uint8)) & 1
+        return mascara
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Relatório de memória por worker do Gunicorn (RSS x PSS) ---
+# ---
+# Sobe o app com N workers, aquece todos (simulados, navegação, temas) e lê
+# /proc/<pid>/smaps_rollup do mestre e de cada worker (somente Linux).
+#
+#   RSS  = tudo o que o processo tem mapeado, contando páginas compartilhadas inteiras
+#   PSS  = páginas compartilhadas divididas pelo número de processos que as usam
+#          (a soma do PSS é a memória que o conjunto realmente ocupa)
+#
+# Uso:
+#   python relatorio_memoria.py --workers 4
+#   python relatorio_memoria.py --workers 4 --comparar-com <commit>   (antes x depois)
+#   python relatorio_memoria.py --workers 4 --multiplicar 20          (banco 20x maior)
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import urllib.request
+
+import pandas as pd
+
+PASTA_ATUAL = os.path.dirname(os.path.abspath(__file__))
+CAMPOS_SMAPS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def copiar_arvore(destino, ref=None):
+    '''Copia o app para 'destino': a pasta atual, ou a revisão 'ref' do git.'''
+    if ref is None:
+        shutil.copytree(PASTA_ATUAL, destino, ignore=shutil.ignore_patterns(
+            '.git', '__pycache__', 'instance', '*.BAK-*', 'questoes.bank', '*.db'))
+        return
+    arquivo = subprocess.run(['git', 'archive', ref], cwd=PASTA_ATUAL, check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(arquivo)) as tar:
+        tar.extractall(destino)
+
+
+def multiplicar_csv(pasta, fator):
+    caminho = os.path.join(pasta, 'questoes.csv')
+    df = pd.read_csv(caminho, sep=';', encoding='utf-8-sig', dtype=str)
+    pd.concat([df] * fator, ignore_index=True).to_csv(caminho, sep=';', index=False, encoding='utf-8-sig')
+
+
+def ler_smaps(pid):
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linha in f:
+            partes = linha.split()
+            if partes and partes[0].rstrip(':') in CAMPOS_SMAPS:
+                valores[partes[0].rstrip(':')] = int(partes[1]) # kB
+    return valores
+
+
+def filhos(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        resultado = []
+        for nome in os.listdir('/proc'):
+            if nome.isdigit():
+                try:
+                    with open(f'/proc/{nome}/stat') as f:
+                        if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                            resultado.append(int(nome))
+                except OSError:
+                    pass
+        return resultado
+
+
+def aquecer(url, requisicoes):
+    '''Distribui requisições entre os workers: catálogo, temas, simulados e navegação.'''
+    areas = json.load(urllib.request.urlopen(f'{url}/api/areas'))['areas']
+    for i in range(requisicoes):
+        cliente = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        cliente.open(f'{url}/api/bancas').read()
+        cliente.open(f'{url}/api/redacao/temas-melhorados').read()
+        area = areas[i % len(areas)]
+        corpo = json.dumps({"areas": area['sub_materias'], "quantidade": "20"}).encode()
+        pedido = urllib.request.Request(f'{url}/api/simulado/iniciar', corpo, {'Content-Type': 'application/json'})
+        total = json.load(cliente.open(pedido))['total_questoes']
+        for indice in range(total):
+            cliente.open(f'{url}/api/simulado/questao/{indice}').read()
+
+
+def medir(pasta, workers, requisicoes):
+    porta = porta_livre()
+    ambiente = dict(os.environ,
+                    DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'relatorio.db')}",
+                    INTERVALO_VERIFICACAO_BANCO='0')
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{porta}', 'app:app'],
+        cwd=pasta, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{porta}'
+    try:
+        for _ in range(600):
+            try:
+                urllib.request.urlopen(f'{url}/api/bancas', timeout=1).read()
+                if len(filhos(processo.pid)) == workers:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.1)
+        else:
+            raise RuntimeError("o gunicorn não subiu a tempo")
+        aquecer(url, requisicoes)
+        time.sleep(0.5)
+        return [('mestre', processo.pid, ler_smaps(processo.pid))] + \
+               [('worker', pid, ler_smaps(pid)) for pid in sorted(filhos(processo.pid))]
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def imprimir(titulo, medicoes):
+    mb = lambda kb: f"{kb / 1024:8.1f}"
+    print(f"\n--- {titulo} ---")
+    print(f"{'processo':<8} {'pid':>7} {'RSS MB':>8} {'PSS MB':>8} {'Compart.':>8} {'Privado':>8}")
+    for papel, pid, m in medicoes:
+        compartilhado = m['Shared_Clean'] + m['Shared_Dirty']
+        privado = m['Private_Clean'] + m['Private_Dirty']
+        print(f"{papel:<8} {pid:>7} {mb(m['Rss'])} {mb(m['Pss'])} {mb(compartilhado)} {mb(privado)}")
+    workers = [m for papel, _, m in medicoes if papel == 'worker']
+    print(f"{'':<8} {'':>7} {'-' * 8} {'-' * 8}")
+    print(f"{'total':<8} {'':>7} {mb(sum(m['Rss'] for _, _, m in medicoes))} {mb(sum(m['Pss'] for _, _, m in medicoes))}")
+    if workers:
+        print(f"PSS médio por worker: {sum(m['Pss'] for m in workers) / len(workers) / 1024:.1f} MB")
+    return sum(m['Pss'] for _, _, m in medicoes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede RSS/PSS do mestre e de cada worker do Gunicorn.")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--comparar-com', metavar='REF', help="revisão do git medida como 'antes'")
+    parser.add_argument('--multiplicar', type=int, default=1, help="replica o banco de questões N vezes")
+    parser.add_argument('--requisicoes', type=int, default=40, help="simulados de aquecimento")
+    args = parser.parse_args()
+
+    cenarios = [('depois (árvore atual)', None)]
+    if args.comparar_com:
+        cenarios.insert(0, (f'antes ({args.comparar_com})', args.comparar_com))
+
+    totais = {}
+    for titulo, ref in cenarios:
+        with tempfile.TemporaryDirectory() as pasta:
+            destino = os.path.join(pasta, 'app')
+            copiar_arvore(destino, ref)
+            if args.multiplicar > 1:
+                multiplicar_csv(destino, args.multiplicar)
+            totais[titulo] = imprimir(titulo, medir(destino, args.workers, args.requisicoes))
+
+    if len(totais) == 2:
+        antes, depois = totais.values()
+        print(f"\nPSS total: {antes / 1024:.1f} MB -> {depois / 1024:.1f} MB ({(1 - depois / antes) * 100:.0f}% a menos)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Agendamento da revisão espaçada (SM-2) ---
+# ---
+# A revisão sorteava 10 linhas de todas as respostas erradas do usuário (ORDER BY
+# random() sobre o histórico inteiro) e não tinha nada de "espaçada". Agora cada par
+# (usuário, questão) que já foi errado tem um estado: repetições seguidas certas,
+# intervalo em dias, fator de facilidade e a data da próxima revisão. Cada resposta
+# atualiza o estado, e "iniciar revisão" lê só as questões vencidas pelo índice
+# (usuario_id, revisar_em).
+#
+# Regras (SM-2 com a resposta binária do simulado):
+#   - acerto vale nota NOTA_ACERTO, erro vale NOTA_ERRO (escala 0-5 do SM-2);
+#   - erro: zera as repetições e a questão fica vencida na hora (o SM-2 repete na mesma
+#     sessão tudo que teve nota < 4, e era o que a revisão fazia: mostrar os erros);
+#   - acertos seguidos: 1 dia, 6 dias, depois intervalo anterior x facilidade;
+#   - facilidade começa em 2.5, muda pela fórmula do SM-2 e nunca fica abaixo de 1.3.
+# Só entra na agenda a questão que já foi errada alguma vez: acertar de primeira não
+# cria estado (não há o que revisar).
+import datetime
+
+from sqlalchemy import delete, insert, select
+
+FACILIDADE_INICIAL = 2.5
+FACILIDADE_MINIMA = 1.3
+NOTA_ACERTO = 4
+NOTA_ERRO = 1
+PRIMEIROS_INTERVALOS = (1.0, 6.0) # dias, para a 1ª e a 2ª repetição certa
+LOTE_RECALCULO = 5000
+
+
+def agendar(estado, acertou, quando):
+    '''Novo estado depois de uma resposta em 'quando' (datetime).
+    estado: dict com repeticoes, intervalo, facilidade (ou None se a questão não está na agenda).
+    Retorna o dict novo (com revisar_em) ou None se a questão continua fora da agenda.'''
+    if estado is None:
+        if acertou:
+            return None
+        estado = {"repeticoes": 0, "intervalo": 0.0, "facilidade": FACILIDADE_INICIAL}
+    nota = NOTA_ACERTO if acertou else NOTA_ERRO
+    facilidade = max(FACILIDADE_MINIMA,
+                     estado["facilidade"] + 0.1 - (5 - nota) * (0.08 + (5 - nota) * 0.02))
+    if not acertou:
+        repeticoes, intervalo = 0, 0.0
+    else:
+        repeticoes = estado["repeticoes"] + 1
+        if repeticoes <= len(PRIMEIROS_INTERVALOS):
+            intervalo = PRIMEIROS_INTERVALOS[repeticoes - 1]
+        else:
+            intervalo = round(estado["intervalo"] * estado["facilidade"], 2)
+    return {
+        "repeticoes": repeticoes,
+        "intervalo": intervalo,
+        "facilidade": round(facilidade, 4),
+        "revisar_em": quando + datetime.timedelta(days=intervalo),
+        "atualizado_em": quando,
+    }
+
+
+def consulta_historico(respostas):
+    '''Todas as respostas na ordem em que o SM-2 as repassa (o índice
+    ix_respostas_usuarios_historico entrega já nessa ordem, sem ordenar a tabela).
+    As de questões que saíram do banco (questao_id negativo, ver chaves_questoes.py) ficam de fora.'''
+    return (select(respostas.c.usuario_id, respostas.c.questao_id, respostas.c.acertou, respostas.c.data_resposta)
+            .where(respostas.c.questao_id >= 0)
+            .order_by(respostas.c.usuario_id, respostas.c.questao_id, respostas.c.data_resposta, respostas.c.id))
+
+
+def recalcular(conexao, respostas, estados):
+    '''Apaga e remonta a tabela de estados repassando todo o histórico de respostas em
+    ordem (respostas/estados: Tables do SQLAlchemy). Retorna quantos estados gravou.'''
+    conexao.execute(delete(estados))
+    linhas = conexao.execute(consulta_historico(respostas))
+    pendentes, total = [], 0
+    atual, estado = None, None
+
+    def fechar():
+        if estado is not None:
+            pendentes.append(dict(estado, usuario_id=atual[0], questao_id=atual[1]))
+
+    for usuario_id, questao_id, acertou, data_resposta in linhas:
+        if (usuario_id, questao_id) != atual:
+            fechar()
+            atual, estado = (usuario_id, questao_id), None
+            if len(pendentes) >= LOTE_RECALCULO:
+                conexao.execute(insert(estados), pendentes)
+                total += len(pendentes)
+                pendentes.clear()
+        estado = agendar(estado, bool(acertou), data_resposta or datetime.datetime(1970, 1, 1))
+    fechar()
+    if pendentes:
+        conexao.execute(insert(estados), pendentes)
+        total += len(pendentes)
+    return total
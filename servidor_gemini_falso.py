@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Servidor falso da API do Gemini (para testar o cliente_gemini.py) ---
+# ---
+# Responde generateContent e streamGenerateContent (o formato REST do SDK) com uma
+# correção válida, e pode imitar um Gemini doente: lento, travado ou devolvendo 503.
+# Não confere a chave.
+#
+# Uso:
+#   python servidor_gemini_falso.py                             (porta 8099, respostas normais)
+#   python servidor_gemini_falso.py --modo erro503              (sempre 503: o disjuntor abre)
+#   python servidor_gemini_falso.py --taxa-falhas 0.5           (metade dos pedidos dá 503)
+#   python servidor_gemini_falso.py --falhas-iniciais 2         (os 2 primeiros pedidos dão 503)
+#   python servidor_gemini_falso.py --modo travado              (nunca responde: testa o prazo)
+#   python servidor_gemini_falso.py --atraso-ms 3000            (cada resposta demora 3 s)
+#
+# E o app apontando para ele:
+#   GEMINI_API_KEY=falsa GEMINI_API_ENDPOINT=http://127.0.0.1:8099 GEMINI_PRAZO=5 flask --app app run
+#
+# Nos testes (test_cliente_gemini.py): servidor = iniciar_em_thread(modo='erro503'), o
+# cliente em servidor.endpoint e, no fim, encerrar(servidor).
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+CORRECAO = {
+    "nota_final": 720,
+    "competencias": [
+        {"nome": f"Competência {i}", "nota": nota, "comentario": f"Comentário do servidor falso para a competência {i}."}
+        for i, nota in enumerate((160, 140, 140, 160, 120), start=1)
+    ],
+    "pontos_fortes": ["(Servidor falso) Estrutura organizada"],
+    "pontos_fracos": ["(Servidor falso) Repertório pode ser ampliado"],
+    "sugestoes_melhoria": ["(Servidor falso) Desenvolver mais os exemplos"],
+}
+
+def resposta(texto):
+    return {"candidates": [{"content": {"parts": [{"text": texto}], "role": "model"},
+                            "finishReason": "STOP", "index": 0}]}
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def log_message(self, formato, *args):
+        if not self.config.silencioso:
+            print(f"INFO: {self.address_string()} {formato % args}")
+
+    def enviar_json(self, status, dados):
+        corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        caminho = self.path.split('?')[0]
+        contadores = self.server.contadores
+        with self.server.lock:
+            contadores["pedidos"] += 1
+            numero = contadores["pedidos"]
+        if not caminho.endswith((':generateContent', ':streamGenerateContent')):
+            self.enviar_json(404, {"error": {"code": 404, "message": "Rota desconhecida", "status": "NOT_FOUND"}})
+            return
+
+        if self.config.modo == 'travado':
+            self.server.parar.wait(3600) # Até encerrar(): o cliente tem que desistir pelo prazo dele
+            self.close_connection = True
+            return
+        time.sleep(self.config.atraso_ms / 1000)
+        if (self.config.modo == 'erro503' or numero <= self.config.falhas_iniciais
+                or random.random() < self.config.taxa_falhas):
+            with self.server.lock:
+                contadores["falhas"] += 1
+            self.enviar_json(503, {"error": {"code": 503, "message": "Servidor falso sobrecarregado",
+                                             "status": "UNAVAILABLE"}})
+            return
+
+        texto = json.dumps(CORRECAO, ensure_ascii=False, indent=2)
+        if caminho.endswith(':generateContent'):
+            self.enviar_json(200, resposta(texto))
+            return
+
+        # Fluxo: um array JSON de respostas, escrito aos poucos (chunked)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        tamanho = max(1, len(texto) // self.config.trechos)
+        trechos = [texto[i:i + tamanho] for i in range(0, len(texto), tamanho)]
+        for indice, trecho in enumerate(trechos):
+            pedaco = ('[' if indice == 0 else ',\r\n') + json.dumps(resposta(trecho), ensure_ascii=False)
+            if indice == len(trechos) - 1:
+                pedaco += ']'
+            dados = pedaco.encode('utf-8')
+            self.wfile.write(f"{len(dados):x}\r\n".encode() + dados + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.config.intervalo_ms / 1000)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def criar_servidor(porta=0, modo='ok', taxa_falhas=0.0, falhas_iniciais=0, atraso_ms=0.0, trechos=10,
+                   intervalo_ms=100.0, silencioso=True):
+    '''O servidor (ainda sem atender); porta=0 escolhe uma livre (ver servidor.endpoint).'''
+    servidor = ThreadingHTTPServer(('127.0.0.1', porta), Manipulador)
+    servidor.daemon_threads = True
+    servidor.config = SimpleNamespace(modo=modo, taxa_falhas=taxa_falhas, falhas_iniciais=falhas_iniciais,
+                                      atraso_ms=atraso_ms, trechos=trechos, intervalo_ms=intervalo_ms,
+                                      silencioso=silencioso)
+    servidor.contadores = {"pedidos": 0, "falhas": 0}
+    servidor.lock = threading.Lock()
+    servidor.parar = threading.Event()
+    servidor.endpoint = f"http://127.0.0.1:{servidor.server_address[1]}"
+    return servidor
+
+
+def iniciar_em_thread(**opcoes):
+    '''Servidor atendendo numa thread daemon (opções de criar_servidor).'''
+    servidor = criar_servidor(**opcoes)
+    threading.Thread(target=servidor.serve_forever, name='gemini-falso', daemon=True).start()
+    return servidor
+
+
+def encerrar(servidor):
+    servidor.parar.set()
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso da API do Gemini.")
+    parser.add_argument('--porta', type=int, default=8099)
+    parser.add_argument('--modo', choices=['ok', 'erro503', 'travado'], default='ok')
+    parser.add_argument('--taxa-falhas', type=float, default=0.0, help="fração dos pedidos que recebem 503")
+    parser.add_argument('--falhas-iniciais', type=int, default=0, help="quantos primeiros pedidos recebem 503")
+    parser.add_argument('--atraso-ms', type=float, default=0.0, help="espera antes de responder")
+    parser.add_argument('--trechos', type=int, default=10, help="em quantos trechos o fluxo é dividido")
+    parser.add_argument('--intervalo-ms', type=float, default=100.0, help="espera entre os trechos do fluxo")
+    parser.add_argument('--silencioso', action='store_true')
+    args = parser.parse_args()
+
+    servidor = criar_servidor(args.porta, args.modo, args.taxa_falhas, args.falhas_iniciais, args.atraso_ms,
+                              args.trechos, args.intervalo_ms, args.silencioso)
+    print(f"INFO: Servidor falso do Gemini em {servidor.endpoint} "
+          f"(modo {args.modo}, falhas {args.taxa_falhas:.0%}).")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(f"INFO: {servidor.contadores['pedidos']} pedidos, {servidor.contadores['falhas']} falhas simuladas.")
+
+
+if __name__ == '__main__':
+    main()
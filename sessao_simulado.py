@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Estado do simulado guardado no servidor ---
+# ---
+# Antes os ids sorteados e as respostas (com a disciplina, em texto) iam no cookie
+# assinado do Flask, e voltavam ao servidor a cada clique: um simulado de 100
+# questões chegava perto do limite de 4 KB. Agora o cookie leva só uma chave
+# aleatória, e o estado fica num armazém no servidor, com validade (TTL):
+#
+#   - ArmazemMemoria:  dicionário do processo (testes / um worker só). É também a
+#                      interface que um Redis implementaria com GET / SETEX / DEL;
+#   - ArmazemArquivos: um arquivo por simulado numa pasta (gravação atômica);
+#   - ArmazemSQL:      tabela 'sessoes_simulado' (no app.py, junto dos modelos).
+#
+# O estado é gravado num formato binário compacto (EstadoSimulado.codificar): os
+# ids viram uint32, cada resposta ocupa 8 bytes e as disciplinas ficam numa tabela
+# de textos sem repetição. Como o estado não depende do navegador, o simulado pode
+# ser retomado depois de fechar o navegador (enquanto o TTL não vencer).
+#
+# (NOVO) DescritorSimulado: (versão do banco, filtros, semente). Sortear de novo com a
+# mesma semente na mesma versão do banco dá os mesmos ids, na mesma ordem. Quando o
+# simulado sai só do descritor, o estado guarda o descritor no lugar da lista de ids
+# (tamanho fixo, qualquer que seja o número de questões), o descritor vira um link
+# ("o mesmo simulado do meu colega") e serve de chave para os pacotes em cache.
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import secrets
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+_MAGIA = b'SS'
+_VERSAO_FORMATO = 2 # (ALTERADO) v2: descritor no lugar dos ids; respostas pelo id da questão
+_CABECALHO = struct.Struct('<2sBIII')   # magia, versão, indice_atual, n_ids, n_respostas
+_RESPOSTA = struct.Struct('<IcBH')      # id da questão, alternativa, acertou, índice da disciplina
+_TAMANHO = struct.Struct('<H')
+_CHAVE_VALIDA = re.compile(r'^[0-9a-f]{32}$')
+
+INTERVALO_LIMPEZA = 600 # segundos entre varreduras de sessões vencidas (por processo)
+SEMENTE_BITS = 53 # Cabe num número do JavaScript sem perder precisão
+
+
+class EstadoInvalido(Exception):
+    pass
+
+
+def proporcoes_validas(proporcoes):
+    '''None ou {valor: peso >= 0}.'''
+    return proporcoes is None or (isinstance(proporcoes, dict) and all(
+        isinstance(p, (int, float)) and not isinstance(p, bool) and p >= 0 for p in proporcoes.values()))
+
+
+class DescritorSimulado:
+    '''Tudo o que define um simulado sorteado: versão do banco, filtros e semente.
+
+    As disciplinas são guardadas ordenadas: a ordem dos cliques na tela não muda o sorteio.'''
+
+    def __init__(self, versao_banco, disciplinas, banca=None, quantidade=10, estratificar=True,
+                 proporcoes_dificuldade=None, proporcoes_materia=None, semente=None):
+        self.versao_banco = versao_banco
+        self.disciplinas = sorted(set(disciplinas))
+        self.banca = banca
+        self.quantidade = int(quantidade)
+        self.estratificar = bool(estratificar)
+        self.proporcoes_dificuldade = proporcoes_dificuldade
+        self.proporcoes_materia = proporcoes_materia
+        self.semente = secrets.randbits(SEMENTE_BITS) if semente is None else semente
+
+    def _campos(self):
+        return [self.versao_banco, self.disciplinas, self.banca, self.quantidade, self.estratificar,
+                self.proporcoes_dificuldade, self.proporcoes_materia, self.semente]
+
+    def token(self):
+        '''Texto seguro para URL (base64 do JSON canônico dos campos).'''
+        texto = json.dumps(self._campos(), ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        return base64.urlsafe_b64encode(texto.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+    @property
+    def chave(self):
+        '''Identifica o simulado (mesmos ids) em caches: hash do token.'''
+        return hashlib.sha256(self.token().encode('ascii')).hexdigest()[:24]
+
+    @classmethod
+    def de_token(cls, token):
+        '''O inverso de token(). Levanta EstadoInvalido se o texto não é um descritor válido.'''
+        try:
+            texto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            versao, disciplinas, banca, quantidade, estratificar, prop_d, prop_m, semente = json.loads(texto)
+        except (TypeError, ValueError) as e:
+            raise EstadoInvalido(f"descritor ilegível: {e}")
+        if not (isinstance(versao, str) and isinstance(disciplinas, list) and disciplinas
+                and all(isinstance(d, str) for d in disciplinas) and (banca is None or isinstance(banca, str))
+                and type(quantidade) is int and quantidade > 0 and isinstance(estratificar, bool)
+                and proporcoes_validas(prop_d) and proporcoes_validas(prop_m)
+                and type(semente) is int and 0 <= semente < 2 ** SEMENTE_BITS):
+            raise EstadoInvalido("descritor com campos inválidos")
+        return cls(versao, disciplinas, banca, quantidade, estratificar, prop_d, prop_m, semente)
+
+    def depende_do_historico(self, banco, vistas):
+        '''(NOVO) Se 'vistas' (ConjuntoBits) pode mudar o sorteio: só quando alguma questão
+        dos filtros já foi vista. Um teste de bit por candidato, sem sortear nada.'''
+        if vistas is None or not vistas.bits:
+            return False
+        candidatos = banco.indice.filtrar(disciplina=self.disciplinas, banca=self.banca)
+        return bool(len(candidatos)) and bool(vistas.contem(candidatos).any())
+
+    def sortear(self, banco, vistas=None, excluir_vistas=False):
+        '''Os ids do simulado. Sem 'vistas', o resultado só depende do descritor (e do
+        banco estar na versao_banco); com 'vistas' depende também do histórico do usuário.'''
+        rng = random.Random(self.semente)
+        if self.estratificar:
+            return banco.sortear_estratificado(self.quantidade, self.proporcoes_dificuldade, self.proporcoes_materia,
+                                               disciplina=self.disciplinas, banca=self.banca,
+                                               vistas=vistas, excluir_vistas=excluir_vistas, rng=rng)
+        return banco.sortear(self.quantidade, vistas=vistas, excluir_vistas=excluir_vistas, rng=rng,
+                             disciplina=self.disciplinas, banca=self.banca)
+
+
+class CacheLRU:
+    '''Dicionário limitado a 'capacidade' itens; sai o usado há mais tempo.'''
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class EstadoSimulado:
+    '''O simulado em andamento: ids sorteados, respostas e de onde vieram.
+
+    respostas: {str(questao_id): {"alternativa_escolhida", "acertou", "disciplina"}},
+    o mesmo formato que ficava no cookie.
+
+    (NOVO) Com 'descritor', os ids não são gravados: quem lê o estado sorteia de novo
+    (ver DescritorSimulado) e preenche 'ids'. Só passe o descritor se os ids saíram dele.'''
+
+    def __init__(self, ids, tipo='normal', versao_banco='', respostas=None, indice_atual=0, descritor=None):
+        self.ids = [int(i) for i in ids]
+        self.tipo = tipo
+        self.versao_banco = versao_banco
+        self.respostas = respostas if respostas is not None else {}
+        self.indice_atual = indice_atual
+        self.descritor = descritor
+
+    def posicao(self, questao_id):
+        '''Posição da questão no simulado, ou -1 se ela não faz parte dele.'''
+        try:
+            return self.ids.index(int(questao_id))
+        except ValueError:
+            return -1
+
+    def codificar(self):
+        disciplinas = {}
+        respostas = []
+        for questao_id, resposta in self.respostas.items():
+            letra = resposta['alternativa_escolhida'].encode('utf-8')
+            disciplina = disciplinas.setdefault(resposta.get('disciplina') or '', len(disciplinas))
+            respostas.append(_RESPOSTA.pack(int(questao_id), letra if len(letra) == 1 else b'\0',
+                                            bool(resposta['acertou']), disciplina))
+        ids = [] if self.descritor else self.ids
+        partes = [
+            _CABECALHO.pack(_MAGIA, _VERSAO_FORMATO, self.indice_atual, len(ids), len(respostas)),
+            _texto(self.tipo), _texto(self.versao_banco),
+            _texto(self.descritor.token() if self.descritor else ''),
+            struct.pack(f'<{len(ids)}I', *ids),
+            _TAMANHO.pack(len(disciplinas)), *(_texto(d) for d in disciplinas),
+            *respostas,
+        ]
+        return b''.join(partes)
+
+    @classmethod
+    def decodificar(cls, dados):
+        try:
+            magia, versao, indice_atual, n_ids, n_respostas = _CABECALHO.unpack_from(dados, 0)
+            if magia != _MAGIA or versao != _VERSAO_FORMATO:
+                raise EstadoInvalido(f"formato desconhecido ({magia!r}, v{versao})")
+            posicao = _CABECALHO.size
+            tipo, posicao = _ler_texto(dados, posicao)
+            versao_banco, posicao = _ler_texto(dados, posicao)
+            token, posicao = _ler_texto(dados, posicao)
+            ids = list(struct.unpack_from(f'<{n_ids}I', dados, posicao))
+            posicao += 4 * n_ids
+            (n_disciplinas,) = _TAMANHO.unpack_from(dados, posicao)
+            posicao += _TAMANHO.size
+            disciplinas = []
+            for _ in range(n_disciplinas):
+                disciplina, posicao = _ler_texto(dados, posicao)
+                disciplinas.append(disciplina)
+            respostas = {}
+            for _ in range(n_respostas):
+                questao_id, letra, acertou, disciplina = _RESPOSTA.unpack_from(dados, posicao)
+                posicao += _RESPOSTA.size
+                respostas[str(questao_id)] = {
+                    "alternativa_escolhida": letra.strip(b'\0').decode('utf-8'),
+                    "acertou": bool(acertou),
+                    "disciplina": disciplinas[disciplina],
+                }
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise EstadoInvalido(str(e))
+        return cls(ids, tipo, versao_banco, respostas, indice_atual,
+                   DescritorSimulado.de_token(token) if token else None)
+
+
+def _texto(valor):
+    dados = valor.encode('utf-8')
+    return _TAMANHO.pack(len(dados)) + dados
+
+
+def _ler_texto(dados, posicao):
+    (tamanho,) = _TAMANHO.unpack_from(dados, posicao)
+    inicio = posicao + _TAMANHO.size
+    if inicio + tamanho > len(dados):
+        raise EstadoInvalido("texto truncado")
+    return bytes(dados[inicio:inicio + tamanho]).decode('utf-8'), inicio + tamanho
+
+
+def chave_valida(chave):
+    return isinstance(chave, str) and bool(_CHAVE_VALIDA.match(chave))
+
+
+# ---
+# --- Armazéns ---
+# ---
+class Armazem:
+    '''Interface: obter(chave) -> bytes | None, gravar(chave, dados, ttl), remover(chave)
+    e limpar_expiradas() -> quantas saíram. As chaves são hex de 32 caracteres.'''
+
+    def __init__(self):
+        self._proxima_limpeza = time.monotonic() + INTERVALO_LIMPEZA
+
+    def talvez_limpar(self):
+        '''Barato: varre as sessões vencidas no máximo uma vez a cada INTERVALO_LIMPEZA.'''
+        agora = time.monotonic()
+        if agora < self._proxima_limpeza:
+            return 0
+        self._proxima_limpeza = agora + INTERVALO_LIMPEZA
+        return self.limpar_expiradas()
+
+
+class ArmazemMemoria(Armazem):
+    def __init__(self):
+        super().__init__()
+        self._dados = {} # {chave: (expira_em, dados)}
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        item = self._dados.get(chave)
+        if item is None or item[0] < time.time():
+            return None
+        return item[1]
+
+    def gravar(self, chave, dados, ttl):
+        with self._lock:
+            self._dados[chave] = (time.time() + ttl, bytes(dados))
+
+    def remover(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def limpar_expiradas(self):
+        agora = time.time()
+        with self._lock:
+            vencidas = [c for c, (expira_em, _) in self._dados.items() if expira_em < agora]
+            for chave in vencidas:
+                del self._dados[chave]
+        return len(vencidas)
+
+
+class ArmazemArquivos(Armazem):
+    '''Um arquivo '<chave>.sim' por simulado: 8 bytes de validade (float64) + o estado.'''
+
+    _VALIDADE = struct.Struct('<d')
+
+    def __init__(self, pasta):
+        super().__init__()
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, chave):
+        if not chave_valida(chave):
+            raise ValueError("chave de sessão inválida")
+        return os.path.join(self.pasta, chave + '.sim')
+
+    def obter(self, chave):
+        try:
+            with open(self._caminho(chave), 'rb') as f:
+                dados = f.read()
+        except OSError:
+            return None
+        if len(dados) < self._VALIDADE.size or self._VALIDADE.unpack_from(dados)[0] < time.time():
+            return None
+        return dados[self._VALIDADE.size:]
+
+    def gravar(self, chave, dados, ttl):
+        caminho = self._caminho(chave)
+        temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporario, 'wb') as f:
+            f.write(self._VALIDADE.pack(time.time() + ttl) + dados)
+        os.replace(temporario, caminho) # Atômico: quem lê vê o estado antigo ou o novo, nunca metade
+
+    def remover(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except OSError:
+            pass
+
+    def limpar_expiradas(self):
+        agora, removidas = time.time(), 0
+        for nome in os.listdir(self.pasta):
+            if not nome.endswith('.sim'):
+                continue
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                with open(caminho, 'rb') as f:
+                    validade = f.read(self._VALIDADE.size)
+                if len(validade) < self._VALIDADE.size or self._VALIDADE.unpack(validade)[0] < agora:
+                    os.remove(caminho)
+                    removidas += 1
+            except OSError:
+                continue
+        return removidas
@@ -2,6 +2,7 @@
 let simuladoAtual = null;
 let questaoAtual = null;
 let simuladoTimerInterval = null; // (NOVO) Variável global do cronômetro
+let abrindoSimuladoCompartilhado = false; // (NOVO) Não oferece retomar outro simulado enquanto abre um link
 
 // Sistema de Cache Local
 const SessionManager = {
@@ -137,10 +138,8 @@ function navegarPara(tela) {
         const simuladoAtivoContainer = document.getElementById("simulado-ativo");
         const resultado = document.getElementById("tela-resultado");
         
-        // Verifica se há um simulado ativo na sessão
-        const simuladoIDs = SessionManager.get('simulado_ids');
-        
-        if (simuladoIDs && simuladoIDs.length > 0) {
+        // (ALTERADO) Verifica se há um simulado ativo nesta aba
+        if (simuladoAtual) {
             // Se sim, mostre o simulado ativo e esconda o resto
             if (selecaoContainer) selecaoContainer.classList.add("hidden");
             if (simuladoAtivoContainer) simuladoAtivoContainer.classList.remove("hidden");
@@ -154,6 +153,7 @@ function navegarPara(tela) {
             carregarAreas();
             carregarBancas();
             pararCronometro(); // Garante que qualquer timer órfão seja limpo
+            retomarSimulado(); // (NOVO) O servidor pode ter um simulado em andamento (ex.: navegador fechado)
         }
         // (FIM DA ALTERAÇÃO)
 
@@ -220,13 +220,12 @@ function iniciarSimulado() {
     })
     .then(data => {
         if (data.success && data.questao) {
-            simuladoAtual = {
-                indice_atual: data.indice_atual,
-                total_questoes: data.total_questoes
-            };
+            simuladoAtual = novoSimuladoLocal(data.total_questoes, data.indice_atual, data.link_compartilhamento);
+            guardarQuestao(data.indice_atual, data.questao, data.resposta_anterior);
             
             mostrarTelaSimuladoAtivo(data.total_questoes);
             exibirQuestao(data.questao, data.indice_atual, data.total_questoes, data.resposta_anterior);
+            prefetchQuestoes(data.indice_atual); // (NOVO) Já busca as próximas em segundo plano
             
             // (NOVO) Inicia o cronômetro
             iniciarCronometro();
@@ -244,6 +243,69 @@ function iniciarSimulado() {
     });
 }
 
+// (NOVO) Retoma o simulado guardado no servidor, na questão em que o aluno parou
+function retomarSimulado() {
+    fetch("/api/simulado/atual")
+    .then(response => response.ok ? response.json() : null)
+    .then(data => {
+        if (!data || !data.success || simuladoAtual || abrindoSimuladoCompartilhado) return; // Nada a retomar, ou já começou outro
+        const respondidas = data.total_respondidas + " de " + data.total_questoes;
+        if (!confirm("Você tem um simulado em andamento (" + respondidas + " questões respondidas). Deseja continuar?")) {
+            return;
+        }
+        simuladoAtual = novoSimuladoLocal(data.total_questoes, data.indice_atual, data.link_compartilhamento);
+        guardarQuestao(data.indice_atual, data.questao, data.resposta_anterior);
+        mostrarTelaSimuladoAtivo(data.total_questoes);
+        exibirQuestao(data.questao, data.indice_atual, data.total_questoes, data.resposta_anterior);
+        prefetchQuestoes(data.indice_atual);
+        iniciarCronometro();
+    })
+    .catch(error => console.warn("Não foi possível verificar simulado em andamento:", error));
+}
+
+// (NOVO) Link "mesmo simulado do meu colega": mesmas questões, na mesma ordem
+function compartilharSimulado() {
+    if (!simuladoAtual || !simuladoAtual.link) return;
+    const link = simuladoAtual.link;
+    if (navigator.clipboard) {
+        navigator.clipboard.writeText(link)
+        .then(() => alert("🔗 Link do simulado copiado! Quem abrir faz as mesmas questões."))
+        .catch(() => prompt("Copie o link do simulado:", link));
+    } else {
+        prompt("Copie o link do simulado:", link);
+    }
+}
+
+// (NOVO) Abre um simulado compartilhado (?simulado=<descritor> na URL)
+function iniciarSimuladoCompartilhado(descritor) {
+    abrindoSimuladoCompartilhado = true;
+    navegarPara("tela-simulado");
+    pararCronometro();
+    SessionManager.remove('simuladoStartTime');
+
+    fetch("/api/simulado/iniciar", {
+        method: "POST",
+        headers: {"Content-Type": "application/json"},
+        body: JSON.stringify({descritor: descritor})
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            throw new Error(data.error || "Simulado não encontrado.");
+        }
+        simuladoAtual = novoSimuladoLocal(data.total_questoes, data.indice_atual, data.link_compartilhamento);
+        guardarQuestao(data.indice_atual, data.questao, data.resposta_anterior);
+        mostrarTelaSimuladoAtivo(data.total_questoes);
+        exibirQuestao(data.questao, data.indice_atual, data.total_questoes, data.resposta_anterior);
+        prefetchQuestoes(data.indice_atual);
+        iniciarCronometro();
+    })
+    .catch(error => alert("Erro ao abrir simulado compartilhado: " + error.message))
+    .finally(() => {
+        abrindoSimuladoCompartilhado = false;
+    });
+}
+
 // BOTÕES DO SIMULADO
 function mostrarTelaSimuladoAtivo(totalQuestoes) {
     const selecaoContainer = document.getElementById("selecao-simulado");
@@ -273,6 +335,7 @@ function mostrarTelaSimuladoAtivo(totalQuestoes) {
                         <span id="focus-icon-expand">⛶</span>
                         <span id="focus-icon-compress" class="hidden">↘</span>
                     </button>
+                    ${simuladoAtual && simuladoAtual.link ? '<button class="btn-font-control" title="Copiar link deste simulado" onclick="compartilharSimulado()">🔗</button>' : ''}
                 </div>
             </div>
             <div class="questao-header">
@@ -473,6 +536,72 @@ function atualizarProgresso(indice, total) {
     }
 }
 
+// ---
+// --- (NOVO) Questões do simulado guardadas no navegador (busca em janelas) ---
+// ---
+// /api/simulado/questoes devolve JANELA_QUESTOES questões de uma vez; quando o aluno
+// chega a MARGEM_PREFETCH questões do fim do que já foi baixado, a próxima janela é
+// buscada em segundo plano. Navegar (Anterior/Próxima) não faz requisição.
+const JANELA_QUESTOES = 25;
+const MARGEM_PREFETCH = 5;
+
+function novoSimuladoLocal(totalQuestoes, indiceAtual, linkCompartilhamento) {
+    return {
+        indice_atual: indiceAtual || 0,
+        total_questoes: totalQuestoes,
+        link: linkCompartilhamento || null, // (NOVO) Link do mesmo simulado (null se depende do histórico)
+        questoes: [],          // questoes[i] = payload da questão i (sem gabarito se não respondida)
+        respostas: [],         // respostas[i] = resposta anterior (ou null)
+        janelasPendentes: {}   // inicio -> Promise, evita buscar a mesma janela duas vezes
+    };
+}
+
+function guardarQuestao(indice, questao, respostaAnterior) {
+    simuladoAtual.questoes[indice] = questao;
+    simuladoAtual.respostas[indice] = respostaAnterior || null;
+}
+
+function carregarJanela(inicio) {
+    const simulado = simuladoAtual;
+    if (simulado.janelasPendentes[inicio]) {
+        return simulado.janelasPendentes[inicio];
+    }
+    const promessa = fetch("/api/simulado/questoes?inicio=" + inicio + "&quantidade=" + JANELA_QUESTOES)
+    .then(response => {
+        if (!response.ok) {
+            throw new Error("Erro ao buscar questões: " + response.status);
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (!data.success) {
+            throw new Error(data.error);
+        }
+        if (simuladoAtual !== simulado) return; // O simulado mudou enquanto a janela chegava
+        data.questoes.forEach((questao, k) => {
+            // Não sobrescreve o que o aluno já respondeu nesta tela
+            if (!simulado.respostas[data.inicio + k]) {
+                guardarQuestao(data.inicio + k, questao, data.respostas_anteriores[k]);
+            }
+        });
+    })
+    .finally(() => {
+        delete simulado.janelasPendentes[inicio];
+    });
+    simulado.janelasPendentes[inicio] = promessa;
+    return promessa;
+}
+
+function prefetchQuestoes(indice) {
+    const fim = Math.min(indice + MARGEM_PREFETCH, simuladoAtual.total_questoes - 1);
+    for (let i = indice + 1; i <= fim; i++) {
+        if (!simuladoAtual.questoes[i]) {
+            carregarJanela(i).catch(error => console.warn("Prefetch de questões falhou:", error));
+            return;
+        }
+    }
+}
+
 function mudarQuestao(direcao) {
     if (!simuladoAtual) {
         alert("Nenhum simulado ativo!");
@@ -486,21 +615,23 @@ function mudarQuestao(direcao) {
         return;
     }
 
-    fetch("/api/simulado/questao/" + novoIndice)
-    .then(response => {
-        if (!response.ok) {
-            throw new Error("Erro ao buscar questão: " + response.status);
+    // (ALTERADO) Questão já baixada: exibe na hora, sem ir ao servidor
+    const exibirLocal = () => {
+        if (!simuladoAtual.questoes[novoIndice]) {
+            throw new Error("Questão " + (novoIndice + 1) + " não encontrada.");
         }
-        return response.json();
-    })
-    .then(data => {
-        if (data.success) {
-            simuladoAtual.indice_atual = novoIndice;
-            exibirQuestao(data.questao, novoIndice, data.total_questoes, data.resposta_anterior);
-        } else {
-            alert("Erro: " + data.error);
-        }
-    })
+        simuladoAtual.indice_atual = novoIndice;
+        exibirQuestao(simuladoAtual.questoes[novoIndice], novoIndice, simuladoAtual.total_questoes,
+                      simuladoAtual.respostas[novoIndice]);
+        prefetchQuestoes(novoIndice);
+    };
+    if (simuladoAtual.questoes[novoIndice]) {
+        exibirLocal();
+        return;
+    }
+
+    carregarJanela(novoIndice)
+    .then(exibirLocal)
     .catch(error => {
         console.error("Erro:", error);
         alert("Erro ao navegar entre questões: " + error.message);
@@ -538,6 +669,16 @@ function responderQuestao() {
     })
     .then(data => {
         if (data.success) {
+            // (NOVO) Guarda a resposta e o gabarito, para mostrar de novo ao voltar nesta questão
+            if (simuladoAtual) {
+                const indice = simuladoAtual.indice_atual;
+                questaoAtual.resposta_correta = data.resposta_correta;
+                questaoAtual.justificativa = data.justificativa;
+                guardarQuestao(indice, questaoAtual, {
+                    alternativa_escolhida: alternativaSelecionada.value,
+                    acertou: data.acertou
+                });
+            }
             mostrarFeedbackQuestao(data);
             desabilitarInteracaoQuestao();
         } else {
@@ -621,6 +762,7 @@ function finalizarSimulado() {
         if (data.success) {
             // (NOVO) Limpa o cronômetro da sessão
             SessionManager.remove('simuladoStartTime');
+            simuladoAtual = null; // (NOVO) O servidor já encerrou o simulado
             exibirResultado(data.relatorio);
         } else {
             alert("Erro: " + data.error);
@@ -955,6 +1097,15 @@ document.addEventListener("DOMContentLoaded", function() {
     adicionarListenersSimulado();
     
     carregarConteudoInicial();
+
+    // (NOVO) Link de simulado compartilhado: abre direto o mesmo simulado
+    const parametros = new URLSearchParams(window.location.search);
+    const descritor = parametros.get("simulado");
+    if (descritor) {
+        history.replaceState(null, "", window.location.pathname); // Recarregar a página não recomeça o simulado
+        iniciarSimuladoCompartilhado(descritor);
+        return;
+    }
     navegarPara("tela-inicio"); // Inicia na tela de início
 });
 
@@ -1354,12 +1505,11 @@ function iniciarRevisaoEspacada() {
             navegarPara('tela-simulado');
 
             // Inicia o simulado com os dados da revisão
-            simuladoAtual = {
-                indice_atual: data.indice_atual,
-                total_questoes: data.total_questoes
-            };
+            simuladoAtual = novoSimuladoLocal(data.total_questoes, data.indice_atual);
+            guardarQuestao(data.indice_atual, data.questao_atual, null);
             mostrarTelaSimuladoAtivo(data.total_questoes);
             exibirQuestao(data.questao_atual, data.indice_atual, data.total_questoes, null);
+            prefetchQuestoes(data.indice_atual);
             
             // (NOVO) Inicia o cronômetro para o simulado de revisão
             iniciarCronometro();
@@ -1493,18 +1643,21 @@ function corrigirRedacaoGeminiReal() {
     const resultadoDiv = document.getElementById('resultado-correcao');
     if (resultadoDiv) resultadoDiv.classList.add('hidden');
 
-    fetch('/api/redacao/corrigir-gemini-real', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({
-            tema: temaSelect.value,
-            texto: textoRedacao,
-            enunciado: enunciado
-        })
-    })
-    .then(response => response.json())
+    const dadosRedacao = {
+        tema: temaSelect.value,
+        texto: textoRedacao,
+        enunciado: enunciado
+    };
+
+    // (ALTERADO) Primeiro a correção em fluxo (as competências aparecem uma a uma); se o
+    // servidor recusar ou o fluxo cair, a correção por trabalho
+    corrigirRedacaoEmFluxo(dadosRedacao)
+    .then(data => data || corrigirRedacaoPorTrabalho(dadosRedacao))
     .then(data => {
-        if (data.success) {
+        if (data.success && data.estado === 'concluido') {
+            if (data.degradado) {
+                alert('⚠️ O corretor está muito ocupado agora. Esta é uma correção simulada; tente de novo em alguns minutos.');
+            }
             exibirCorrecaoRedacaoAvancada(data.correcao);
         } else {
             alert('Erro ao corrigir: ' + data.error);
@@ -1522,6 +1675,148 @@ function corrigirRedacaoGeminiReal() {
     });
 }
 
+// (NOVO) Correção por trabalho: o POST devolve um trabalho; a correção chega consultando o status dele
+function corrigirRedacaoPorTrabalho(dadosRedacao) {
+    return fetch('/api/redacao/corrigir-gemini-real', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(dadosRedacao)
+    })
+    .then(response => response.json())
+    .then(data => data.success && data.estado !== 'concluido' ? aguardarCorrecaoRedacao(data.status_url) : data);
+}
+
+// (NOVO) Correção em fluxo (Server-Sent Events lidos do corpo do POST). Resolve com o
+// mesmo formato do trabalho concluído, ou com null se não deu (o chamador usa o trabalho).
+function corrigirRedacaoEmFluxo(dadosRedacao) {
+    if (!window.ReadableStream || !window.TextDecoder) {
+        return Promise.resolve(null);
+    }
+    return fetch('/api/redacao/corrigir-gemini-real/stream', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json', 'Accept': 'text/event-stream'},
+        body: JSON.stringify(dadosRedacao)
+    })
+    .then(response => {
+        const tipo = response.headers.get('Content-Type') || '';
+        if (!response.ok || !response.body || !tipo.startsWith('text/event-stream')) {
+            return null;
+        }
+        const leitor = response.body.getReader();
+        const decodificador = new TextDecoder();
+        let pendente = '';
+        let resultado = null;
+        iniciarCorrecaoParcial();
+
+        const ler = () => leitor.read().then(({done, value}) => {
+            if (done) {
+                return resultado;
+            }
+            pendente += decodificador.decode(value, {stream: true});
+            let fim;
+            while ((fim = pendente.indexOf('\n\n')) >= 0) {
+                const evento = lerEventoSSE(pendente.slice(0, fim));
+                pendente = pendente.slice(fim + 2);
+                if (evento.nome === 'competencia') {
+                    exibirCompetenciaParcial(evento.dados);
+                } else if (evento.nome === 'correcao') {
+                    resultado = {success: true, estado: 'concluido', correcao: evento.dados.correcao,
+                                 origem: evento.dados.origem, degradado: evento.dados.degradado};
+                } else if (evento.nome === 'erro') {
+                    leitor.cancel();
+                    return null;
+                }
+            }
+            return ler();
+        });
+        return ler();
+    })
+    .catch(error => {
+        console.warn('Correção em fluxo indisponível; usando a correção por trabalho.', error);
+        return null;
+    });
+}
+
+function lerEventoSSE(bloco) {
+    const evento = {nome: 'message', dados: null};
+    const linhasDados = [];
+    bloco.split('\n').forEach(linha => {
+        if (linha.startsWith('event:')) {
+            evento.nome = linha.slice(6).trim();
+        } else if (linha.startsWith('data:')) {
+            linhasDados.push(linha.slice(5).trim());
+        }
+    });
+    if (linhasDados.length) {
+        evento.dados = JSON.parse(linhasDados.join('\n'));
+    }
+    return evento;
+}
+
+function iniciarCorrecaoParcial() {
+    const resultadoDiv = document.getElementById('resultado-correcao');
+    if (!resultadoDiv) return;
+    resultadoDiv.innerHTML = `
+        <div class="card resultado-header">
+            <div class="nota-container">
+                <h3>📊 Corrigindo sua redação...</h3>
+                <div class="nota-descricao"><span class="loading small"></span> As competências aparecem conforme ficam prontas.</div>
+            </div>
+        </div>
+        <div class="card">
+            <h4>📈 Análise por Competências ENEM:</h4>
+            <div id="competencias-parciais"></div>
+        </div>
+    `;
+    resultadoDiv.classList.remove("hidden");
+}
+
+function exibirCompetenciaParcial(comp) {
+    const lista = document.getElementById('competencias-parciais');
+    if (lista) {
+        lista.insertAdjacentHTML('beforeend', htmlCompetencia(comp));
+    }
+}
+
+// (NOVO) Consulta o trabalho de correção até ele terminar (concluído ou erro)
+const INTERVALO_STATUS_REDACAO_MS = 1500;
+const ESPERA_MAXIMA_REDACAO_MS = 5 * 60 * 1000;
+
+function aguardarCorrecaoRedacao(statusUrl) {
+    const limite = Date.now() + ESPERA_MAXIMA_REDACAO_MS;
+    const consultar = () => new Promise(resolve => setTimeout(resolve, INTERVALO_STATUS_REDACAO_MS))
+        .then(() => fetch(statusUrl))
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success || data.estado === 'concluido' || data.estado === 'erro') {
+                return data;
+            }
+            if (Date.now() > limite) {
+                return {success: false, error: 'A correção está demorando demais. Tente novamente.'};
+            }
+            return consultar();
+        });
+    return consultar();
+}
+
+// (NOVO) Cartão de uma competência (usado no resultado final e na correção em fluxo)
+function htmlCompetencia(comp) {
+    const nota = comp.nota || 0;
+    const percentual = (nota / 200) * 100;
+    return `
+                <div class="competencia-item">
+                    <div class="competencia-header">
+                        <h5>${comp.nome || "Competência"}</h5>
+                        <span class="nota-competencia">${nota}/200</span>
+                    </div>
+                    <div class="progress-bar-competencia">
+                        <div class="progress-fill" style="width: ${percentual}%"></div>
+                    </div>
+                    <p class="comentario-competencia">${comp.comentario || "Sem comentário."}</p>
+                </div>
+            `;
+}
+
 function exibirCorrecaoRedacaoAvancada(correcao) {
     const resultadoDiv = document.getElementById('resultado-correcao');
     if (!resultadoDiv) return;
@@ -1545,20 +1840,7 @@ function exibirCorrecaoRedacaoAvancada(correcao) {
     
     if (correcao.competencias && Array.isArray(correcao.competencias)) {
         correcao.competencias.forEach(comp => {
-            const nota = comp.nota || 0;
-            const percentual = (nota / 200) * 100;
-            html += `
-                <div class="competencia-item">
-                    <div class="competencia-header">
-                        <h5>${comp.nome || "Competência"}</h5>
-                        <span class="nota-competencia">${nota}/200</span>
-                    </div>
-                    <div class="progress-bar-competencia">
-                        <div class="progress-fill" style="width: ${percentual}%"></div>
-                    </div>
-                    <p class="comentario-competencia">${comp.comentario || "Sem comentário."}</p>
-                </div>
-            `;
+            html += htmlCompetencia(comp);
         });
     }
     
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Testes do cache_correcoes.py (chave, dois níveis e singleflight) ---
+# ---
+# Sem Gemini e sem banco: o nível persistente é um dicionário e o "cálculo" é uma função
+# que espera um Event, para segurar várias threads na mesma chave ao mesmo tempo.
+#
+# Uso:
+#   python -m pytest -q test_cache_correcoes.py
+import threading
+import time
+
+import pytest
+
+from cache_correcoes import CacheCorrecoes, LiderDesistiu, Singleflight, chave_correcao
+
+
+def test_chave_ignora_espacos_e_quebras():
+    a = chave_correcao('modelo', 1, "Tema", "Enunciado", "Primeiro  parágrafo.\r\n\r\n\r\nSegundo. ")
+    b = chave_correcao('modelo', 1, " Tema", "Enunciado", "Primeiro parágrafo.\n\nSegundo.")
+
+    assert a == b
+    assert a != chave_correcao('modelo', 2, "Tema", "Enunciado", "Primeiro parágrafo.\n\nSegundo.")
+    assert a != chave_correcao('modelo', 1, "Tema", "Enunciado", "Primeiro parágrafo.\nSegundo.")
+
+
+def iniciar_threads(alvo, quantidade):
+    threads = [threading.Thread(target=alvo) for _ in range(quantidade)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def esperar_coalescidas(singleflight, quantidade):
+    # As seguidoras entram no singleflight antes de o líder terminar
+    for _ in range(500):
+        if singleflight.total_coalescidas >= quantidade:
+            return
+        time.sleep(0.01)
+    raise AssertionError("as threads não chegaram ao singleflight")
+
+
+def test_chamadas_simultaneas_calculam_uma_vez():
+    persistente = {}
+    cache = CacheCorrecoes(8, persistente.get, persistente.__setitem__)
+    liberar, chamadas, resultados = threading.Event(), [], []
+
+    def calcular():
+        chamadas.append(1)
+        liberar.wait(5)
+        return ({"nota_final": 800}, 'gemini')
+
+    threads = iniciar_threads(lambda: resultados.append(cache.obter_ou_calcular('k', calcular)), 5)
+    esperar_coalescidas(cache.singleflight, 4)
+    liberar.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(chamadas) == 1
+    assert resultados == [(({"nota_final": 800}, 'gemini'), False)] * 5
+    assert persistente == {'k': ({"nota_final": 800}, 'gemini')}
+    assert cache.metricas()["chamadas_coalescidas"] == 4
+    # Depois, o valor vem do cache
+    assert cache.obter_ou_calcular('k', calcular) == (({"nota_final": 800}, 'gemini'), True)
+    assert len(chamadas) == 1
+
+
+def test_nao_guarda_o_que_nao_e_cacheavel():
+    persistente = {}
+    cache = CacheCorrecoes(8, persistente.get, persistente.__setitem__)
+
+    for _ in range(2):
+        valor, do_cache = cache.obter_ou_calcular('k', lambda: ({}, 'simulada'),
+                                                  cacheavel=lambda valor: valor[1] == 'gemini')
+        assert (valor, do_cache) == (({}, 'simulada'), False)
+    assert persistente == {}
+    assert cache.metricas()["faltas"] == 2
+
+
+def test_nivel_persistente_sobe_para_a_memoria():
+    persistente = {'k': ({"nota_final": 600}, 'gemini')}
+    cache = CacheCorrecoes(8, persistente.get, persistente.__setitem__)
+
+    assert cache.obter('k') == ({"nota_final": 600}, 'gemini')
+    persistente.clear()
+    assert cache.obter('k') == ({"nota_final": 600}, 'gemini')
+    assert cache.metricas()["acertos_persistente"] == 1
+    assert cache.metricas()["acertos_memoria"] == 1
+
+
+def test_erro_do_lider_chega_a_quem_esperava():
+    singleflight = Singleflight()
+    liberar, erros = threading.Event(), []
+
+    def falhar():
+        liberar.wait(5)
+        raise RuntimeError("Gemini fora")
+
+    def chamar():
+        try:
+            singleflight.executar('k', falhar)
+        except RuntimeError as e:
+            erros.append(str(e))
+
+    threads = iniciar_threads(chamar, 3)
+    esperar_coalescidas(singleflight, 2)
+    liberar.set()
+    for thread in threads:
+        thread.join()
+
+    assert erros == ["Gemini fora"] * 3
+
+
+def test_lider_que_desiste_passa_a_vez():
+    # Como a correção em fluxo quando o aluno fecha a conexão no meio
+    singleflight = Singleflight()
+    chamada, lider = singleflight.entrar('k')
+    assert lider
+    resultados = []
+    seguidora = threading.Thread(target=lambda: resultados.append(singleflight.executar('k', lambda: 'calculado')))
+    seguidora.start()
+    esperar_coalescidas(singleflight, 1)
+
+    singleflight.concluir('k', chamada, desistiu=True)
+    seguidora.join(5)
+
+    assert resultados == ['calculado']
+    with pytest.raises(LiderDesistiu):
+        Singleflight.esperar(chamada)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Testes do cliente_gemini.py contra o servidor_gemini_falso.py ---
+# ---
+# Cada teste sobe o servidor falso numa thread (porta livre) e aponta o cliente para ele
+# pelo transporte REST. O último importa o app com um SQLite temporário para conferir a
+# queda na correção simulada com o disjuntor aberto.
+#
+# Uso:
+#   python -m pytest -q test_cliente_gemini.py
+import importlib
+import json
+import time
+
+import pytest
+
+import cliente_gemini
+import servidor_gemini_falso
+from cliente_gemini import ClienteGemini, GeminiIndisponivel
+
+MODELO = 'models/gemini-flash-latest'
+
+
+@pytest.fixture
+def servidor_falso():
+    '''servidor_falso(**opcoes) -> servidor atendendo numa thread; todos são encerrados no fim.'''
+    servidores = []
+
+    def iniciar(**opcoes):
+        servidor = servidor_gemini_falso.iniciar_em_thread(**opcoes)
+        servidores.append(servidor)
+        return servidor
+
+    yield iniciar
+    for servidor in servidores:
+        servidor_gemini_falso.encerrar(servidor)
+
+
+def novo_cliente(servidor, **opcoes):
+    opcoes.setdefault('espera_base', 0.01)
+    return ClienteGemini('falsa', MODELO, endpoint=servidor.endpoint, **opcoes)
+
+
+def test_retentativa_em_503(servidor_falso):
+    servidor = servidor_falso(falhas_iniciais=2)
+    cliente = novo_cliente(servidor, tentativas=3)
+
+    correcao = json.loads(cliente.gerar("prompt"))
+
+    assert correcao == servidor_gemini_falso.CORRECAO
+    assert servidor.contadores == {"pedidos": 3, "falhas": 2}
+    assert cliente.metricas()["retentativas"] == 2
+    assert cliente.disjuntor.estado == 'fechado'
+
+
+def test_prazo_com_servidor_travado(servidor_falso):
+    servidor = servidor_falso(modo='travado')
+    cliente = novo_cliente(servidor, prazo=0.3, tentativas=2)
+
+    inicio = time.monotonic()
+    with pytest.raises(GeminiIndisponivel):
+        cliente.gerar("prompt")
+
+    # Duas tentativas de 0.3 s (mais a espera entre elas), nunca o servidor travado inteiro
+    assert time.monotonic() - inicio < 2.0
+    assert servidor.contadores["pedidos"] <= 2
+
+
+def test_fluxo_entrega_os_trechos(servidor_falso):
+    servidor = servidor_falso(trechos=5, intervalo_ms=10, falhas_iniciais=1)
+    cliente = novo_cliente(servidor)
+
+    trechos = list(cliente.gerar_em_fluxo("prompt"))
+
+    assert len(trechos) > 1
+    assert json.loads(''.join(trechos)) == servidor_gemini_falso.CORRECAO
+    # O 503 veio antes do primeiro trecho: repetiu o pedido do fluxo uma vez
+    assert servidor.contadores == {"pedidos": 2, "falhas": 1}
+
+
+def test_disjuntor_aberto_cai_na_simulada(servidor_falso, monkeypatch, tmp_path):
+    servidor = servidor_falso(modo='erro503')
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'teste.db'}")
+    monkeypatch.setenv('GRAVACAO_RESPOSTAS', 'direta')
+    monkeypatch.setenv('GEMINI_API_KEY', 'falsa')
+    monkeypatch.setenv('GEMINI_API_ENDPOINT', servidor.endpoint)
+    monkeypatch.setenv('GEMINI_TENTATIVAS', '2')
+    monkeypatch.setenv('GEMINI_DISJUNTOR_FALHAS', '2')
+    monkeypatch.setenv('GEMINI_DISJUNTOR_ABERTO', '60')
+    monkeypatch.setattr(cliente_gemini, '_cliente_pid', None) # Cliente novo, com o ambiente acima
+    app_module = importlib.import_module('app')
+    simulada = app_module.gerar_correcao_simulada()
+    monkeypatch.setattr(app_module, 'gerar_correcao_simulada', lambda: simulada)
+
+    def corrigir(texto):
+        eventos = app_module.correcao_em_fluxo("Tema", "Enunciado", texto, lambda: None)
+        corpo = ''.join(eventos)
+        return json.loads(corpo.split("event: correcao\ndata: ", 1)[1].split("\n", 1)[0])
+
+    with app_module.app.test_request_context():
+        app_module.migracoes.aplicar(app_module.db.engine)
+        # Duas chamadas esgotam as retentativas (2 pedidos cada) e abrem o disjuntor
+        for texto in ("primeira redação", "segunda redação"):
+            resultado = corrigir(texto)
+            assert resultado["origem"] == 'simulada' and resultado["degradado"] is True
+        assert servidor.contadores["pedidos"] == 4
+        assert app_module.obter_cliente(app_module.MODELO_GEMINI).disjuntor.estado == 'aberto'
+
+        # Com o disjuntor aberto a simulada sai na hora, sem pedido ao Gemini
+        inicio = time.monotonic()
+        resultado = corrigir("terceira redação")
+        assert time.monotonic() - inicio < 0.5
+        assert resultado == {"correcao": simulada, "origem": 'simulada', "degradado": True}
+        assert servidor.contadores["pedidos"] == 4
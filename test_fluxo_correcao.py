@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Testes do fluxo_correcao.py e da numeração dos eventos SSE no app ---
+# ---
+# O LeitorCompetencias recebe o JSON do Gemini em trechos arbitrários: os testes cortam
+# o texto em todos os pontos possíveis (inclusive no meio de strings e escapes). O último
+# importa o app com um SQLite temporário e troca o cliente Gemini por um falso.
+#
+# Uso:
+#   python -m pytest -q test_fluxo_correcao.py
+import importlib
+import json
+
+from fluxo_correcao import LeitorCompetencias, evento_sse
+
+CORRECAO = {
+    "nota_final": 720,
+    "competencias": [
+        {"competencia": 1, "nota": 160, "comentario": "Texto com \"aspas\", {chaves} e [colchetes]."},
+        {"competencia": 2, "nota": 120, "comentario": "Barra invertida \\ no fim\\"},
+        {"competencia": 3, "nota": 160, "detalhes": {"pontos": [1, 2, {"x": "}"}]}},
+    ],
+    "comentario_geral": "Depois do array: {\"competencia\": 99}",
+}
+
+
+def ler_em_trechos(texto, tamanho):
+    leitor = LeitorCompetencias()
+    por_trecho = [leitor.alimentar(texto[i:i + tamanho]) for i in range(0, len(texto), tamanho)]
+    return leitor, por_trecho
+
+
+def test_competencias_em_qualquer_corte():
+    texto = json.dumps(CORRECAO, ensure_ascii=False, indent=2)
+    for tamanho in range(1, len(texto) + 1):
+        leitor, por_trecho = ler_em_trechos(texto, tamanho)
+        assert [c for completas in por_trecho for c in completas] == CORRECAO["competencias"], tamanho
+        assert leitor.total == 3
+        assert leitor.texto == texto
+
+
+def test_varias_competencias_no_mesmo_trecho():
+    leitor = LeitorCompetencias()
+    texto = json.dumps(CORRECAO)
+
+    assert leitor.alimentar(texto) == CORRECAO["competencias"]
+    assert leitor.alimentar("") == []
+
+
+def test_texto_com_cerca_de_markdown():
+    # O Gemini às vezes devolve o JSON dentro de ```json ... ```
+    leitor = LeitorCompetencias()
+
+    completas = leitor.alimentar("```json\n" + json.dumps(CORRECAO) + "\n```")
+
+    assert [c["competencia"] for c in completas] == [1, 2, 3]
+
+
+def test_evento_sse_numa_linha():
+    evento = evento_sse('competencia', {"comentario": "linha 1\nlinha 2", "indice": 0})
+
+    cabecalho, dados, fim = evento.split("\n", 2)
+    assert cabecalho == "event: competencia"
+    assert json.loads(dados[len("data: "):]) == {"comentario": "linha 1\nlinha 2", "indice": 0}
+    assert fim == "\n"
+
+
+class ClienteFalso:
+    def __init__(self, trechos):
+        self.trechos = trechos
+
+    def gerar_em_fluxo(self, prompt):
+        yield from self.trechos
+
+
+def test_indices_dos_eventos_do_app(monkeypatch, tmp_path):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'teste.db'}")
+    monkeypatch.setenv('GRAVACAO_RESPOSTAS', 'direta')
+    app_module = importlib.import_module('app')
+    texto = json.dumps(CORRECAO)
+    # O 1º trecho fecha as competências 1 e 2 juntas; o 2º fecha a 3
+    corte = texto.index('{"competencia": 3')
+    monkeypatch.setattr(app_module, 'obter_cliente', lambda modelo: ClienteFalso([texto[:corte], texto[corte:]]))
+
+    with app_module.app.test_request_context():
+        app_module.migracoes.aplicar(app_module.db.engine)
+        corpo = ''.join(app_module.correcao_em_fluxo("Tema dos índices", "Enunciado", "Texto", lambda: None))
+
+    eventos = [(bloco.split("\n")[0][len("event: "):], json.loads(bloco.split("\n")[1][len("data: "):]))
+               for bloco in corpo.strip().split("\n\n")]
+    assert [nome for nome, _ in eventos] == ['competencia'] * 3 + ['correcao']
+    assert [dados["indice"] for _, dados in eventos[:3]] == [0, 1, 2]
+    assert [dados["competencia"] for _, dados in eventos[:3]] == [1, 2, 3]
+    assert eventos[-1][1] == {"correcao": CORRECAO, "origem": 'gemini', "degradado": False}
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Testes do gravacao_respostas.py (diário, lotes, recuperação e quarentena) ---
+# ---
+# O "banco" é uma função que guarda os lotes numa lista (e falha quando o teste pede).
+# Cada teste usa uma pasta de diário própria (tmp_path).
+#
+# Uso:
+#   python -m pytest -q test_gravacao_respostas.py
+import json
+import os
+import time
+
+import pytest
+
+import gravacao_respostas
+from gravacao_respostas import Diario, FilaCheia, GravadorEmLote, registros_pendentes
+
+
+class RegistroRecusado(Exception):
+    pass
+
+
+class BancoFalso:
+    '''gravar_lote(registros): grava o lote inteiro ou nada. 'falhas_transitorias' primeiras
+    chamadas falham; registros com "ruim" são sempre recusados.'''
+
+    def __init__(self, falhas_transitorias=0):
+        self.lotes = []
+        self.falhas_transitorias = falhas_transitorias
+
+    def gravar_lote(self, registros):
+        if self.falhas_transitorias:
+            self.falhas_transitorias -= 1
+            raise ConnectionError("conexão caiu")
+        if any(r.get("ruim") for r in registros):
+            raise RegistroRecusado("violou a restrição")
+        self.lotes.append([r["q"] for r in registros])
+
+    @property
+    def gravados(self):
+        return [q for lote in self.lotes for q in lote]
+
+
+def novo_gravador(banco, pasta, **opcoes):
+    opcoes.setdefault('intervalo', 0.05)
+    return GravadorEmLote(banco.gravar_lote, str(pasta), fsync=False,
+                          erro_permanente=lambda e: isinstance(e, RegistroRecusado), **opcoes)
+
+
+def esperar(condicao, limite=5.0):
+    fim = time.monotonic() + limite
+    while not condicao():
+        if time.monotonic() > fim:
+            raise AssertionError("condição não aconteceu a tempo")
+        time.sleep(0.01)
+
+
+def test_registros_saem_em_lote_e_o_diario_zera(tmp_path):
+    banco = BancoFalso()
+    gravador = novo_gravador(banco, tmp_path, intervalo=0.2)
+
+    for q in range(10):
+        gravador.registrar({"q": q})
+    esperar(lambda: len(banco.gravados) == 10)
+    gravador.encerrar()
+
+    assert banco.gravados == list(range(10))
+    assert len(banco.lotes) < 10 # Juntou registros (o primeiro espera até 'intervalo' pelos outros)
+    assert gravador.metricas()["gravados"] == 10
+    assert os.listdir(tmp_path) == [] # Diário vazio é apagado no encerramento
+
+
+def test_tamanho_maximo_do_lote(tmp_path):
+    banco = BancoFalso()
+    gravador = novo_gravador(banco, tmp_path, tamanho_lote=3, intervalo=0.5)
+
+    for q in range(7):
+        gravador.registrar({"q": q})
+    gravador.encerrar()
+
+    assert banco.gravados == list(range(7))
+    assert max(len(lote) for lote in banco.lotes) <= 3
+
+
+def test_erro_transitorio_tenta_de_novo(tmp_path):
+    banco = BancoFalso(falhas_transitorias=2)
+    gravador = novo_gravador(banco, tmp_path)
+
+    gravador.registrar({"q": 1})
+    esperar(lambda: banco.gravados == [1])
+    gravador.encerrar()
+
+    assert gravador.metricas()["falhas"] == 2
+    assert gravador.metricas()["quarentena"] == 0
+
+
+def test_registro_recusado_vai_para_a_quarentena(tmp_path):
+    banco = BancoFalso()
+    gravador = novo_gravador(banco, tmp_path, intervalo=0.2)
+
+    for q in range(5):
+        gravador.registrar({"q": q, "ruim": q == 2})
+    esperar(lambda: len(banco.gravados) == 4)
+    gravador.registrar({"q": 5}) # O gravador continua andando depois do registro ruim
+    esperar(lambda: len(banco.gravados) == 5)
+    gravador.encerrar()
+
+    assert banco.gravados == [0, 1, 3, 4, 5]
+    with open(tmp_path / 'respostas.quarentena', encoding='utf-8') as f:
+        quarentena = [json.loads(linha) for linha in f]
+    assert [item["registro"] for item in quarentena] == [{"q": 2, "ruim": True}]
+    assert "violou a restrição" in quarentena[0]["erro"]
+    assert gravador.metricas()["quarentena"] == 1
+    assert sorted(os.listdir(tmp_path)) == ['respostas.quarentena'] # Diário confirmado até o fim
+
+
+def test_fila_cheia(tmp_path, monkeypatch):
+    banco = BancoFalso(falhas_transitorias=10 ** 6) # Nada sai da fila
+    monkeypatch.setattr(gravacao_respostas, 'ESPERA_MAXIMA_RETENTATIVA', 0.01)
+    gravador = novo_gravador(banco, tmp_path, capacidade=2, espera_maxima=0.05)
+
+    gravador.registrar({"q": 1})
+    gravador.registrar({"q": 2})
+    with pytest.raises(FilaCheia):
+        gravador.registrar({"q": 3})
+
+    assert gravador.metricas()["recusados_fila_cheia"] == 1
+    assert [r for r, _ in registros_pendentes(gravador._diario.caminho)] == [{"q": 1}, {"q": 2}]
+    banco.falhas_transitorias = 0 # O banco volta: a fila esvazia no encerramento
+    gravador.encerrar()
+    assert banco.gravados == [1, 2]
+
+
+def diario_orfao(pasta, registros, confirmados):
+    '''Diário de um processo que morreu: 'confirmados' primeiros registros já estavam no banco.'''
+    caminho = os.path.join(pasta, 'respostas.999999999.diario')
+    diario = Diario(caminho, fsync=False)
+    fins = [diario.anexar(registro) for registro in registros]
+    if confirmados:
+        diario.confirmar(fins[confirmados - 1])
+    diario.fechar()
+    with open(caminho, 'ab') as f:
+        f.write(b'{"q": 99') # Linha incompleta: a queda foi no meio da escrita
+    return caminho
+
+
+def test_recupera_o_diario_de_um_processo_morto(tmp_path):
+    diario_orfao(tmp_path, [{"q": q} for q in range(6)], confirmados=2)
+    banco = BancoFalso()
+    gravador = novo_gravador(banco, tmp_path, tamanho_lote=3)
+
+    assert gravador.recuperar_todos() == 4
+
+    assert banco.lotes == [[2, 3, 4], [5]]
+    assert os.listdir(tmp_path) == []
+
+
+def test_recuperacao_com_falha_continua_de_onde_parou(tmp_path):
+    caminho = diario_orfao(tmp_path, [{"q": q, "ruim": q == 1} for q in range(4)], confirmados=0)
+    banco = BancoFalso()
+    gravador = novo_gravador(banco, tmp_path, tamanho_lote=2)
+
+    # 1ª tentativa: o banco cai no segundo lote
+    original = banco.gravar_lote
+    def cair_no_segundo_lote(registros):
+        if any(r["q"] == 2 for r in registros):
+            raise ConnectionError("conexão caiu")
+        original(registros)
+    gravador.gravar_lote = cair_no_segundo_lote
+
+    assert gravador.recuperar_todos() == 0
+    assert banco.gravados == [0] # O registro 1 foi para a quarentena; o 2 e o 3 ficaram no diário
+    assert [r["q"] for r, _ in registros_pendentes(caminho)] == [2, 3]
+
+    gravador.gravar_lote = original
+    assert gravador.recuperar_todos() == 2
+    assert banco.gravados == [0, 2, 3]
+    assert sorted(os.listdir(tmp_path)) == ['respostas.quarentena']
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- Testes das rotas do simulado contra versões do banco de questões ---
+# ---
+# Importa o app com um SQLite temporário (respostas gravadas na hora) e usa o cliente de
+# teste do Flask. A versão do banco "sai da memória" trocando gerenciador_banco.versao.
+# O último teste cobre o chaves_questoes.py, que leva os ids gravados de uma versão do
+# banco para a seguinte.
+#
+# Uso:
+#   python -m pytest -q test_simulado.py
+import importlib
+
+import pytest
+
+import chaves_questoes
+from chaves_questoes import QUESTAO_REMOVIDA, TAMANHO_CHAVE, chave_questao, mapa_posicoes
+
+
+@pytest.fixture
+def app_module(monkeypatch, tmp_path):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'teste.db'}")
+    monkeypatch.setenv('GRAVACAO_RESPOSTAS', 'direta')
+    modulo = importlib.import_module('app')
+    with modulo.app.app_context():
+        modulo.migracoes.aplicar(modulo.db.engine)
+    return modulo
+
+
+def iniciar(cliente, app_module, quantidade=3):
+    areas = list(app_module.gerenciador_banco.atual().indice.listas['disciplina'])
+    resposta = cliente.post('/api/simulado/iniciar', json={'areas': areas, 'quantidade': quantidade,
+                                                           'questoes_vistas': 'ignorar', 'estratificar': False})
+    assert resposta.status_code == 200, resposta.get_json()
+    questoes = cliente.get(f'/api/simulado/questoes?inicio=0&quantidade={quantidade}').get_json()['questoes']
+    return [questao['id'] for questao in questoes]
+
+
+def test_simulado_de_versao_que_saiu_da_memoria_recebe_410(app_module, monkeypatch):
+    cliente = app_module.app.test_client()
+    ids = iniciar(cliente, app_module)
+    assert cliente.get('/api/simulado/questao/0').status_code == 200
+
+    monkeypatch.setattr(app_module.gerenciador_banco, 'versao', lambda versao: None)
+
+    assert cliente.get('/api/simulado/questao/0').status_code == 410
+    assert cliente.get('/api/simulado/atual').status_code == 410
+    assert cliente.get('/api/simulado/questoes?inicio=0&quantidade=3').status_code == 410
+    resposta = cliente.post('/api/simulado/responder', json={'questao_id': ids[0], 'alternativa': 'a'})
+    assert resposta.status_code == 410
+    assert resposta.get_json()["success"] is False
+
+
+def test_navegar_nao_grava_o_simulado(app_module, monkeypatch):
+    cliente = app_module.app.test_client()
+    iniciar(cliente, app_module)
+    gravacoes = []
+    monkeypatch.setattr(app_module.armazem_simulados, 'gravar', lambda *args: gravacoes.append(args))
+
+    for indice in (1, 2, 0):
+        assert cliente.get(f'/api/simulado/questao/{indice}').status_code == 200
+
+    assert gravacoes == []
+
+
+def chaves(*textos):
+    return b''.join(chave_questao([texto]) for texto in textos)
+
+
+def test_mapa_de_posicoes_entre_versoes():
+    antigas = chaves("A", "B", "C", "D")
+    # B saiu, E entrou no meio e A foi para o fim
+    novas = chaves("C", "E", "  D ", "A")
+
+    assert len(novas) == 4 * TAMANHO_CHAVE
+    assert mapa_posicoes(antigas, novas) == {0: 3, 1: QUESTAO_REMOVIDA, 2: 0, 3: 2}
+    assert mapa_posicoes(antigas, antigas + chaves("F")) == {} # Só acréscimo no fim
+    assert chaves_questoes.posicoes(chaves("X", "X")) == {chave_questao(["X"]): 0}
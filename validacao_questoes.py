@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# ---
+# --- (NOVO) Validação semântica do banco de questões (lint) ---
+# ---
+# O ingestao.py garante o formato (14 colunas, enunciado preenchido), mas nada
+# garantia o conteúdo: uma 'resposta_correta' fora de a–e, ou apontando para uma
+# alternativa vazia, só aparecia no responder_questao, comparando com ''.
+#
+# As regras rodam coluna a coluna, sem laço Python por questão: cada coluna
+# categórica chega como (códigos, categorias), a regra decide sobre as categorias
+# (poucas) e o resultado é espalhado para as questões com um índice numpy. As
+# alternativas chegam só como máscaras "está vazia". Roda:
+#   - no ingestao.py, antes de gravar o banco (as questões com erro vão para a quarentena);
+#   - no carregamento do banco (BancoQuestoes): questões com erro ficam fora dos simulados.
+from array import array
+
+import numpy as np
+import pandas as pd
+
+ERRO = 'erro'
+AVISO = 'aviso'
+
+LETRAS_RESPOSTA = ('a', 'b', 'c', 'd', 'e')
+COLUNAS_ALTERNATIVAS = tuple(f'alternativa_{letra}' for letra in LETRAS_RESPOSTA)
+COLUNAS_CATEGORICAS = ('resposta_correta', 'dificuldade', 'banca')
+
+DIFICULDADES = ('Fácil', 'Médio', 'Difícil')
+DIFICULDADES_SINONIMOS = {'Média': 'Médio'} # Aceitas, mas fora do padrão
+
+BANCAS_CONHECIDAS = (
+    'Banca Padrão', 'Cebraspe', 'CESPE', 'FGV', 'FCC', 'Vunesp', 'Cesgranrio', 'IBFC',
+    'Quadrix', 'Instituto AOCP', 'AOCP', 'IDECAN', 'Consulplan', 'Instituto Consulplan',
+    'Fundatec', 'IADES', 'UFG', 'Objetiva Concursos', 'FUMARC', 'FEPESE', 'IBADE', 'Selecon',
+    'Cebraspe/CESPE', 'Instituto Verbena', 'Fundação Carlos Chagas',
+)
+
+COLUNAS_TABELA = ['id', 'regra', 'severidade', 'coluna', 'valor']
+TAMANHO_MAX_VALOR = 80 # O valor vai para a tabela truncado (colunas deslocadas trazem o enunciado inteiro)
+
+
+class ColunasLint:
+    '''O que as regras precisam do banco, em forma colunar.
+
+    categoricas: {coluna: (códigos int, lista de categorias)}
+    vazias:      {coluna: array bool, True onde o texto está vazio ('')}'''
+
+    def __init__(self, n, categoricas, vazias):
+        self.n = n
+        self.categoricas = categoricas
+        self.vazias = vazias
+
+    @classmethod
+    def de_valores(cls, categoricas, vazias):
+        '''A partir de sequências de valores (listas, Series...). Usado pela ingestão.'''
+        codificadas = {}
+        for coluna, valores in categoricas.items():
+            codigos, categorias = pd.factorize(pd.Series(valores, dtype=object), sort=False)
+            codificadas[coluna] = (codigos, list(categorias))
+        n = len(next(iter(codificadas.values()))[0]) if codificadas else 0
+        return cls(n, codificadas, {c: np.asarray(v, dtype=bool) for c, v in vazias.items()})
+
+    @classmethod
+    def do_dataframe(cls, df):
+        vazias = {c: (df[c].astype(str) == '').to_numpy() for c in COLUNAS_ALTERNATIVAS}
+        return cls.de_valores({c: df[c].astype(str) for c in COLUNAS_CATEGORICAS}, vazias)
+
+    @classmethod
+    def do_snapshot(cls, snapshot):
+        '''Direto dos códigos e offsets do snapshot: nenhum texto é decodificado.'''
+        categoricas = {c: (snapshot.codigos(c), snapshot.categorias(c)) for c in COLUNAS_CATEGORICAS}
+        vazias = {c: snapshot.tamanhos(c) == 0 for c in COLUNAS_ALTERNATIVAS}
+        return cls(len(snapshot), categoricas, vazias)
+
+
+class AcumuladorColunas:
+    '''Monta ColunasLint linha a linha, para a ingestão em streaming: guarda só o
+    código de cada valor categórico (4 bytes) e um byte "vazia" por alternativa.'''
+
+    def __init__(self, cabecalho):
+        self._posicoes = {c: cabecalho.index(c) for c in COLUNAS_CATEGORICAS + COLUNAS_ALTERNATIVAS}
+        self._vocabularios = {c: {} for c in COLUNAS_CATEGORICAS}
+        self._codigos = {c: array('i') for c in COLUNAS_CATEGORICAS}
+        self._vazias = {c: bytearray() for c in COLUNAS_ALTERNATIVAS}
+
+    def adicionar(self, linha):
+        for coluna, vocabulario in self._vocabularios.items():
+            self._codigos[coluna].append(vocabulario.setdefault(linha[self._posicoes[coluna]], len(vocabulario)))
+        for coluna, vazias in self._vazias.items():
+            vazias.append(linha[self._posicoes[coluna]] == '')
+
+    def colunas(self):
+        n = len(self._codigos[COLUNAS_CATEGORICAS[0]])
+        categoricas = {c: (np.frombuffer(self._codigos[c], dtype=np.int32), list(self._vocabularios[c]))
+                       for c in COLUNAS_CATEGORICAS}
+        vazias = {c: np.frombuffer(bytes(v), dtype=bool) for c, v in self._vazias.items()}
+        return ColunasLint(n, categoricas, vazias)
+
+
+# ---
+# --- Regras ---
+# ---
+# Cada regra recebe ColunasLint e devolve (máscara das questões que violam, valor a reportar por questão).
+def _por_categoria(colunas, coluna, viola):
+    '''Aplica 'viola(valor) -> bool' a cada categoria e espalha para as questões.'''
+    codigos, categorias = colunas.categoricas[coluna]
+    violacoes = np.fromiter((viola(v) for v in categorias), dtype=bool, count=len(categorias))
+    valores = np.asarray(categorias, dtype=object)
+    return violacoes[codigos], valores[codigos]
+
+
+def _letra_da_resposta(valor):
+    letra = valor.strip().lower()
+    return LETRAS_RESPOSTA.index(letra) if letra in LETRAS_RESPOSTA else -1
+
+
+def regra_resposta_invalida(colunas):
+    return _por_categoria(colunas, 'resposta_correta', lambda v: _letra_da_resposta(v) < 0)
+
+
+def regra_alternativa_correta_vazia(colunas):
+    codigos, categorias = colunas.categoricas['resposta_correta']
+    letras = np.fromiter((_letra_da_resposta(v) for v in categorias), dtype=np.int64, count=len(categorias))[codigos]
+    vazias = np.column_stack([colunas.vazias[c] for c in COLUNAS_ALTERNATIVAS])
+    viola = (letras >= 0) & vazias[np.arange(colunas.n), np.maximum(letras, 0)]
+    return viola, np.asarray(COLUNAS_ALTERNATIVAS, dtype=object)[np.maximum(letras, 0)]
+
+
+def regra_dificuldade_desconhecida(colunas):
+    return _por_categoria(colunas, 'dificuldade',
+                          lambda v: v not in DIFICULDADES and v not in DIFICULDADES_SINONIMOS)
+
+
+def regra_dificuldade_fora_do_padrao(colunas):
+    return _por_categoria(colunas, 'dificuldade', lambda v: v in DIFICULDADES_SINONIMOS)
+
+
+def regra_banca_desconhecida(colunas):
+    return _por_categoria(colunas, 'banca', lambda v: v not in BANCAS_CONHECIDAS)
+
+
+# (nome, severidade, coluna, função)
+REGRAS = [
+    ('resposta_invalida', ERRO, 'resposta_correta', regra_resposta_invalida),
+    ('alternativa_correta_vazia', ERRO, 'resposta_correta', regra_alternativa_correta_vazia),
+    ('dificuldade_desconhecida', ERRO, 'dificuldade', regra_dificuldade_desconhecida),
+    ('dificuldade_fora_do_padrao', AVISO, 'dificuldade', regra_dificuldade_fora_do_padrao),
+    ('banca_desconhecida', ERRO, 'banca', regra_banca_desconhecida),
+]
+
+
+class ResultadoLint:
+    '''Tabela de erros (DataFrame com COLUNAS_TABELA, ordenada por id) + máscara das questões válidas.'''
+
+    def __init__(self, n, erros):
+        self.n = n
+        self.erros = erros
+        self.validas = np.ones(n, dtype=bool)
+        self.validas[erros.loc[erros['severidade'] == ERRO, 'id'].to_numpy(dtype=np.int64)] = False
+
+    @property
+    def total_invalidas(self):
+        return int(self.n - self.validas.sum())
+
+    def resumo(self):
+        '''{regra: quantidade de questões}, na ordem de REGRAS.'''
+        contagem = self.erros['regra'].value_counts()
+        return {nome: int(contagem[nome]) for nome, *_ in REGRAS if nome in contagem}
+
+    def motivos(self):
+        '''{id: primeira regra de severidade 'erro' violada} das questões inválidas.'''
+        erros = self.erros[self.erros['severidade'] == ERRO].drop_duplicates('id')
+        return dict(zip(erros['id'].tolist(), erros['regra'].tolist()))
+
+    def para_dict(self, limite=None):
+        linhas = self.erros if limite is None else self.erros.head(limite)
+        return {
+            "total_questoes": self.n,
+            "total_invalidas": self.total_invalidas,
+            "resumo": self.resumo(),
+            "erros": linhas.to_dict(orient='records'),
+        }
+
+
+def validar(colunas, regras=REGRAS):
+    '''Roda as regras sobre ColunasLint e retorna um ResultadoLint.'''
+    tabelas = []
+    for nome, severidade, coluna, funcao in regras:
+        viola, valores = funcao(colunas)
+        ids = np.flatnonzero(viola)
+        if len(ids):
+            tabelas.append(pd.DataFrame({
+                'id': ids, 'regra': nome, 'severidade': severidade, 'coluna': coluna,
+                'valor': pd.Series(valores[ids], dtype=object).str.slice(0, TAMANHO_MAX_VALOR),
+            }, columns=COLUNAS_TABELA))
+    if tabelas:
+        erros = pd.concat(tabelas, ignore_index=True).sort_values('id', kind='stable', ignore_index=True)
+    else:
+        erros = pd.DataFrame({c: pd.Series(dtype='int64' if c == 'id' else object) for c in COLUNAS_TABELA})
+    return ResultadoLint(colunas.n, erros)
+
+
+def validar_snapshot(snapshot):
+    return validar(ColunasLint.do_snapshot(snapshot))
+
+
+def validar_dataframe(df):
+    return validar(ColunasLint.do_dataframe(df))